@@ -0,0 +1,181 @@
+"""
+Control de admisión para las rutas de recolección e inferencia.
+Cubetas de tokens por cliente y globales por categoría, un tope de inferencias
+en curso y un umbral de profundidad de las colas de muestras. Las peticiones que
+no caben se rechazan en el middleware, antes de leer el cuerpo, con 429 (el
+cliente va demasiado rápido) o 503 (el servicio está saturado) y Retry-After.
+"""
+
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config import ADMISION_CONFIG, ALMACEN_CONFIG
+from metricas import registro_metricas, metrica_rechazos
+from respuestas import RespuestaJSONRapida
+from salud import monitor_salud
+
+# Rutas controladas: (método, patrón) -> tipo; el primer grupo del patrón es la categoría
+RUTAS_CONTROLADAS = (
+    ("POST", re.compile(r"^/api/(vocales|numeros|operaciones)/recolectar/[^/]+$"), "recoleccion"),
+    ("POST", re.compile(r"^/api/(vocales|numeros|operaciones)/prediccion(?:/[^/]+)?$"), "inferencia"),
+    ("POST", re.compile(r"^/api/(operaciones)/(?:expresion_senas|pipeline)$"), "inferencia"),
+)
+
+def clasificar_ruta(metodo: str, ruta: str) -> Optional[Tuple[str, str]]:
+    """(tipo, categoria) si la petición está sujeta a admisión."""
+    for metodo_ruta, patron, tipo in RUTAS_CONTROLADAS:
+        if metodo == metodo_ruta:
+            coincidencia = patron.match(ruta)
+            if coincidencia:
+                return tipo, coincidencia.group(1)
+    return None
+
+class CubetaTokens:
+    """Cubeta de tokens: 'tasa' por segundo con ráfagas de hasta 'capacidad'."""
+
+    __slots__ = ("tasa", "capacidad", "tokens", "actualizado")
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.actualizado = time.monotonic()
+
+    def espera(self) -> float:
+        """Segundos hasta que haya un token (0 si ya lo hay); no consume."""
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.tasa
+
+    def tomar(self):
+        self.tokens -= 1
+
+class ControlAdmision:
+    """Estado de admisión del worker (solo se usa desde el event loop)."""
+
+    def __init__(self):
+        self._cubetas_cliente = OrderedDict()  # {(tipo, categoria, cliente): CubetaTokens}, LRU
+        self._cubetas_globales = {}            # {(tipo, categoria): CubetaTokens}
+        self._inferencias_en_curso = {}        # {categoria: int}
+
+    def _cubeta(self, almacen: Dict, clave: tuple, tasa: Optional[float]) -> Optional[CubetaTokens]:
+        if not tasa:
+            return None
+        cubeta = almacen.get(clave)
+        if cubeta is None:
+            cubeta = almacen[clave] = CubetaTokens(tasa, max(1.0, tasa * ADMISION_CONFIG['rafaga_segundos']))
+        return cubeta
+
+    def _cubeta_cliente(self, tipo: str, categoria: str, cliente: str, tasa: Optional[float]):
+        clave = (tipo, categoria, cliente)
+        cubeta = self._cubeta(self._cubetas_cliente, clave, tasa)
+        if cubeta is not None:
+            self._cubetas_cliente.move_to_end(clave)
+            while len(self._cubetas_cliente) > ADMISION_CONFIG['max_clientes']:
+                self._cubetas_cliente.popitem(last=False)
+        return cubeta
+
+    def inferencias_en_curso(self) -> Dict[str, int]:
+        return dict(self._inferencias_en_curso)
+
+    def admitir(self, tipo: str, categoria: str, cliente: str) -> Optional[Tuple[int, str, float]]:
+        """None si se admite; si no, (código, motivo, segundos para reintentar)."""
+        limites = ADMISION_CONFIG['categorias'][categoria]
+
+        if tipo == "recoleccion":
+            en_cola = monitor_salud.muestras_en_cola(categoria)
+            if en_cola >= limites['max_muestras_en_cola']:
+                espera = ALMACEN_CONFIG['retraso_guardado_segundos'].get(categoria, 0) or 1
+                return 503, "cola", espera
+        elif self._inferencias_en_curso.get(categoria, 0) >= limites['max_inferencias_en_curso']:
+            return 503, "inferencias_en_curso", 1
+
+        # Se comprueban ambas cubetas antes de consumir para no gastar tokens de una petición rechazada
+        cubeta_cliente = self._cubeta_cliente(tipo, categoria, cliente, limites[f'{tipo}_por_cliente'])
+        cubeta_global = self._cubeta(self._cubetas_globales, (tipo, categoria), limites[f'{tipo}_global'])
+        espera_cliente = cubeta_cliente.espera() if cubeta_cliente else 0.0
+        espera_global = cubeta_global.espera() if cubeta_global else 0.0
+        if espera_cliente:
+            return 429, "cliente", espera_cliente
+        if espera_global:
+            return 503, "global", espera_global
+
+        for cubeta in (cubeta_cliente, cubeta_global):
+            if cubeta is not None:
+                cubeta.tomar()
+        return None
+
+    def iniciar_inferencia(self, categoria: str):
+        self._inferencias_en_curso[categoria] = self._inferencias_en_curso.get(categoria, 0) + 1
+
+    def terminar_inferencia(self, categoria: str):
+        self._inferencias_en_curso[categoria] -= 1
+
+# Instancia global del control de admisión
+control_admision = ControlAdmision()
+
+registro_metricas.indicador(
+    "inferencias_en_curso", "Peticiones de inferencia en curso por categoría", ("categoria",),
+    lambda: {(categoria,): valor for categoria, valor in control_admision.inferencias_en_curso().items()}
+)
+
+MENSAJES_RECHAZO = {
+    "cola": "Demasiadas muestras pendientes de guardar, intente más tarde",
+    "inferencias_en_curso": "Demasiadas predicciones en curso, intente más tarde",
+    "cliente": "Demasiadas peticiones de este cliente, reduzca la frecuencia",
+    "global": "Servicio saturado, intente más tarde",
+}
+
+class MiddlewareAdmision:
+    """Middleware ASGI que aplica el control de admisión antes de leer el cuerpo de la petición."""
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def identificar_cliente(scope) -> str:
+        encabezado = ADMISION_CONFIG['encabezado_cliente']
+        if encabezado:
+            nombre = encabezado.lower().encode("latin-1")
+            for clave, valor in scope["headers"]:
+                if clave == nombre:
+                    return valor.decode("latin-1").split(",")[0].strip()
+        cliente = scope.get("client")
+        return cliente[0] if cliente else "desconocido"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISION_CONFIG['activo']:
+            await self.app(scope, receive, send)
+            return
+
+        clasificacion = clasificar_ruta(scope["method"], scope["path"])
+        if clasificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        tipo, categoria = clasificacion
+        rechazo = control_admision.admitir(tipo, categoria, self.identificar_cliente(scope))
+        if rechazo is not None:
+            codigo, motivo, espera = rechazo
+            metrica_rechazos.incrementar(categoria, motivo)
+            respuesta = RespuestaJSONRapida(
+                {"detail": MENSAJES_RECHAZO[motivo], "motivo": motivo},
+                status_code=codigo,
+                headers={"Retry-After": str(max(1, math.ceil(espera)))}
+            )
+            await respuesta(scope, receive, send)
+            return
+
+        if tipo != "inferencia":
+            await self.app(scope, receive, send)
+            return
+
+        control_admision.iniciar_inferencia(categoria)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            control_admision.terminar_inferencia(categoria)
@@ -0,0 +1,225 @@
+"""
+Almacén de muestras seguro entre procesos.
+Con uvicorn --workers N cada worker tiene sus propias colas en memoria, pero todos
+escriben en el mismo backend de persistencia (persistencia_muestras). Cada guardado
+cuenta, recorta al tope de samples_maximos e inserta dentro de un bloqueo del
+backend (bloqueo de archivo por clase en JSON, transacción inmediata en SQLite),
+así que ningún worker pisa las muestras de otro y el tope se respeta con
+cualquier número de workers.
+
+Dentro de un worker, los guardados de cada clase se serializan con un asyncio.Lock
+y se agrupan: mientras hay un guardado programado o esperando turno, las nuevas
+solicitudes se unen a él en lugar de escribir otra vez. Un guardado fallido (sus
+muestras vuelven a la cola) se reintenta con espera exponencial, y al apagar se
+guardan todas las colas que aún tengan muestras.
+
+Las muestras sueltas se borran por id sin reescribir la clase; cuando se acumulan
+compactar_con_borradas borrados, el archivo se compacta en segundo plano.
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from caracteristicas import cache_caracteristicas
+from config import ALMACEN_CONFIG
+from estadisticas import agregador_estadisticas
+from metricas import metrica_bytes_guardados, metrica_muestras_descartadas, metrica_guardados_agrupados
+from persistencia_muestras import persistencia_muestras
+from salud import monitor_salud
+
+class AlmacenMuestras:
+    """Guardados y borrados de muestras coordinados entre workers, y sincronía de los conteos."""
+
+    def __init__(self, persistencia=persistencia_muestras):
+        self.persistencia = persistencia
+        self._lock = threading.Lock()
+        self._firmas = {}    # {clase: firma} del backend vista por este worker
+        self._en_vuelo = {}  # {clase: int} muestras sacadas de la cola que se están escribiendo
+        self._locks_guardado = {}      # {(categoria, clase): asyncio.Lock}
+        self._guardados_pendientes = {}  # {(categoria, clase): asyncio.Task} aún sin empezar a escribir
+        self._guardadores = {}         # {(categoria, clase): guardar} último usado, para vaciar las colas al apagar
+        self._tareas = set()
+        self._vaciar_ya = None         # asyncio.Event que corta los retrasos al apagar
+        self._compactaciones = {}      # {clase: asyncio.Task} en curso
+
+    def _recordar_firma(self, clase: str):
+        firma = self.persistencia.firma(clase)
+        with self._lock:
+            self._firmas[clase] = firma
+
+    def agregar(self, clase: str, muestras: List[Dict]) -> Dict:
+        """
+        Añade muestras a la clase bajo el bloqueo del backend.
+        Solo se guardan las que caben hasta samples_maximos; el resto se descarta.
+        """
+        resultado = self.persistencia.agregar(clase, muestras)
+        self._recordar_firma(clase)
+        return {
+            "guardadas": resultado["aceptadas"],
+            "descartadas": len(muestras) - resultado["aceptadas"],
+            "total": resultado["total"],
+            "bytes": resultado["bytes"]
+        }
+
+    def guardar_lote(self, categoria: str, clase: str, muestras: List[Dict]) -> Dict:
+        """Agrega un lote y actualiza métricas y estadísticas (bloqueante: llamar desde un hilo)."""
+        resultado = self.agregar(clase, muestras)
+        if resultado["descartadas"]:
+            metrica_muestras_descartadas.incrementar(categoria, cantidad=resultado["descartadas"])
+        metrica_bytes_guardados.incrementar(categoria, cantidad=resultado["bytes"])
+        agregador_estadisticas.registrar_guardado(clase, resultado["total"])
+        return resultado
+
+    async def guardar(self, categoria: str, clase: str, muestras: List[Dict]) -> Dict:
+        """Guarda un lote en un hilo (el bloqueo puede esperar a otro worker) y actualiza las estadísticas."""
+        with self._lock:
+            self._en_vuelo[clase] = self._en_vuelo.get(clase, 0) + len(muestras)
+        try:
+            return await monitor_salud.ejecutar_en_hilo(self.guardar_lote, categoria, clase, muestras)
+        finally:
+            with self._lock:
+                self._en_vuelo[clase] -= len(muestras)
+
+    # --- Guardados agrupados por clase ---
+
+    def programar_guardado(self, categoria: str, clase: str, guardar: Callable[[str], Awaitable]) -> asyncio.Task:
+        """
+        Programa guardar(clase) tras el retraso de la categoría. Si la clase ya tiene un
+        guardado programado o esperando el lock, la solicitud se une a ese guardado.
+        """
+        clave = (categoria, clase)
+        self._guardadores[clave] = guardar
+        tarea = self._guardados_pendientes.get(clave)
+        if tarea is not None:
+            metrica_guardados_agrupados.incrementar(categoria)
+            return tarea
+        return self._crear_guardado(clave, guardar)
+
+    def _crear_guardado(self, clave: tuple, guardar: Callable[[str], Awaitable], intento: int = 0) -> asyncio.Task:
+        if self._vaciar_ya is None:
+            self._vaciar_ya = asyncio.Event()
+        tarea = asyncio.get_running_loop().create_task(self._ejecutar_guardado(clave, guardar, intento))
+        self._guardados_pendientes[clave] = tarea
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+        return tarea
+
+    async def _ejecutar_guardado(self, clave: tuple, guardar: Callable[[str], Awaitable], intento: int = 0):
+        categoria, clase = clave
+        tarea = asyncio.current_task()
+        try:
+            retraso = ALMACEN_CONFIG['retraso_guardado_segundos'].get(categoria, 0)
+            if intento:
+                retraso = max(retraso, min(
+                    ALMACEN_CONFIG['reintento_guardado_segundos'] * 2 ** (intento - 1),
+                    ALMACEN_CONFIG['max_espera_reintento_segundos']
+                ))
+            if retraso and not self._vaciar_ya.is_set():
+                try:
+                    await asyncio.wait_for(self._vaciar_ya.wait(), retraso)
+                except asyncio.TimeoutError:
+                    pass
+
+            async with self._locks_guardado.setdefault(clave, asyncio.Lock()):
+                # Desde aquí las nuevas solicitudes programan otro guardado: este ya no verá lo que llegue
+                if self._guardados_pendientes.get(clave) is tarea:
+                    del self._guardados_pendientes[clave]
+                await guardar(clase)
+        except Exception as e:
+            # Las muestras volvieron a la cola: otro intento, salvo que ya haya un guardado programado
+            print(f"Error guardando muestras de '{clase}' (intento {intento + 1}): {e}")
+            if self._guardados_pendientes.get(clave) is tarea:
+                del self._guardados_pendientes[clave]
+            if clave in self._guardados_pendientes:
+                return
+            if intento + 1 < ALMACEN_CONFIG['max_reintentos_guardado']:
+                self._crear_guardado(clave, guardar, intento + 1)
+            else:
+                print(f"Sin más reintentos para '{clase}': las muestras siguen en cola hasta el próximo guardado")
+        finally:
+            if self._guardados_pendientes.get(clave) is tarea:
+                del self._guardados_pendientes[clave]
+
+    async def vaciar_pendientes(self):
+        """
+        Ejecuta ya los guardados programados y los reintentos (sin esperar su retraso),
+        programa uno para cada cola registrada que aún tenga muestras y espera a que terminen.
+        """
+        for clave in monitor_salud.clases_con_muestras_en_cola():
+            guardar = self._guardadores.get(clave)
+            if guardar is not None and clave not in self._guardados_pendientes:
+                self._crear_guardado(clave, guardar)
+        if self._vaciar_ya is not None:
+            self._vaciar_ya.set()
+        while self._tareas:
+            await asyncio.gather(*list(self._tareas), return_exceptions=True)
+        self._vaciar_ya = None
+
+        for categoria, clase in monitor_salud.clases_con_muestras_en_cola():
+            print(f"Muestras de '{categoria}/{clase}' sin guardar al vaciar las colas")
+
+    # --- Páginas y borrado de muestras sueltas ---
+
+    def pagina(self, clase: str, offset: int, limite: int) -> Dict:
+        """Página de muestras guardadas de la clase con sus ids."""
+        return self.persistencia.pagina(clase, offset, limite)
+
+    async def eliminar_muestra(self, clase: str, id_muestra: int) -> Optional[int]:
+        """Borra una muestra por id; devuelve el nuevo total de la clase (None si no existe)."""
+        total = await monitor_salud.ejecutar_en_hilo(self.persistencia.eliminar_muestra, clase, id_muestra)
+        if total is None:
+            return None
+        await monitor_salud.ejecutar_en_hilo(self._recordar_firma, clase)
+        agregador_estadisticas.registrar_guardado(clase, total)
+        if self.persistencia.pendientes_compactar(clase) >= ALMACEN_CONFIG['compactar_con_borradas']:
+            self.programar_compactacion(clase)
+        return total
+
+    def programar_compactacion(self, clase: str):
+        """Compacta la clase en segundo plano (una compactación a la vez por clase)."""
+        if clase in self._compactaciones:
+            return
+        tarea = asyncio.get_running_loop().create_task(self._compactar(clase))
+        self._compactaciones[clase] = tarea
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    async def _compactar(self, clase: str):
+        try:
+            await monitor_salud.ejecutar_en_hilo(self.persistencia.compactar, clase)
+            await monitor_salud.ejecutar_en_hilo(self._recordar_firma, clase)
+        except Exception as e:
+            # Las borradas siguen anotadas; el próximo borrado vuelve a intentarlo
+            print(f"Error compactando muestras de '{clase}': {e}")
+        finally:
+            del self._compactaciones[clase]
+
+    def en_vuelo(self, clase: str) -> int:
+        """Muestras de la clase que ya salieron de la cola pero aún se están escribiendo."""
+        return self._en_vuelo.get(clase, 0)
+
+    def eliminar(self, clase: str) -> bool:
+        """Borra las muestras de la clase sin interferir con un guardado en curso de otro worker."""
+        existia = self.persistencia.eliminar(clase)
+        self._recordar_firma(clase)
+        cache_caracteristicas.olvidar(clase)
+        return existia
+
+    def sincronizar(self, clase: str):
+        """
+        Si otro worker cambió las muestras de la clase, las recuenta y actualiza las
+        estadísticas de este worker. Sin cambios solo cuesta consultar la firma del backend.
+        """
+        firma = self.persistencia.firma(clase)
+        with self._lock:
+            # Con un guardado propio en curso, ese guardado trae el total actualizado
+            if self._en_vuelo.get(clase) or self._firmas.get(clase, ()) == firma:
+                return
+            self._firmas[clase] = firma
+        total = self.persistencia.contar(clase) if firma else 0
+        if total != agregador_estadisticas.total_muestras(clase):
+            agregador_estadisticas.registrar_guardado(clase, total)
+
+# Instancia global del almacén
+almacen_muestras = AlmacenMuestras()
@@ -0,0 +1,73 @@
+"""
+Aumentación de datos al entrenar.
+Genera variaciones aleatorias de los landmarks (N, 21, 3) en una sola pasada
+vectorizada de NumPy: rotación en el plano alrededor de la muñeca, escala,
+traslación, espejo horizontal y ruido. Es perezosa: los lotes aumentados se
+generan mientras se entrena y nunca se escriben en disco, y con la misma semilla
+produce siempre la misma secuencia.
+"""
+
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from config import AUMENTACION_CONFIG
+
+def aumentar_lote(puntos: np.ndarray, rng: np.random.Generator, config: Optional[Dict] = None) -> np.ndarray:
+    """Aplica transformaciones aleatorias independientes a cada muestra de un lote (N, 21, 3)."""
+    config = config or AUMENTACION_CONFIG
+    n = len(puntos)
+    muneca = puntos[:, :1, :]
+    relativos = puntos - muneca
+
+    # Espejo horizontal respecto a la muñeca (mano izquierda <-> derecha)
+    espejo = np.where(rng.random(n) < config['prob_espejo'], -1.0, 1.0)
+    relativos[:, :, 0] *= espejo[:, None]
+
+    # Rotación en el plano de la imagen y escala uniforme
+    angulos = np.deg2rad(rng.uniform(-config['max_rotacion_grados'], config['max_rotacion_grados'], n))
+    escalas = rng.uniform(1 - config['escala'], 1 + config['escala'], n)
+    cosenos, senos = np.cos(angulos) * escalas, np.sin(angulos) * escalas
+    x, y = relativos[:, :, 0].copy(), relativos[:, :, 1].copy()
+    relativos[:, :, 0] = cosenos[:, None] * x - senos[:, None] * y
+    relativos[:, :, 1] = senos[:, None] * x + cosenos[:, None] * y
+    relativos[:, :, 2] *= escalas[:, None]
+
+    # Traslación de la mano completa y ruido por punto
+    traslacion = np.zeros((n, 1, 3), dtype=puntos.dtype)
+    traslacion[:, 0, :2] = rng.uniform(-config['traslacion'], config['traslacion'], (n, 2))
+    ruido = rng.normal(0.0, config['ruido'], puntos.shape)
+    return (muneca + relativos + traslacion + ruido).astype(puntos.dtype, copy=False)
+
+def generar_lotes_aumentados(X: np.ndarray, y: np.ndarray, batch_size: int,
+                             multiplicador: Optional[int] = None,
+                             semilla: Optional[int] = None,
+                             transformar: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> Tuple[Iterator, int]:
+    """
+    Generador infinito de lotes para model.fit y los pasos por época.
+
+    Cada época recorre las muestras originales una vez y (multiplicador - 1)
+    copias aumentadas de cada una, mezcladas. X llega aplanado (N, 63); si se
+    indica transformar, se aplica a cada lote aumentado (p.ej. extraer características).
+    """
+    multiplicador = multiplicador or AUMENTACION_CONFIG['multiplicador']
+    semilla = AUMENTACION_CONFIG['semilla'] if semilla is None else semilla
+    puntos = X.reshape(len(X), -1, 3).astype(np.float32)
+    total = len(X) * multiplicador
+    pasos_por_epoca = int(np.ceil(total / batch_size))
+
+    def generar():
+        rng = np.random.default_rng(semilla)
+        indices = np.tile(np.arange(len(X)), multiplicador)
+        aumentar = np.repeat(np.arange(multiplicador) > 0, len(X))
+        while True:
+            orden = rng.permutation(total)
+            for inicio in range(0, total, batch_size):
+                lote = orden[inicio:inicio + batch_size]
+                originales = puntos[indices[lote]]
+                aumentados = aumentar_lote(originales, rng)
+                X_lote = np.where(aumentar[lote][:, None, None], aumentados, originales)
+                X_lote = transformar(X_lote) if transformar else X_lote.reshape(len(lote), -1)
+                yield X_lote, y[indices[lote]]
+
+    return generar(), pasos_por_epoca
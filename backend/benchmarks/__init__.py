@@ -0,0 +1 @@
+# Benchmarks de rendimiento
\ No newline at end of file
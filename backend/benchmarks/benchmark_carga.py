@@ -0,0 +1,254 @@
+"""
+Benchmark de carga HTTP de los endpoints de recolección, predicción, estadísticas y expresiones.
+
+Genera frames sintéticos de 21x3 puntos clave y lanza peticiones concurrentes contra
+main.app en el mismo proceso (por defecto) o contra una instancia de uvicorn ya
+levantada (--url). Reporta throughput y latencias p50/p95/p99 por escenario y guarda
+los resultados en JSON para compararlos entre commits (--comparar).
+
+En modo en proceso se trabaja sobre un directorio temporal: las muestras recolectadas
+no tocan backend/data y los modelos entrenados se copian para poder predecir.
+
+Uso (desde backend/):
+    python -m benchmarks.benchmark_carga [--escenarios recolectar prediccion ...]
+        [--concurrencia 16] [--peticiones 2000] [--url http://localhost:8001]
+        [--salida resultados.json] [--comparar anterior.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VOCALES = ["a", "e", "i", "o", "u"]
+OPERADORES = ["+", "-", "*", "/"]
+
+def generar_puntos_clave(rng: random.Random) -> List[List[float]]:
+    """Frame sintético de una mano: 21 puntos (x, y, z) alrededor de una muñeca aleatoria."""
+    x0, y0 = rng.uniform(0.3, 0.7), rng.uniform(0.4, 0.8)
+    return [
+        [round(x0 + rng.gauss(0, 0.08), 5), round(y0 - abs(rng.gauss(0, 0.12)), 5), round(rng.gauss(0, 0.03), 5)]
+        for _ in range(21)
+    ]
+
+def generar_expresion(rng: random.Random) -> str:
+    """Expresión aritmética aleatoria de 3 a 8 operandos."""
+    partes = [str(rng.randint(1, 99))]
+    for _ in range(rng.randint(2, 7)):
+        partes += [rng.choice(OPERADORES), str(rng.randint(1, 99))]
+    return " ".join(partes)
+
+# --- Escenarios: cada uno devuelve (método, ruta, cuerpo JSON, encabezados) ---
+
+def peticion_recolectar(rng: random.Random, estado: Dict):
+    vocal = rng.choice(VOCALES)
+    cuerpo = {"puntos_clave": generar_puntos_clave(rng)}
+    return "POST", f"/api/vocales/recolectar/{vocal}", cuerpo, None
+
+def peticion_prediccion(rng: random.Random, estado: Dict):
+    return "POST", "/api/vocales/prediccion", {"puntos_clave": generar_puntos_clave(rng)}, None
+
+def peticion_estadisticas(rng: random.Random, estado: Dict):
+    return "GET", "/api/estadisticas", None, None
+
+def peticion_estadisticas_condicional(rng: random.Random, estado: Dict):
+    encabezados = {"If-None-Match": estado["etag"]} if estado.get("etag") else None
+    return "GET", "/api/estadisticas", None, encabezados
+
+def peticion_expresion(rng: random.Random, estado: Dict):
+    return "POST", "/api/operaciones/expresion_matematica", {"expresion": generar_expresion(rng)}, None
+
+ESCENARIOS: Dict[str, Callable] = {
+    "recolectar": peticion_recolectar,
+    "prediccion": peticion_prediccion,
+    "estadisticas": peticion_estadisticas,
+    "estadisticas_304": peticion_estadisticas_condicional,
+    "expresion_matematica": peticion_expresion,
+}
+
+def percentil(valores_ordenados: List[float], p: float) -> Optional[float]:
+    """Percentil por interpolación lineal sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return None
+    posicion = (len(valores_ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * (posicion - inferior)
+
+async def ejecutar_escenario(cliente: httpx.AsyncClient, nombre: str, peticiones: int,
+                             concurrencia: int, semilla: int, calentamiento: int) -> Dict:
+    """Lanza 'peticiones' peticiones con 'concurrencia' trabajadores y resume las latencias."""
+    generar = ESCENARIOS[nombre]
+    estado = {}
+    if nombre == "estadisticas_304":
+        estado["etag"] = (await cliente.get("/api/estadisticas")).headers.get("etag")
+
+    async def enviar(rng: random.Random):
+        metodo, ruta, cuerpo, encabezados = generar(rng, estado)
+        inicio = time.perf_counter()
+        respuesta = await cliente.request(metodo, ruta, json=cuerpo, headers=encabezados)
+        await respuesta.aread()
+        return time.perf_counter() - inicio, respuesta.status_code
+
+    rng_calentamiento = random.Random(semilla - 1)
+    for _ in range(calentamiento):
+        await enviar(rng_calentamiento)
+
+    latencias = []
+    estados = {}
+    restantes = [peticiones]
+
+    async def trabajador(indice: int):
+        rng = random.Random(semilla * 1000 + indice)
+        while restantes[0] > 0:
+            restantes[0] -= 1
+            duracion, codigo = await enviar(rng)
+            latencias.append(duracion)
+            estados[codigo] = estados.get(codigo, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador(i) for i in range(concurrencia)))
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    errores = sum(cuenta for codigo, cuenta in estados.items() if codigo >= 500)
+    return {
+        "peticiones": len(latencias),
+        "concurrencia": concurrencia,
+        "duracion_segundos": round(total, 3),
+        "throughput_rps": round(len(latencias) / total, 1) if total else None,
+        "latencia_ms": {
+            "p50": round(percentil(latencias, 50) * 1000, 3),
+            "p95": round(percentil(latencias, 95) * 1000, 3),
+            "p99": round(percentil(latencias, 99) * 1000, 3),
+            "media": round(sum(latencias) / len(latencias) * 1000, 3),
+            "maxima": round(latencias[-1] * 1000, 3)
+        },
+        "codigos_estado": {str(codigo): cuenta for codigo, cuenta in sorted(estados.items())},
+        "errores_5xx": errores
+    }
+
+def preparar_app_en_proceso(directorio: str):
+    """Importa main.app trabajando en un directorio temporal con una copia de los modelos."""
+    origen_modelos = os.path.join(DIRECTORIO_BACKEND, "backend", "models_trained")
+    destino_modelos = os.path.join(directorio, "backend", "models_trained")
+    if os.path.isdir(origen_modelos):
+        shutil.copytree(origen_modelos, destino_modelos)
+    os.makedirs(os.path.join(directorio, "backend", "data"), exist_ok=True)
+
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+    os.chdir(directorio)
+
+    from config import DATOS_CONFIG, ADMISION_CONFIG
+    # Sin tope de muestras: así 'recolectar' mide siempre el camino de encolado y guardado
+    DATOS_CONFIG['samples_recomendados'] = 10 ** 9
+    DATOS_CONFIG['samples_maximos'] = 10 ** 9
+    # Todas las peticiones llegan del mismo cliente: sin límites de tasa se mide el servicio, no el limitador
+    ADMISION_CONFIG['activo'] = False
+
+    from main import app
+    return app
+
+def obtener_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO_BACKEND,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def ejecutar(args) -> Dict:
+    resultados = {}
+
+    async def correr(cliente):
+        for nombre in args.escenarios:
+            print(f"▶ {nombre} ({args.peticiones} peticiones, concurrencia {args.concurrencia})", flush=True)
+            resultados[nombre] = await ejecutar_escenario(
+                cliente, nombre, args.peticiones, args.concurrencia, args.semilla, args.calentamiento
+            )
+
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=60) as cliente:
+            await correr(cliente)
+    else:
+        directorio = tempfile.mkdtemp(prefix="benchmark_carga_")
+        directorio_original = os.getcwd()
+        try:
+            app = preparar_app_en_proceso(directorio)
+            transporte = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark", timeout=60) as cliente:
+                    await correr(cliente)
+        finally:
+            os.chdir(directorio_original)
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    return {
+        "metadatos": {
+            "commit": obtener_commit(),
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "modo": "uvicorn" if args.url else "en_proceso",
+            "url": args.url,
+            "semilla": args.semilla
+        },
+        "escenarios": resultados
+    }
+
+def imprimir_resultados(resultados: Dict, anteriores: Optional[Dict] = None):
+    print(f"\n{'escenario':22} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'5xx':>5}  códigos")
+    for nombre, r in resultados["escenarios"].items():
+        lat = r["latencia_ms"]
+        print(f"{nombre:22} {r['throughput_rps']:>9} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9} "
+              f"{r['errores_5xx']:>5}  {r['codigos_estado']}")
+        previo = (anteriores or {}).get("escenarios", {}).get(nombre)
+        if previo:
+            cambio = lambda actual, antes: f"{(actual - antes) / antes * 100:+.1f}%" if antes else "n/a"
+            print(f"{'  vs ' + str(anteriores['metadatos'].get('commit')):22} "
+                  f"{cambio(r['throughput_rps'], previo['throughput_rps']):>9} "
+                  f"{cambio(lat['p50'], previo['latencia_ms']['p50']):>9} "
+                  f"{cambio(lat['p95'], previo['latencia_ms']['p95']):>9} "
+                  f"{cambio(lat['p99'], previo['latencia_ms']['p99']):>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escenarios", nargs="+", choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument("--peticiones", type=int, default=2000, help="Peticiones medidas por escenario")
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--calentamiento", type=int, default=20, help="Peticiones previas no medidas")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--url", help="URL de una instancia ya levantada (por defecto, main.app en proceso)")
+    parser.add_argument("--salida", help="Guardar los resultados en un archivo JSON")
+    parser.add_argument("--comparar", help="Resultados JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    anteriores = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            anteriores = json.load(f)
+
+    resultados = asyncio.run(ejecutar(args))
+    imprimir_resultados(resultados, anteriores)
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(resultados, f, indent=2)
+        print(f"\nResultados guardados en {args.salida}")
+
+if __name__ == "__main__":
+    main()
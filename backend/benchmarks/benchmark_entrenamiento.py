@@ -0,0 +1,193 @@
+"""
+Benchmark de entrenamiento: tiempo por fase de ModeloClase.entrenar según el tamaño
+del dataset, los hilos de TensorFlow y el batch size.
+
+Genera datasets sintéticos (por defecto 100 a 100k muestras) en el formato de
+backend/data dentro de un directorio temporal y entrena cada combinación en un
+subproceso, porque los hilos intra/inter-op de TensorFlow solo se pueden fijar
+antes de inicializar su runtime. Mide las fases que reporta entrenar()
+(carga, construcción, fit, evaluación y guardado) y resume qué configuración da
+más throughput por hilo para dimensionar los workers de entrenamiento.
+
+Uso (desde backend/):
+    python -m benchmarks.benchmark_entrenamiento [--muestras 100 1000 10000 100000]
+        [--intra 1 2 4] [--inter 1 2] [--batch 32 128] [--epocas 5] [--salida informe.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLASE_BENCHMARK = "a"
+FASES = ("carga", "construccion", "fit", "evaluacion", "guardado")
+
+def generar_dataset(directorio: str, muestras: int, semilla: int) -> str:
+    """Escribe <directorio>/backend/data/<categoria>/<clase>_samples.json con muestras sintéticas."""
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+    from config import RUTAS, CLASE_A_CATEGORIA
+
+    rng = random.Random(semilla)
+    ruta = os.path.join(directorio, RUTAS['data_base'], CLASE_A_CATEGORIA[CLASE_BENCHMARK],
+                        f"{CLASE_BENCHMARK}_samples.json")
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    datos = []
+    for i in range(muestras):
+        x0, y0 = rng.uniform(0.3, 0.7), rng.uniform(0.4, 0.8)
+        datos.append({
+            "landmarks": [[x0 + rng.gauss(0, 0.08), y0 - abs(rng.gauss(0, 0.12)), rng.gauss(0, 0.03)]
+                          for _ in range(21)],
+            "timestamp": f"2024-01-01T00:00:{i % 60:02d}",
+            "clase": CLASE_BENCHMARK
+        })
+    with open(ruta, 'w') as f:
+        json.dump(datos, f)
+    return ruta
+
+def ejecutar_trabajador(args):
+    """Un entrenamiento con una configuración de hilos fija; imprime el resultado en JSON."""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(args.intra[0])
+    tf.config.threading.set_inter_op_parallelism_threads(args.inter[0])
+
+    sys.path.insert(0, DIRECTORIO_BACKEND)
+    os.chdir(args.directorio)
+
+    from config import ENTRENAMIENTO_CONFIG
+    ENTRENAMIENTO_CONFIG['batch_size'] = args.batch[0]
+    if args.epocas:
+        ENTRENAMIENTO_CONFIG['epocas'] = args.epocas
+
+    from models import ModeloClase
+    inicio = time.perf_counter()
+    resultado = ModeloClase(CLASE_BENCHMARK).entrenar(forzar=True)
+    resultado["total_segundos"] = round(time.perf_counter() - inicio, 4)
+    print(json.dumps(resultado))
+
+def lanzar_trabajador(directorio: str, intra: int, inter: int, batch: int, epocas: int) -> Dict:
+    comando = [
+        sys.executable, "-m", "benchmarks.benchmark_entrenamiento", "--trabajador",
+        "--directorio", directorio, "--intra", str(intra), "--inter", str(inter), "--batch", str(batch)
+    ]
+    if epocas:
+        comando += ["--epocas", str(epocas)]
+    entorno = {**os.environ, "TF_CPP_MIN_LOG_LEVEL": "2"}
+    proceso = subprocess.run(comando, cwd=DIRECTORIO_BACKEND, capture_output=True, text=True, env=entorno)
+    lineas = [l for l in proceso.stdout.splitlines() if l.startswith("{")]
+    if proceso.returncode != 0 or not lineas:
+        return {"exito": False, "error": proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "sin salida"}
+    return json.loads(lineas[-1])
+
+def resumir(resultado: Dict, muestras: int, intra: int, inter: int, batch: int) -> Dict:
+    fila = {"muestras": muestras, "intra": intra, "inter": inter, "batch_size": batch, "exito": resultado.get("exito", False)}
+    if not fila["exito"]:
+        fila["error"] = resultado.get("error")
+        return fila
+
+    tiempos = resultado["tiempos_segundos"]
+    fila.update({fase: tiempos.get(fase) for fase in FASES})
+    fila["total"] = resultado["total_segundos"]
+    fila["epocas"] = resultado["epocas"]
+    # Muestras procesadas por segundo en fit (todas las épocas)
+    muestras_por_epoca = resultado.get("aumentacion", {}).get("muestras_por_epoca", resultado["muestras_entrenamiento"])
+    fila["muestras_por_segundo"] = round(muestras_por_epoca * resultado["epocas"] / tiempos["fit"], 1)
+    fila["muestras_por_segundo_por_hilo"] = round(fila["muestras_por_segundo"] / intra, 1)
+    return fila
+
+def dimensionar(filas: List[Dict], nucleos: int) -> Dict:
+    """Por tamaño de dataset: configuración más rápida y la más eficiente por hilo."""
+    recomendaciones = {}
+    for muestras in sorted({f["muestras"] for f in filas}):
+        validas = [f for f in filas if f["muestras"] == muestras and f["exito"]]
+        if not validas:
+            continue
+        mas_rapida = min(validas, key=lambda f: f["total"])
+        eficiente = max(validas, key=lambda f: f["muestras_por_segundo_por_hilo"])
+        workers = max(1, nucleos // eficiente["intra"])
+        recomendaciones[str(muestras)] = {
+            "mas_rapida": {k: mas_rapida[k] for k in ("intra", "inter", "batch_size", "total")},
+            "mas_eficiente": {k: eficiente[k] for k in ("intra", "inter", "batch_size", "muestras_por_segundo")},
+            "workers_sugeridos": workers,
+            "entrenamientos_en_paralelo_por_hora": round(workers * 3600 / eficiente["total"], 1)
+        }
+    return recomendaciones
+
+def imprimir(filas: List[Dict]):
+    print(f"\n{'muestras':>9} {'intra':>5} {'inter':>5} {'batch':>6} " +
+          " ".join(f"{fase:>12}" for fase in FASES) + f" {'total':>9} {'muestras/s':>11}")
+    for f in filas:
+        if not f["exito"]:
+            print(f"{f['muestras']:>9} {f['intra']:>5} {f['inter']:>5} {f['batch_size']:>6}  error: {f['error']}")
+            continue
+        print(f"{f['muestras']:>9} {f['intra']:>5} {f['inter']:>5} {f['batch_size']:>6} " +
+              " ".join(f"{f[fase]:>12.3f}" for fase in FASES) + f" {f['total']:>9.2f} {f['muestras_por_segundo']:>11}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--muestras", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--intra", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--inter", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--batch", type=int, nargs="+", default=[32])
+    parser.add_argument("--epocas", type=int, help="Épocas por entrenamiento (por defecto, ENTRENAMIENTO_CONFIG)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Guardar el informe en un archivo JSON")
+    parser.add_argument("--trabajador", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--directorio", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trabajador:
+        ejecutar_trabajador(args)
+        return
+
+    filas = []
+    for muestras in args.muestras:
+        directorio = tempfile.mkdtemp(prefix="benchmark_entrenamiento_")
+        try:
+            print(f"▶ Generando dataset de {muestras} muestras", flush=True)
+            generar_dataset(directorio, muestras, args.semilla)
+            for batch in args.batch:
+                for intra in args.intra:
+                    for inter in args.inter:
+                        print(f"  entrenando intra={intra} inter={inter} batch={batch}", flush=True)
+                        resultado = lanzar_trabajador(directorio, intra, inter, batch, args.epocas)
+                        filas.append(resumir(resultado, muestras, intra, inter, batch))
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    imprimir(filas)
+    nucleos = os.cpu_count() or 1
+    informe = {
+        "metadatos": {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "nucleos": nucleos,
+            "semilla": args.semilla
+        },
+        "resultados": filas,
+        "dimensionamiento": dimensionar(filas, nucleos)
+    }
+
+    print("\nDimensionamiento (configuración más eficiente por hilo):")
+    for muestras, r in informe["dimensionamiento"].items():
+        e = r["mas_eficiente"]
+        print(f"  {muestras:>7} muestras: intra={e['intra']} inter={e['inter']} batch={e['batch_size']} "
+              f"→ {r['workers_sugeridos']} workers en {nucleos} núcleos, "
+              f"~{r['entrenamientos_en_paralelo_por_hora']} entrenamientos/hora")
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(informe, f, indent=2)
+        print(f"\nInforme guardado en {args.salida}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark de la capa de respuestas: serialización y compresión por endpoint.
+
+Compara, para cargas representativas de cada endpoint, el camino por defecto de
+FastAPI (jsonable_encoder + json.dumps) con serializar_json (orjson), y muestra
+el tamaño del cuerpo sin comprimir, con gzip y con brotli (si está instalado).
+
+Uso (desde backend/):
+    python -m benchmarks.benchmark_serializacion [--repeticiones N] [--salida resultados.json]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import timeit
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from config import CLASES_DISPONIBLES, DATOS_CONFIG, RESPUESTAS_CONFIG
+from estadisticas import calcular_estadisticas_clase
+from math_evaluator import evaluador_matematico
+from respuestas import serializar_json, brotli
+
+def carga_prediccion_vocales(rng: random.Random):
+    """Respuesta de POST /api/vocales/prediccion."""
+    probabilidades = {
+        vocal: {
+            "exito": True,
+            "clase_predicha": vocal,
+            "confianza": rng.random(),
+            "es_clase_objetivo": True,
+            "umbral": 0.5
+        }
+        for vocal in CLASES_DISPONIBLES['vocales']
+    }
+    return {"prediccion": {"clase_predicha": "a", "confianza": 0.97, "todas_las_probabilidades": probabilidades}}
+
+def carga_prediccion_lote(rng: random.Random, numpy_nativo: bool):
+    """Respuesta de POST /api/numeros/prediccion/lote con 30 señas."""
+    clases = CLASES_DISPONIBLES['numeros']
+    matriz = np.asarray([[rng.random() for _ in clases] for _ in range(30)], dtype=np.float32)
+    convertir = (lambda v: v) if numpy_nativo else float
+    return {
+        "categoria": "numeros",
+        "total": len(matriz),
+        "predicciones": [
+            {
+                "clase_predicha": clases[int(fila.argmax())],
+                "confianza": convertir(fila.max()),
+                "todas_las_probabilidades": {c: convertir(fila[j]) for j, c in enumerate(clases)}
+            }
+            for fila in matriz
+        ]
+    }
+
+def carga_expresion_pasos(rng: random.Random):
+    """Resultado de MathEvaluator.evaluar con pasos completos para 33 números."""
+    simbolos = []
+    for i in range(33):
+        simbolos.append(str(rng.randint(1, 9)))
+        if i < 32:
+            simbolos.append(rng.choice("+-*"))
+    resultado = evaluador_matematico.evaluar(simbolos, "full")
+    resultado["pasos"] = list(resultado["pasos"])
+    return resultado
+
+def carga_estadisticas_globales(rng: random.Random):
+    """Respuesta de GET /api/estadisticas."""
+    respuesta = {}
+    for categoria, clases in CLASES_DISPONIBLES.items():
+        respuesta[categoria] = {
+            "estadisticas": {
+                clase: calcular_estadisticas_clase(rng.randint(0, 100), rng.random() > 0.5) for clase in clases
+            }
+        }
+    respuesta["configuracion"] = DATOS_CONFIG
+    return respuesta
+
+def serializar_por_defecto(contenido) -> bytes:
+    """Camino por defecto de FastAPI para un diccionario devuelto por un endpoint."""
+    return json.dumps(jsonable_encoder(contenido), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def medir(funcion, repeticiones: int) -> float:
+    """Microsegundos por llamada (mejor de 5 series)."""
+    return min(timeit.repeat(funcion, number=repeticiones, repeat=5)) / repeticiones * 1e6
+
+def ejecutar(repeticiones: int):
+    rng = random.Random(42)
+    cargas = {
+        "vocales/prediccion": (carga_prediccion_vocales(rng),) * 2,
+        "numeros/prediccion/lote": (carga_prediccion_lote(rng, False), carga_prediccion_lote(random.Random(42), True)),
+        "operaciones/expresion (pasos=full)": (carga_expresion_pasos(rng),) * 2,
+        "estadisticas": (carga_estadisticas_globales(rng),) * 2,
+    }
+
+    resultados = {}
+    for nombre, (carga_base, carga_nueva) in cargas.items():
+        cuerpo = serializar_json(carga_nueva)
+        base_us = medir(lambda: serializar_por_defecto(carga_base), repeticiones)
+        nuevo_us = medir(lambda: serializar_json(carga_nueva), repeticiones)
+        resultados[nombre] = {
+            "json_por_defecto_us": round(base_us, 2),
+            "orjson_us": round(nuevo_us, 2),
+            "aceleracion": round(base_us / nuevo_us, 1),
+            "bytes": len(cuerpo),
+            "bytes_gzip": len(gzip.compress(cuerpo, compresslevel=RESPUESTAS_CONFIG['nivel_gzip'])),
+            "bytes_brotli": len(brotli.compress(cuerpo, quality=RESPUESTAS_CONFIG['nivel_brotli'])) if brotli else None,
+        }
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=2000)
+    parser.add_argument("--salida", help="Guardar los resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.repeticiones)
+
+    print(f"{'endpoint':38} {'json µs':>9} {'orjson µs':>10} {'x':>6} {'bytes':>8} {'gzip':>7} {'brotli':>7}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:38} {r['json_por_defecto_us']:>9} {r['orjson_us']:>10} {r['aceleracion']:>6} "
+              f"{r['bytes']:>8} {r['bytes_gzip']:>7} {str(r['bytes_brotli']):>7}")
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(resultados, f, indent=2)
+
+if __name__ == "__main__":
+    main()
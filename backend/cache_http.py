@@ -0,0 +1,89 @@
+"""
+Soporte de GET condicional (ETag / Last-Modified) para endpoints de lectura frecuente.
+Las respuestas se serializan una sola vez por versión y se guardan en caché, de
+modo que los sondeos repetidos solo comparan el ETag y devuelven 304.
+"""
+
+import hashlib
+import uuid
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+from respuestas import serializar_json
+from metricas import metrica_cache
+from memoria import inspector_memoria
+
+# Identificador del proceso: evita que un ETag de antes de un reinicio coincida por casualidad
+_ID_PROCESO = uuid.uuid4().hex[:8]
+
+# Cuerpos serializados por ETag (LRU acotado)
+MAX_CUERPOS_CACHE = 64
+_cache_cuerpos = OrderedDict()
+inspector_memoria.registrar_estructura("cache_respuestas_http", _cache_cuerpos)
+
+def generar_etag(recurso: str, version) -> str:
+    """ETag débil para un recurso en una versión dada."""
+    return f'W/"{recurso}-{_ID_PROCESO}-{version}"'
+
+def etag_coincide(request: Request, etag: str) -> bool:
+    """Indica si el encabezado If-None-Match de la petición coincide con el ETag."""
+    encabezado = request.headers.get("if-none-match")
+    if not encabezado:
+        return False
+
+    etiquetas = [e.strip() for e in encabezado.split(",")]
+    if "*" in etiquetas:
+        return True
+    # Comparación débil: se ignora el prefijo W/
+    valor = etag[2:] if etag.startswith("W/") else etag
+    return any((e[2:] if e.startswith("W/") else e) == valor for e in etiquetas)
+
+def _encabezados(etag: str, ultima_modificacion: Optional[float]) -> Dict[str, str]:
+    encabezados = {"ETag": etag, "Cache-Control": "no-cache"}
+    if ultima_modificacion is not None:
+        encabezados["Last-Modified"] = formatdate(ultima_modificacion, usegmt=True)
+    return encabezados
+
+def respuesta_condicional(request: Request, etag: str, generar_contenido: Callable[[], Dict],
+                          ultima_modificacion: Optional[float] = None) -> Response:
+    """
+    Devuelve 304 si el cliente ya tiene la versión actual; si no, el JSON del recurso.
+
+    generar_contenido solo se llama cuando el cuerpo de ese ETag no está en caché.
+    """
+    encabezados = _encabezados(etag, ultima_modificacion)
+    if etag_coincide(request, etag):
+        metrica_cache.incrementar("respuestas_http", "no_modificado")
+        return Response(status_code=304, headers=encabezados)
+
+    cuerpo = _cache_cuerpos.get(etag)
+    if cuerpo is None:
+        metrica_cache.incrementar("respuestas_http", "fallo")
+        cuerpo = serializar_json(generar_contenido())
+        _cache_cuerpos[etag] = cuerpo
+        if len(_cache_cuerpos) > MAX_CUERPOS_CACHE:
+            _cache_cuerpos.popitem(last=False)
+    else:
+        metrica_cache.incrementar("respuestas_http", "acierto")
+        _cache_cuerpos.move_to_end(etag)
+
+    return Response(content=cuerpo, media_type="application/json", headers=encabezados)
+
+class RespuestaEstatica:
+    """Respuesta JSON que no cambia mientras vive el proceso: se serializa una sola vez."""
+
+    def __init__(self, contenido: Dict):
+        self.cuerpo = serializar_json(contenido)
+        self.etag = f'"{hashlib.sha1(self.cuerpo).hexdigest()[:16]}"'
+
+    def responder(self, request: Request) -> Response:
+        """Devuelve 304 si el cliente ya tiene el contenido; si no, el cuerpo ya serializado."""
+        encabezados = _encabezados(self.etag, None)
+        if etag_coincide(request, self.etag):
+            metrica_cache.incrementar("respuestas_http", "no_modificado")
+            return Response(status_code=304, headers=encabezados)
+        metrica_cache.incrementar("respuestas_http", "acierto")
+        return Response(content=self.cuerpo, media_type="application/json", headers=encabezados)
@@ -0,0 +1,153 @@
+"""
+Características geométricas de la mano para entrenamiento e inferencia.
+En lugar de las 63 coordenadas crudas, los modelos reciben en un solo paso
+vectorizado: coordenadas relativas a la muñeca normalizadas por el tamaño de la
+mano, distancias entre las yemas de los dedos y ángulos de las articulaciones.
+Así el modelo no depende de dónde ni a qué distancia de la cámara está la mano.
+
+Las características de entrenamiento se cachean en memoria y en disco por clase,
+indexadas por el contenido de los datos y la versión del extractor: reentrenar
+sin muestras nuevas no las recalcula.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Optional
+
+import numpy as np
+
+from config import CARACTERISTICAS_CONFIG, obtener_ruta_caracteristicas
+from metricas import metrica_cache
+from utils import ajustar_permisos_temporal
+
+# Cambiarla invalida las características cacheadas
+VERSION_EXTRACTOR = 1
+
+# Índices de MediaPipe Hands: muñeca = 0, y cada dedo de la base a la yema
+DEDOS = (
+    (1, 2, 3, 4),      # pulgar
+    (5, 6, 7, 8),      # índice
+    (9, 10, 11, 12),   # medio
+    (13, 14, 15, 16),  # anular
+    (17, 18, 19, 20),  # meñique
+)
+YEMAS = np.array([dedo[-1] for dedo in DEDOS])
+_PARES_YEMAS = np.triu_indices(len(YEMAS), k=1)
+
+# Articulaciones (anterior, vértice, siguiente): muñeca-base-1ª, base-1ª-2ª y 1ª-2ª-yema de cada dedo
+_ARTICULACIONES = np.array([
+    (cadena[i - 1], cadena[i], cadena[i + 1])
+    for dedo in DEDOS
+    for cadena in [(0,) + dedo]
+    for i in range(1, len(cadena) - 1)
+])
+
+NUM_CARACTERISTICAS = 21 * 3 + len(_PARES_YEMAS[0]) + len(_ARTICULACIONES)
+
+def normalizar_puntos(puntos: np.ndarray) -> np.ndarray:
+    """
+    Puntos (..., 21, 3) relativos a la muñeca y escalados por su distancia máxima a ella.
+    Es parte de la entrada de los modelos: cambiarla exige subir VERSION_EXTRACTOR.
+    """
+    relativos = puntos - puntos[..., :1, :]
+    escala = np.linalg.norm(relativos, axis=-1).max(axis=-1)[..., None, None]
+    return relativos / np.where(escala > 0, escala, 1.0)
+
+def extraer_caracteristicas(puntos: np.ndarray) -> np.ndarray:
+    """Características (N, NUM_CARACTERISTICAS) en float32 de landmarks (N, 21, 3) o aplanados (N, 63)."""
+    puntos = np.asarray(puntos, dtype=np.float32).reshape(-1, 21, 3)
+    normalizados = normalizar_puntos(puntos)
+
+    # Distancias entre cada par de yemas (10 pares)
+    yemas = normalizados[:, YEMAS, :]
+    distancias = np.linalg.norm(yemas[:, _PARES_YEMAS[0]] - yemas[:, _PARES_YEMAS[1]], axis=-1)
+
+    # Ángulo en cada articulación, en [0, 1] (0 = dedo doblado sobre sí mismo, 1 = recto)
+    anteriores = normalizados[:, _ARTICULACIONES[:, 0]] - normalizados[:, _ARTICULACIONES[:, 1]]
+    siguientes = normalizados[:, _ARTICULACIONES[:, 2]] - normalizados[:, _ARTICULACIONES[:, 1]]
+    productos = np.einsum("nak,nak->na", anteriores, siguientes)
+    normas = np.linalg.norm(anteriores, axis=-1) * np.linalg.norm(siguientes, axis=-1)
+    cosenos = np.clip(productos / np.where(normas > 0, normas, 1.0), -1.0, 1.0)
+    angulos = np.arccos(cosenos) / np.pi
+
+    return np.concatenate(
+        [normalizados.reshape(len(puntos), -1), distancias, angulos], axis=1
+    ).astype(np.float32, copy=False)
+
+def preparar_entrada(puntos: np.ndarray, num_entradas: int) -> np.ndarray:
+    """Entrada del modelo según su ancho: características, o coordenadas crudas para modelos anteriores."""
+    if num_entradas == NUM_CARACTERISTICAS:
+        return extraer_caracteristicas(puntos)
+    return np.asarray(puntos, dtype=np.float32).reshape(-1, num_entradas)
+
+def huella_puntos(X: np.ndarray) -> str:
+    """Hash del contenido de un conjunto de landmarks."""
+    return hashlib.sha256(np.ascontiguousarray(X, dtype=np.float32).tobytes()).hexdigest()
+
+class CacheCaracteristicas:
+    """Características de entrenamiento por clase, válidas mientras no cambien los datos ni el extractor."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._memoria = {}  # {clase: (clave, caracteristicas)}
+
+    @staticmethod
+    def _clave(X: np.ndarray) -> str:
+        return f"v{VERSION_EXTRACTOR}-{huella_puntos(X)}"
+
+    def _leer_disco(self, clase: str, clave: str) -> Optional[np.ndarray]:
+        ruta = obtener_ruta_caracteristicas(clase)
+        try:
+            with np.load(ruta) as archivo:
+                if str(archivo["clave"]) == clave:
+                    return archivo["caracteristicas"]
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    def _escribir_disco(self, clase: str, clave: str, caracteristicas: np.ndarray):
+        ruta = obtener_ruta_caracteristicas(clase)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+        try:
+            ajustar_permisos_temporal(descriptor, ruta)
+            with os.fdopen(descriptor, "wb") as archivo:
+                np.savez(archivo, clave=np.array(clave), caracteristicas=caracteristicas)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"Error guardando características de '{clase}': {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    def obtener(self, clase: str, X: np.ndarray) -> np.ndarray:
+        """Características de los landmarks X de la clase, desde la caché si los datos no cambiaron."""
+        clave = self._clave(X)
+        with self._lock:
+            guardado = self._memoria.get(clase)
+        if guardado is not None and guardado[0] == clave:
+            metrica_cache.incrementar("caracteristicas", "acierto")
+            return guardado[1]
+
+        caracteristicas = self._leer_disco(clase, clave) if CARACTERISTICAS_CONFIG['cache_en_disco'] else None
+        metrica_cache.incrementar("caracteristicas", "fallo" if caracteristicas is None else "acierto")
+        if caracteristicas is None:
+            caracteristicas = extraer_caracteristicas(X)
+            if CARACTERISTICAS_CONFIG['cache_en_disco']:
+                self._escribir_disco(clase, clave, caracteristicas)
+
+        with self._lock:
+            self._memoria[clase] = (clave, caracteristicas)
+        return caracteristicas
+
+    def olvidar(self, clase: str):
+        """Descarta las características cacheadas de la clase."""
+        with self._lock:
+            self._memoria.pop(clase, None)
+        ruta = obtener_ruta_caracteristicas(clase)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+# Instancia global de la caché
+cache_caracteristicas = CacheCaracteristicas()
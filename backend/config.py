@@ -33,6 +33,145 @@ DATOS_CONFIG = {
     "samples_maximos": 100,
 }
 
+# Hiperparámetros de entrenamiento (ModeloClase.entrenar)
+ENTRENAMIENTO_CONFIG = {
+    "epocas": 50,
+    "batch_size": 32,
+    "proporcion_validacion": 0.2,
+}
+
+# Aumentación de datos al entrenar (lotes generados al vuelo, nunca en disco)
+AUMENTACION_CONFIG = {
+    "activo": True,
+    "multiplicador": 4,          # Muestras por época = originales x multiplicador (1 = sin aumentación)
+    "semilla": 42,               # Misma semilla -> misma secuencia de lotes
+    "max_rotacion_grados": 15,   # Rotación en el plano alrededor de la muñeca
+    "escala": 0.1,               # Factor de escala en [1 - escala, 1 + escala]
+    "traslacion": 0.05,          # Desplazamiento de la mano en coordenadas normalizadas de imagen
+    "prob_espejo": 0.5,          # Probabilidad de reflejar la mano (izquierda <-> derecha)
+    "ruido": 0.003,              # Desviación del ruido gaussiano por coordenada
+}
+
+# Características geométricas de la mano (caracteristicas.py)
+CARACTERISTICAS_CONFIG = {
+    "activo": True,              # False = los modelos nuevos se entrenan con las 63 coordenadas crudas
+    "capas_ocultas": [64, 32],   # Red más pequeña que con coordenadas crudas (128, 64, 32)
+    "cache_en_disco": True,      # Guardar las características de entrenamiento en RUTAS['cache_caracteristicas']
+}
+
+# Exportación e importación de conjuntos de datos (/api/datos)
+INTERCAMBIO_CONFIG = {
+    "muestras_por_shard": 5000,            # Muestras por archivo .npy en la exportación zip
+    "lote_importacion": 1000,              # Muestras por inserción en bloque al importar
+    "max_bytes_linea": 1024 * 1024,        # Línea NDJSON más larga aceptada
+    "max_bytes_zip": 1024 * 1024 * 1024,   # Tamaño máximo de un zip importado
+    "zip_en_memoria_bytes": 8 * 1024 * 1024,  # Por encima, el zip recibido se vuelca a un temporal en disco
+}
+
+# Límites para la evaluación de expresiones matemáticas
+LIMITES_EXPRESION = {
+    "max_tokens": 64,            # Números, operadores y paréntesis
+    "max_digitos_operando": 12,  # Dígitos por número (sin contar el punto decimal)
+    "max_pasos": 128,            # Pasos de evaluación en notación postfija
+    "max_sesiones": 1000,        # Sesiones incrementales abiertas a la vez
+    "sesion_inactiva_segundos": 600,
+}
+
+# Predicción de números para expresiones por señas
+PREDICCION_CONFIG = {
+    "url_remota": None,        # None = modelos en el mismo proceso; p.ej. "http://localhost:8001"
+    "timeout_segundos": 10.0,
+    "max_conexiones": 10,      # Tamaño del pool del cliente HTTP remoto
+}
+
+# Segmentación de secuencias de frames en tokens de expresión
+PIPELINE_CONFIG = {
+    "tiempo_sostenido_ms": 400,   # Duración mínima de una seña para aceptarla
+    "umbral_confianza": 0.5,      # Confianza mínima por frame
+    "max_frames": 1800,           # ~60 s a 30 fps por petición
+}
+
+# Stream de progreso (Server-Sent Events)
+PROGRESO_STREAM_CONFIG = {
+    "heartbeat_segundos": 15,
+    "reintento_ms": 3000,   # Valor 'retry' sugerido al cliente para reconectar
+}
+
+# Serialización y compresión de respuestas
+RESPUESTAS_CONFIG = {
+    "compresion_min_bytes": 1024,  # Cuerpos más pequeños se envían sin comprimir
+    "nivel_gzip": 6,
+    "nivel_brotli": 4,
+}
+
+# Sondas de salud (liveness / readiness)
+SALUD_CONFIG = {
+    "intervalo_lag_segundos": 0.5,   # Cada cuánto se mide el retraso del event loop
+    "ventana_lag_mediciones": 20,    # Mediciones recientes que se conservan
+    "max_lag_ms": 250,               # Por encima de esto el servicio no está listo
+    "max_muestras_en_cola": 1000,    # Muestras pendientes de guardar en total
+    "ventana_guardados": 20,         # Guardados recientes para la latencia media
+}
+
+# Instrumentación por petición y perfilado bajo demanda
+PERFILADO_CONFIG = {
+    "server_timing": False,          # Encabezado Server-Timing (opt-in; se puede activar en /api/admin)
+    "intervalo_muestreo_ms": 5,      # Periodo del perfilador por muestreo
+    "max_peticiones": 100,           # Peticiones máximas por captura
+    "max_capturas": 10,              # Capturas guardadas a la vez
+}
+
+# Diagnóstico de memoria (tracemalloc)
+MEMORIA_CONFIG = {
+    "frames_tracemalloc": 10,   # Profundidad de las trazas guardadas por asignación
+    "max_snapshots": 5,         # Snapshots retenidos (los más antiguos se descartan)
+}
+
+# Almacén de muestras compartido entre workers
+ALMACEN_CONFIG = {
+    "backend": "json",                           # "json" (un archivo por clase) o "sqlite" (RUTAS['sqlite_muestras'])
+    "espera_bloqueo_segundos": 30,               # Tras esto el guardado falla y las muestras vuelven a la cola
+    "intervalo_reintento_bloqueo_segundos": 0.01,
+    # Espera antes de guardar: las muestras que llegan mientras tanto se escriben juntas
+    "retraso_guardado_segundos": {"vocales": 0.0, "numeros": 5.0, "operaciones": 5.0},
+    # Guardado fallido: se reintenta con espera exponencial (base * 2^n, hasta el máximo)
+    "reintento_guardado_segundos": 0.5,
+    "max_espera_reintento_segundos": 30.0,
+    "max_reintentos_guardado": 5,
+    # Borrados por id (backend json): a partir de cuántos se compacta el archivo en segundo plano
+    "compactar_con_borradas": 16,
+    "muestras_por_pagina": 20,
+    "max_muestras_por_pagina": 200,
+}
+
+# Filtro de frames casi duplicados al recolectar
+FILTRO_DUPLICADOS_CONFIG = {
+    "activo": True,
+    "distancia_minima": 0.03,   # Distancia L2 media por punto (landmarks relativos a la muñeca, mano de tamaño 1)
+    "tamano_buffer": 16,        # Frames aceptados recientes por clase con los que se compara
+}
+
+# Control de admisión (429/503 con Retry-After) para recolección e inferencia
+_LIMITES_ADMISION = {
+    "recoleccion_por_cliente": 40,     # Muestras/s por cliente (una cámara a 30 fps cabe holgada)
+    "recoleccion_global": 400,         # Muestras/s entre todos los clientes
+    "max_muestras_en_cola": 500,       # Con más muestras pendientes de guardar se responde 503
+    "inferencia_por_cliente": 40,      # Predicciones/s por cliente
+    "inferencia_global": None,         # None = sin límite de tasa (lo acota max_inferencias_en_curso)
+    "max_inferencias_en_curso": 32,
+}
+ADMISION_CONFIG = {
+    "activo": True,
+    "encabezado_cliente": None,   # p.ej. "X-Forwarded-For" detrás de un proxy; None = IP de la conexión
+    "rafaga_segundos": 2.0,       # Capacidad de cada cubeta = tasa * rafaga_segundos
+    "max_clientes": 10000,        # Cubetas por cliente retenidas (se descartan las menos recientes)
+    "categorias": {
+        "vocales": dict(_LIMITES_ADMISION),
+        "numeros": dict(_LIMITES_ADMISION),
+        "operaciones": dict(_LIMITES_ADMISION),
+    },
+}
+
 # Rutas de directorios
 RUTAS = {
     "data_base": "backend/data",
@@ -40,6 +179,8 @@ RUTAS = {
     "data_vocales": "backend/data/vocales",
     "data_numeros": "backend/data/numeros",
     "data_operaciones": "backend/data/operaciones",
+    "sqlite_muestras": "backend/data/muestras.sqlite3",
+    "cache_caracteristicas": "backend/cache/caracteristicas",
 }
 
 def obtener_ruta_datos(clase):
@@ -52,15 +193,21 @@ def obtener_ruta_datos(clase):
 
 def obtener_ruta_modelo(clase):
     """Obtiene la ruta donde se almacena el modelo entrenado de una clase específica"""
-    ruta = f"{RUTAS['models_base']}/{clase}_model.h5"
-    print(f"📂 Cargando modelo desde: {ruta}")  # 👈 debug temporal
-    return ruta
+    return f"{RUTAS['models_base']}/{clase}_model.h5"
 
 
 def obtener_ruta_encoder(clase):
     """Obtiene la ruta donde se almacena el label encoder de una clase específica"""
     return f"{RUTAS['models_base']}/{clase}_encoder.pkl"
 
+def obtener_ruta_version_datos(clase):
+    """Obtiene la ruta del registro de la versión de datos con que se entrenó el modelo de una clase"""
+    return f"{RUTAS['models_base']}/{clase}_version.json"
+
+def obtener_ruta_caracteristicas(clase):
+    """Obtiene la ruta de las características cacheadas de una clase específica"""
+    return f"{RUTAS['cache_caracteristicas']}/{clase}_caracteristicas.npz"
+
 def validar_clase(clase):
     """Valida si una clase es válida"""
     return clase in TODAS_LAS_CLASES
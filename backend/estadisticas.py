@@ -0,0 +1,203 @@
+"""
+Agregador de estadísticas de recolección y entrenamiento.
+Mantiene en memoria los resúmenes por clase, por categoría y globales, y los
+actualiza de forma incremental cuando se guardan muestras, se entrena o se
+eliminan datos y modelos, así que consultar las estadísticas no toca el disco.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config import CLASES_DISPONIBLES, DATOS_CONFIG, obtener_ruta_modelo
+from memoria import inspector_memoria
+from persistencia_muestras import persistencia_muestras
+
+# Claves del resumen de cada categoría (se conservan los nombres de la API)
+CLAVES_RESUMEN = {
+    "vocales": ("total_vocales", "vocales_completas"),
+    "numeros": ("total_numeros", "numeros_completos"),
+    "operaciones": ("total_operaciones", "operaciones_completas"),
+}
+
+def calcular_estadisticas_clase(total_muestras: int, tiene_modelo: bool) -> Dict:
+    """Calcula las estadísticas derivadas de una clase a partir de su conteo de muestras."""
+    recomendadas = DATOS_CONFIG['samples_recomendados']
+    return {
+        'total_muestras': total_muestras,
+        'tiene_modelo': tiene_modelo,
+        'puede_entrenar': total_muestras >= DATOS_CONFIG['samples_minimos'],
+        'recoleccion_completa': total_muestras >= recomendadas,
+        'progreso_porcentaje': round((total_muestras / recomendadas) * 100, 1),
+        'muestras_restantes': max(0, recomendadas - total_muestras),
+        'cantidad_recomendada': recomendadas
+    }
+
+def contar_muestras_en_disco(clase: str) -> int:
+    """Cuenta las muestras guardadas de una clase en el backend de persistencia."""
+    try:
+        return persistencia_muestras.contar(clase)
+    except:
+        return 0
+
+class AgregadorEstadisticas:
+    """Estadísticas precalculadas de todas las categorías, actualizadas por eventos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cargado = False
+        self._muestras = {}       # {clase: int}
+        self._modelos = {}        # {clase: bool}
+        self._por_clase = {}      # {clase: dict}
+        self._por_categoria = {}  # {categoria: dict}
+        self._global = None
+        self._suscriptores = []   # callbacks(version, clase, estadisticas)
+        self._version = 0
+        self._ultima_modificacion = time.time()
+
+    def recargar(self):
+        """Recalcula todo desde disco (solo al iniciar o si los archivos cambian por fuera)."""
+        with self._lock:
+            for categoria, clases in CLASES_DISPONIBLES.items():
+                for clase in clases:
+                    self._muestras[clase] = contar_muestras_en_disco(clase)
+                    self._modelos[clase] = os.path.exists(obtener_ruta_modelo(clase))
+                    self._por_clase[clase] = calcular_estadisticas_clase(
+                        self._muestras[clase], self._modelos[clase]
+                    )
+                self._recalcular_categoria(categoria)
+            self._recalcular_global()
+            self._cargado = True
+
+    def _asegurar_cargado(self):
+        if not self._cargado:
+            self.recargar()
+
+    def _recalcular_categoria(self, categoria: str):
+        clases = CLASES_DISPONIBLES[categoria]
+        estadisticas = {clase: self._por_clase[clase] for clase in clases}
+        completas = sum(1 for stats in estadisticas.values() if stats['recoleccion_completa'])
+        total_muestras = sum(stats['total_muestras'] for stats in estadisticas.values())
+        clave_total, clave_completas = CLAVES_RESUMEN[categoria]
+
+        self._por_categoria[categoria] = {
+            "estadisticas": estadisticas,
+            "resumen": {
+                clave_total: len(clases),
+                clave_completas: completas,
+                "progreso": f"{round((completas / len(clases)) * 100, 1)}%",
+                "total_muestras": total_muestras,
+                "objetivo_muestras": len(clases) * DATOS_CONFIG['samples_recomendados']
+            }
+        }
+
+    def _recalcular_global(self):
+        total_clases = sum(len(clases) for clases in CLASES_DISPONIBLES.values())
+        clases_completas = sum(
+            self._por_categoria[categoria]["resumen"][CLAVES_RESUMEN[categoria][1]]
+            for categoria in CLASES_DISPONIBLES
+        )
+        total_muestras = sum(
+            self._por_categoria[categoria]["resumen"]["total_muestras"]
+            for categoria in CLASES_DISPONIBLES
+        )
+
+        snapshot = {
+            "resumen_global": {
+                "total_clases": total_clases,
+                "clases_completas": clases_completas,
+                "progreso_total": f"{round((clases_completas / total_clases) * 100, 1)}%",
+                "total_muestras": total_muestras,
+                "objetivo_total_muestras": total_clases * DATOS_CONFIG['samples_recomendados']
+            }
+        }
+        snapshot.update(self._por_categoria)
+        snapshot["configuracion"] = DATOS_CONFIG
+        self._global = snapshot
+        self._version += 1
+        self._ultima_modificacion = time.time()
+
+    def _actualizar_clase(self, clase: str, total_muestras: Optional[int] = None,
+                          tiene_modelo: Optional[bool] = None):
+        self._asegurar_cargado()
+        with self._lock:
+            if total_muestras is not None:
+                self._muestras[clase] = total_muestras
+            if tiene_modelo is not None:
+                self._modelos[clase] = tiene_modelo
+            self._por_clase[clase] = calcular_estadisticas_clase(
+                self._muestras[clase], self._modelos[clase]
+            )
+            for categoria, clases in CLASES_DISPONIBLES.items():
+                if clase in clases:
+                    self._recalcular_categoria(categoria)
+            self._recalcular_global()
+            version = self._version
+            estadisticas = dict(self._por_clase[clase])
+
+        for callback in list(self._suscriptores):
+            callback(version, clase, estadisticas)
+
+    # --- Suscripciones ---
+
+    def suscribir(self, callback: Callable[[int, str, Dict], None]):
+        """Registra un callback que se llama cada vez que cambian las estadísticas de una clase."""
+        self._suscriptores.append(callback)
+
+    def desuscribir(self, callback: Callable[[int, str, Dict], None]):
+        """Elimina un callback registrado con suscribir()."""
+        if callback in self._suscriptores:
+            self._suscriptores.remove(callback)
+
+    # --- Eventos ---
+
+    def registrar_guardado(self, clase: str, total_muestras: int):
+        """Las muestras de la clase se guardaron en disco; total_muestras es el nuevo total."""
+        self._actualizar_clase(clase, total_muestras=total_muestras)
+
+    def registrar_eliminacion_datos(self, clase: str):
+        """Los datos de la clase se eliminaron."""
+        self._actualizar_clase(clase, total_muestras=0)
+
+    def registrar_modelo(self, clase: str, tiene_modelo: bool):
+        """Se entrenó (True) o eliminó (False) el modelo de la clase."""
+        self._actualizar_clase(clase, tiene_modelo=tiene_modelo)
+
+    # --- Consultas ---
+
+    @property
+    def version(self) -> int:
+        """Contador que aumenta con cada cambio de datos o modelos."""
+        self._asegurar_cargado()
+        return self._version
+
+    @property
+    def ultima_modificacion(self) -> float:
+        """Momento (epoch) del último cambio de datos o modelos."""
+        self._asegurar_cargado()
+        return self._ultima_modificacion
+
+    def total_muestras(self, clase: str) -> int:
+        """Número de muestras guardadas en disco de una clase."""
+        self._asegurar_cargado()
+        return self._muestras[clase]
+
+    def tiene_modelo(self, clase: str) -> bool:
+        """Indica si la clase tiene un modelo entrenado."""
+        self._asegurar_cargado()
+        return self._modelos[clase]
+
+    def obtener_clase(self, clase: str) -> Dict:
+        """Estadísticas de una clase (copia que el llamador puede modificar)."""
+        self._asegurar_cargado()
+        return dict(self._por_clase[clase])
+
+    def obtener_global(self) -> Dict:
+        """Snapshot precalculado de las estadísticas globales (no debe modificarse)."""
+        self._asegurar_cargado()
+        return self._global
+
+# Instancia global del agregador
+agregador_estadisticas = AgregadorEstadisticas()
+inspector_memoria.registrar_estructura("estadisticas", agregador_estadisticas)
@@ -0,0 +1,92 @@
+"""
+Filtro de frames casi duplicados en la recolección.
+Mantener una pose un segundo envía ~30 frames prácticamente iguales. Cada frame
+se normaliza (relativo a la muñeca y escalado por el tamaño de la mano) y se
+compara, en una sola operación vectorizada, con los últimos frames aceptados de
+su clase; si está demasiado cerca de alguno se descarta en lugar de encolarlo.
+"""
+
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from caracteristicas import normalizar_puntos
+from config import FILTRO_DUPLICADOS_CONFIG
+from metricas import metrica_filtro_duplicados
+
+class BufferCircular:
+    """Últimos N frames normalizados aceptados de una clase, como una matriz (N, 63)."""
+
+    __slots__ = ("frames", "llenos", "siguiente")
+
+    def __init__(self, capacidad: int, dimension: int):
+        self.frames = np.zeros((capacidad, dimension), dtype=np.float32)
+        self.llenos = 0
+        self.siguiente = 0
+
+    def distancia_minima(self, frame: np.ndarray) -> float:
+        """Distancia L2 media por punto al frame más cercano del buffer (inf si está vacío)."""
+        if not self.llenos:
+            return float("inf")
+        diferencias = self.frames[:self.llenos] - frame
+        return float(np.sqrt(np.einsum("ij,ij->i", diferencias, diferencias).min() / (frame.size // 3)))
+
+    def agregar(self, frame: np.ndarray):
+        self.frames[self.siguiente] = frame
+        self.siguiente = (self.siguiente + 1) % len(self.frames)
+        self.llenos = min(self.llenos + 1, len(self.frames))
+
+class FiltroDuplicados:
+    """Buffers por clase y conteos de frames aceptados y suprimidos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = {}  # {clase: BufferCircular}
+        self._conteos = {}  # {clase: {"aceptadas": int, "suprimidas": int}}
+
+    def es_duplicado(self, categoria: str, clase: str, puntos_clave: List[List[float]]) -> bool:
+        """Indica si el frame está demasiado cerca de uno reciente; si no lo está, lo recuerda."""
+        if not FILTRO_DUPLICADOS_CONFIG['activo']:
+            return False
+
+        frame = normalizar_puntos(np.asarray(puntos_clave, dtype=np.float32)).ravel()
+        with self._lock:
+            buffer = self._buffers.get(clase)
+            if buffer is None or buffer.frames.shape != (FILTRO_DUPLICADOS_CONFIG['tamano_buffer'], frame.size):
+                buffer = self._buffers[clase] = BufferCircular(FILTRO_DUPLICADOS_CONFIG['tamano_buffer'], frame.size)
+            conteo = self._conteos.setdefault(clase, {"aceptadas": 0, "suprimidas": 0})
+
+            duplicado = buffer.distancia_minima(frame) < FILTRO_DUPLICADOS_CONFIG['distancia_minima']
+            if duplicado:
+                conteo["suprimidas"] += 1
+            else:
+                conteo["aceptadas"] += 1
+                buffer.agregar(frame)
+
+        metrica_filtro_duplicados.incrementar(categoria, "suprimida" if duplicado else "aceptada")
+        return duplicado
+
+    def olvidar(self, clase: str):
+        """Vacía el buffer de la clase (p.ej. al eliminar sus datos)."""
+        with self._lock:
+            self._buffers.pop(clase, None)
+
+    def conteos(self, clase: str) -> Dict[str, int]:
+        """Frames aceptados y suprimidos de la clase desde que arrancó el worker."""
+        return dict(self._conteos.get(clase, {"aceptadas": 0, "suprimidas": 0}))
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            por_clase = {clase: dict(conteo) for clase, conteo in self._conteos.items()}
+        return {
+            "activo": FILTRO_DUPLICADOS_CONFIG['activo'],
+            "distancia_minima": FILTRO_DUPLICADOS_CONFIG['distancia_minima'],
+            "tamano_buffer": FILTRO_DUPLICADOS_CONFIG['tamano_buffer'],
+            "aceptadas": sum(c["aceptadas"] for c in por_clase.values()),
+            "suprimidas": sum(c["suprimidas"] for c in por_clase.values()),
+            "por_clase": por_clase
+        }
+
+# Instancia global del filtro
+filtro_duplicados = FiltroDuplicados()
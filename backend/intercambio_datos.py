@@ -0,0 +1,218 @@
+"""
+Exportación e importación de conjuntos de datos de muestras.
+Dos formatos:
+
+- ndjson: una muestra por línea, {"categoria", "clase", "timestamp", "landmarks"}.
+- zip: por clase, shards <categoria>/<clase>/<n>.npy con los landmarks (N, 21, 3)
+  en float32 y <n>.json con sus timestamps, y un manifiesto.json al final.
+
+La exportación se genera clase a clase y se entrega por trozos sin tener todo el
+conjunto en memoria. La importación procesa la entrada a medida que llega e
+inserta en bloques con el almacén, que respeta samples_maximos; las muestras
+cuyo timestamp ya existe en la clase (o ya apareció en la importación) se descartan.
+"""
+
+import io
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from almacen_muestras import almacen_muestras
+from config import CLASE_A_CATEGORIA, CLASES_DISPONIBLES, INTERCAMBIO_CONFIG
+from respuestas import serializar_json
+from utils import validar_puntos_clave
+
+FORMATO_ZIP = "muestras-shards"
+VERSION_FORMATO = 1
+LINEAS_POR_TROZO = 500  # Líneas NDJSON por trozo enviado
+
+def landmarks_validos(landmarks) -> bool:
+    """21 puntos de 3 coordenadas numéricas."""
+    if not isinstance(landmarks, list) or not validar_puntos_clave(landmarks):
+        return False
+    try:
+        return bool(np.isfinite(np.asarray(landmarks, dtype=np.float64)).all())
+    except (TypeError, ValueError):
+        return False
+
+def clases_a_exportar(categoria: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Pares (categoria, clase) de una categoría o de todas."""
+    categorias = [categoria] if categoria else list(CLASES_DISPONIBLES)
+    return [(nombre_categoria, clase) for nombre_categoria in categorias for clase in CLASES_DISPONIBLES[nombre_categoria]]
+
+# --- Exportación ---
+
+def exportar_ndjson(categoria: Optional[str] = None, almacen=almacen_muestras) -> Iterator[bytes]:
+    """Muestras como NDJSON, en trozos de LINEAS_POR_TROZO líneas."""
+    for nombre_categoria, clase in clases_a_exportar(categoria):
+        lineas = []
+        for muestra in almacen.persistencia.iterar(clase):
+            if 'landmarks' not in muestra:
+                continue
+            lineas.append(serializar_json({
+                "categoria": nombre_categoria,
+                "clase": clase,
+                "timestamp": muestra.get('timestamp'),
+                "landmarks": muestra['landmarks']
+            }))
+            if len(lineas) >= LINEAS_POR_TROZO:
+                yield b"\n".join(lineas) + b"\n"
+                lineas = []
+        if lineas:
+            yield b"\n".join(lineas) + b"\n"
+
+class _SalidaPorTrozos:
+    """Destino de solo escritura para zipfile: acumula lo escrito hasta que se recoge."""
+
+    def __init__(self):
+        self._trozos = []
+
+    def write(self, datos) -> int:
+        self._trozos.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def recoger(self) -> bytes:
+        datos = b"".join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+def _escribir_shard(archivo: zipfile.ZipFile, ruta_base: str, muestras: List[Dict]):
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray([muestra['landmarks'] for muestra in muestras], dtype=np.float32))
+    archivo.writestr(f"{ruta_base}.npy", buffer.getvalue())
+    archivo.writestr(f"{ruta_base}.json", serializar_json({"timestamps": [muestra.get('timestamp') for muestra in muestras]}))
+
+def exportar_zip(categoria: Optional[str] = None, almacen=almacen_muestras) -> Iterator[bytes]:
+    """Zip de shards binarios, entregado shard a shard (sin comprimir: los float32 apenas comprimen)."""
+    salida = _SalidaPorTrozos()
+    manifiesto = {"formato": FORMATO_ZIP, "version": VERSION_FORMATO, "clases": {}}
+    with zipfile.ZipFile(salida, "w", zipfile.ZIP_STORED) as archivo:
+        for nombre_categoria, clase in clases_a_exportar(categoria):
+            shard, numero, total = [], 0, 0
+            for muestra in almacen.persistencia.iterar(clase):
+                if not validar_puntos_clave(muestra.get('landmarks', [])):
+                    continue
+                shard.append(muestra)
+                if len(shard) >= INTERCAMBIO_CONFIG['muestras_por_shard']:
+                    _escribir_shard(archivo, f"{nombre_categoria}/{clase}/{numero:05d}", shard)
+                    numero, total, shard = numero + 1, total + len(shard), []
+                    yield salida.recoger()
+            if shard:
+                _escribir_shard(archivo, f"{nombre_categoria}/{clase}/{numero:05d}", shard)
+                total += len(shard)
+                yield salida.recoger()
+            if total:
+                manifiesto["clases"][clase] = total
+        archivo.writestr("manifiesto.json", serializar_json(manifiesto))
+    yield salida.recoger()
+
+# --- Importación ---
+
+class ImportadorMuestras:
+    """
+    Acumula las muestras importadas por clase, descarta duplicadas e inválidas e
+    inserta en bloques de lote_importacion. Es bloqueante: usarlo desde un hilo.
+    """
+
+    def __init__(self, categoria: Optional[str] = None, almacen=almacen_muestras):
+        self.categoria = categoria
+        self.almacen = almacen
+        self._pendientes = {}  # {clase: [muestra]}
+        self._vistos = {}      # {clase: timestamps ya guardados o importados}
+        self.clases = {}       # {clase: {"importadas": int, "total": int}}
+        self.conteos = {
+            "procesadas": 0, "importadas": 0, "duplicadas": 0,
+            "descartadas_por_tope": 0, "invalidas": 0, "omitidas": 0
+        }
+
+    def agregar(self, registro: Dict):
+        """Procesa una muestra {"categoria", "clase", "timestamp", "landmarks"}."""
+        self.conteos["procesadas"] += 1
+        clase = registro.get("clase") if isinstance(registro, dict) else None
+        categoria = CLASE_A_CATEGORIA.get(clase) if isinstance(clase, str) else None
+        timestamp = registro.get("timestamp") if categoria else None
+        landmarks = registro.get("landmarks") if categoria else None
+        if (categoria is None or registro.get("categoria", categoria) != categoria
+                or not isinstance(timestamp, str) or not timestamp
+                or not landmarks_validos(landmarks)):
+            self.conteos["invalidas"] += 1
+            return
+        if self.categoria and categoria != self.categoria:
+            self.conteos["omitidas"] += 1
+            return
+
+        vistos = self._vistos.get(clase)
+        if vistos is None:
+            vistos = self._vistos[clase] = self.almacen.persistencia.timestamps(clase)
+        if timestamp in vistos:
+            self.conteos["duplicadas"] += 1
+            return
+        vistos.add(timestamp)
+
+        pendientes = self._pendientes.setdefault(clase, [])
+        pendientes.append({"landmarks": landmarks, "timestamp": timestamp, "clase": clase})
+        if len(pendientes) >= INTERCAMBIO_CONFIG['lote_importacion']:
+            self._insertar(clase)
+
+    def agregar_lineas(self, lineas: List[bytes]):
+        """Procesa líneas NDJSON (las vacías se ignoran)."""
+        for linea in lineas:
+            if not linea.strip():
+                continue
+            try:
+                registro = orjson.loads(linea)
+            except orjson.JSONDecodeError:
+                self.conteos["procesadas"] += 1
+                self.conteos["invalidas"] += 1
+                continue
+            self.agregar(registro)
+
+    def agregar_zip(self, archivo: BinaryIO):
+        """Procesa un zip exportado con exportar_zip, shard a shard."""
+        try:
+            zip_entrada = zipfile.ZipFile(archivo)
+        except zipfile.BadZipFile:
+            raise ValueError("El archivo no es un zip válido")
+
+        with zip_entrada:
+            for nombre in sorted(zip_entrada.namelist()):
+                partes = nombre[:-len(".npy")].split("/")
+                if not nombre.endswith(".npy") or len(partes) != 3:
+                    continue
+                try:
+                    with zip_entrada.open(nombre) as f:
+                        landmarks = np.load(f, allow_pickle=False)
+                    timestamps = orjson.loads(zip_entrada.read(nombre[:-len(".npy")] + ".json"))["timestamps"]
+                except (KeyError, ValueError, TypeError) as e:
+                    print(f"Shard '{nombre}' inválido: {e}")
+                    continue
+                if landmarks.ndim != 3 or landmarks.shape[1:] != (21, 3) or len(landmarks) != len(timestamps):
+                    print(f"Shard '{nombre}' inválido: landmarks {landmarks.shape} y {len(timestamps)} timestamps")
+                    continue
+
+                categoria, clase, _ = partes
+                # Redondeo para no importar el ruido de float32 (0.1 -> 0.10000000149011612)
+                for timestamp, puntos in zip(timestamps, np.round(landmarks.astype(np.float64), 7).tolist()):
+                    self.agregar({"categoria": categoria, "clase": clase, "timestamp": timestamp, "landmarks": puntos})
+
+    def _insertar(self, clase: str):
+        lote = self._pendientes.pop(clase, [])
+        if not lote:
+            return
+        resultado = self.almacen.guardar_lote(CLASE_A_CATEGORIA[clase], clase, lote)
+        self.conteos["importadas"] += resultado["guardadas"]
+        self.conteos["descartadas_por_tope"] += resultado["descartadas"]
+        resumen = self.clases.setdefault(clase, {"importadas": 0, "total": 0})
+        resumen["importadas"] += resultado["guardadas"]
+        resumen["total"] = resultado["total"]
+
+    def terminar(self) -> Dict:
+        """Inserta lo pendiente y devuelve el resumen de la importación."""
+        for clase in list(self._pendientes):
+            self._insertar(clase)
+        return {**self.conteos, "clases": self.clases}
@@ -1,18 +1,52 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes.routes_generales import router as router_general
+from routes.routes_generales import router as router_general, router_metricas
 from routes.vocales.routes_vocales import router as router_vocales
 from routes.numeros.routes_numeros import router as router_numeros
 from routes.operaciones.routes_operaciones import router as router_operaciones
+from routes.routes_admin import router as router_admin
+from routes.routes_datos import router as router_datos
 from utils import crear_directorios
+from respuestas import RespuestaJSONRapida, MiddlewareCompresion
+from salud import monitor_salud
+from almacen_muestras import almacen_muestras
+from math_evaluator import cerrar_cliente_http
+from metricas import MiddlewareMetricas
+from perfilado import MiddlewareInstrumentacion
+from admision import MiddlewareAdmision
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """Arranca y detiene las tareas de fondo del proceso."""
+    monitor_salud.iniciar()  # Medición del retraso del event loop
+    yield
+    await almacen_muestras.vaciar_pendientes()  # No perder las muestras en cola al apagar
+    await cerrar_cliente_http()  # Conexiones del cliente de predicción remota
+    await monitor_salud.detener()
 
 # Crear la aplicación FastAPI
 app = FastAPI(
     title="MediaPipe API Collection", 
     version="1.0.0",
-    description="API para recolección de datos y entrenamiento de modelos con MediaPipe"
+    description="API para recolección de datos y entrenamiento de modelos con MediaPipe",
+    default_response_class=RespuestaJSONRapida,
+    lifespan=ciclo_de_vida
 )
 
+# Comprimir (brotli/gzip) las respuestas grandes
+app.add_middleware(MiddlewareCompresion)
+
+# Server-Timing y capturas de perfil (sin costo mientras estén desactivados)
+app.add_middleware(MiddlewareInstrumentacion)
+
+# Latencia por ruta para /metrics
+app.add_middleware(MiddlewareMetricas)
+
+# Límites de tasa e inferencias en curso (rechaza con 429/503 antes de leer el cuerpo)
+app.add_middleware(MiddlewareAdmision)
+
 # Configurar CORS para permitir peticiones desde cualquier origen
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +64,9 @@ app.include_router(router_general)      # Rutas generales: /api/...
 app.include_router(router_vocales)      # Rutas de vocales: /api/vocales/...
 app.include_router(router_numeros)      # Rutas de números: /api/numeros/...
 app.include_router(router_operaciones)  # Rutas de operaciones: /api/operaciones/...
+app.include_router(router_admin)        # Diagnóstico: /api/admin/...
+app.include_router(router_datos)        # Exportar/importar muestras: /api/datos/...
+app.include_router(router_metricas)     # Métricas de Prometheus: /metrics
 
 
 
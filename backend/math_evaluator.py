@@ -4,11 +4,17 @@ Maneja precedencia de operadores y devuelve pasos intermedios.
 Incluye predicción de números por señas.
 """
 
+import math
 import re
-import requests
-from typing import List, Dict, Union, Tuple
+import time
+from typing import List, Dict, Union, Tuple, Optional, Iterable, Iterator
 from decimal import Decimal, InvalidOperation
 
+from config import LIMITES_EXPRESION, PREDICCION_CONFIG
+
+# Modos de generación de pasos intermedios
+MODOS_PASOS = ("none", "summary", "full")
+
 class MathEvaluator:
     """Evaluador de expresiones matemáticas con soporte para precedencia de operadores."""
     
@@ -75,6 +81,97 @@ class MathEvaluator:
         
         return True, "Expresión válida"
     
+    def tokenizar(self, expresion: str, limites: Dict = LIMITES_EXPRESION) -> List[str]:
+        """
+        Convierte una expresión en texto a una lista de tokens normalizados.
+
+        Acepta números, operadores (+, -, *, /, ×, ÷), paréntesis y los nombres
+        humanos de las operaciones ('mas', 'menos', ...). El '-' unario se une al
+        número que le sigue; delante de un paréntesis, '-(a)' se convierte en
+        '(-1 * (a))'. Aplica los límites de tokens y de dígitos por operando
+        para que el costo de evaluar cada expresión sea acotado.
+        """
+        tokens = []
+        parentesis_negados = []  # Por cada '(' abierto, si va precedido de '-' unario
+        espera_operando = True
+        i = 0
+        n = len(expresion)
+
+        while i < n:
+            caracter = expresion[i]
+
+            if caracter.isspace():
+                i += 1
+                continue
+
+            if caracter.isdigit() or caracter == '.' or (caracter == '-' and espera_operando):
+                inicio = i
+                if caracter == '-':
+                    i += 1
+                    while i < n and expresion[i].isspace():
+                        i += 1
+                    if i < n and expresion[i] == '(':
+                        tokens.extend(['(', '-1', '*', '('])
+                        parentesis_negados.append(True)
+                        i += 1
+                        continue
+                match = re.match(r'\d+(\.\d+)?|\.\d+', expresion[i:])
+                if not match:
+                    raise ValueError(f"Número inválido en la posición {inicio + 1}")
+                numero = match.group(0)
+                digitos = len(numero.replace('.', ''))
+                if digitos > limites['max_digitos_operando']:
+                    raise ValueError(
+                        f"El número '{numero}' excede el máximo de {limites['max_digitos_operando']} dígitos"
+                    )
+                tokens.append(('-' if caracter == '-' else '') + numero)
+                i += len(numero)
+                espera_operando = False
+            elif caracter.isalpha():
+                match = re.match(r'[^\W\d_]+', expresion[i:])
+                palabra = match.group(0)
+                simbolo = self.mapeo_simbolos.get(palabra.lower())
+                if simbolo is None:
+                    raise ValueError(f"Símbolo desconocido '{palabra}' en la posición {i + 1}")
+                if espera_operando:
+                    raise ValueError(f"Se esperaba un número en la posición {i + 1}, se encontró '{palabra}'")
+                tokens.append(simbolo)
+                i += len(palabra)
+                espera_operando = True
+            elif caracter in self.precedencia:
+                if espera_operando:
+                    raise ValueError(f"Se esperaba un número en la posición {i + 1}, se encontró '{caracter}'")
+                tokens.append(self.mapeo_simbolos.get(caracter, caracter))
+                i += 1
+                espera_operando = True
+            elif caracter == '(':
+                if not espera_operando:
+                    raise ValueError(f"Se esperaba un operador en la posición {i + 1}, se encontró '('")
+                tokens.append(caracter)
+                parentesis_negados.append(False)
+                i += 1
+            elif caracter == ')':
+                if espera_operando or not parentesis_negados:
+                    raise ValueError(f"Paréntesis de cierre inesperado en la posición {i + 1}")
+                tokens.append(caracter)
+                if parentesis_negados.pop():
+                    tokens.append(')')
+                i += 1
+            else:
+                raise ValueError(f"Carácter no válido '{caracter}' en la posición {i + 1}")
+
+            if len(tokens) > limites['max_tokens']:
+                raise ValueError(f"La expresión excede el máximo de {limites['max_tokens']} tokens")
+
+        if not tokens:
+            raise ValueError("Expresión vacía")
+        if espera_operando:
+            raise ValueError("La expresión debe terminar con un número")
+        if parentesis_negados:
+            raise ValueError("Paréntesis sin cerrar")
+
+        return tokens
+
     def _es_numero(self, simbolo: str) -> bool:
         """Verifica si un símbolo es un número válido."""
         try:
@@ -83,41 +180,6 @@ class MathEvaluator:
         except ValueError:
             return False
     
-    def predecir_numero_por_senas(self, datos_imagen: str, base_url: str = "http://localhost:8000") -> Union[str, None]:
-        """
-        Predice un número a partir de datos de imagen usando el endpoint de números.
-        
-        Args:
-            datos_imagen: Datos de la imagen en base64
-            base_url: URL base del servidor API
-            
-        Returns:
-            El número predicho como string o None si hay error
-        """
-        try:
-            url = f"{base_url}/api/numeros/prediccion"
-            payload = {"datos_imagen": datos_imagen}
-            
-            response = requests.post(url, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                resultado = response.json()
-                if resultado.get("exito"):
-                    return str(resultado.get("numero_predicho"))
-                else:
-                    print(f"Error en predicción: {resultado.get('error', 'Error desconocido')}")
-                    return None
-            else:
-                print(f"Error HTTP {response.status_code}: {response.text}")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            print(f"Error de conexión al predecir número: {e}")
-            return None
-        except Exception as e:
-            print(f"Error inesperado al predecir número: {e}")
-            return None
-    
     def _es_operador(self, simbolo: str) -> bool:
         """Verifica si un símbolo es un operador válido."""
         return simbolo in self.precedencia
@@ -152,43 +214,97 @@ class MathEvaluator:
         
         return salida
     
-    def evaluar_postfijo(self, expresion_postfijo: List[str]) -> Tuple[float, List[Dict]]:
-        """Evalúa una expresión en notación postfija y devuelve el resultado con pasos."""
+    def _operar(self, operador: str, a: float, b: float) -> float:
+        """Aplica un operador binario a dos operandos."""
+        if operador == '+':
+            resultado = a + b
+        elif operador == '-':
+            resultado = a - b
+        elif operador == '*':
+            resultado = a * b
+        elif operador == '/':
+            if b == 0:
+                raise ValueError("División por cero")
+            resultado = a / b
+        else:
+            raise ValueError(f"Operador desconocido: {operador}")
+        
+        if not math.isfinite(resultado):
+            raise ValueError("Resultado fuera de rango")
+        
+        return resultado
+    
+    def evaluar_postfijo(self, expresion_postfijo: List[str], max_pasos: Optional[int] = None,
+                         pasos: str = "full") -> Tuple[float, Iterable[Dict]]:
+        """
+        Evalúa una expresión en notación postfija y devuelve el resultado con pasos.
+        
+        Modos de pasos:
+            none: no se generan pasos (lista vacía).
+            summary: solo las operaciones evaluadas, sin copias de la pila.
+            full: todos los pasos con la pila en cada momento; se generan de forma
+                  diferida al iterar, así que no se copia la pila por adelantado.
+        """
+        if pasos not in MODOS_PASOS:
+            raise ValueError(f"Modo de pasos '{pasos}' no válido. Modos disponibles: {list(MODOS_PASOS)}")
+        
+        if max_pasos is not None and len(expresion_postfijo) > max_pasos:
+            raise ValueError(f"La expresión excede el máximo de {max_pasos} pasos de evaluación")
+        
+        pila = []
+        operaciones = []
+        
+        for simbolo in expresion_postfijo:
+            if self._es_numero(simbolo):
+                pila.append(float(simbolo))
+            elif self._es_operador(simbolo):
+                if len(pila) < 2:
+                    raise ValueError(f"Operador '{simbolo}' requiere dos operandos")
+                
+                b = pila.pop()
+                a = pila.pop()
+                resultado = self._operar(simbolo, a, b)
+                pila.append(resultado)
+                
+                if pasos == "summary":
+                    operaciones.append({
+                        "accion": "evaluar_operacion",
+                        "operador": simbolo,
+                        "operando_a": a,
+                        "operando_b": b,
+                        "resultado": resultado,
+                        "expresion": f"{a} {simbolo} {b} = {resultado}"
+                    })
+        
+        if len(pila) != 1:
+            raise ValueError("Expresión malformada")
+        
+        if pasos == "full":
+            # La expresión ya se validó arriba, así que el generador no puede fallar
+            return pila[0], self._generar_pasos(expresion_postfijo)
+        
+        return pila[0], operaciones
+    
+    def _generar_pasos(self, expresion_postfijo: List[str]) -> Iterator[Dict]:
+        """Genera uno a uno los pasos completos (con la pila) de una expresión postfija ya validada."""
         pila = []
-        pasos = []
         
         for simbolo in expresion_postfijo:
             if self._es_numero(simbolo):
                 numero = float(simbolo)
                 pila.append(numero)
-                pasos.append({
+                yield {
                     "accion": "apilar_numero",
                     "simbolo": simbolo,
                     "valor": numero,
                     "pila": pila.copy()
-                })
+                }
             elif self._es_operador(simbolo):
-                if len(pila) < 2:
-                    raise ValueError(f"Operador '{simbolo}' requiere dos operandos")
-                
                 b = pila.pop()
                 a = pila.pop()
-                
-                if simbolo == '+':
-                    resultado = a + b
-                elif simbolo == '-':
-                    resultado = a - b
-                elif simbolo == '*':
-                    resultado = a * b
-                elif simbolo == '/':
-                    if b == 0:
-                        raise ValueError("División por cero")
-                    resultado = a / b
-                else:
-                    raise ValueError(f"Operador desconocido: {simbolo}")
-                
+                resultado = self._operar(simbolo, a, b)
                 pila.append(resultado)
-                pasos.append({
+                yield {
                     "accion": "evaluar_operacion",
                     "operador": simbolo,
                     "operando_a": a,
@@ -196,14 +312,9 @@ class MathEvaluator:
                     "resultado": resultado,
                     "expresion": f"{a} {simbolo} {b} = {resultado}",
                     "pila": pila.copy()
-                })
-        
-        if len(pila) != 1:
-            raise ValueError("Expresión malformada")
-        
-        return pila[0], pasos
+                }
     
-    def evaluar(self, simbolos: List[str]) -> Dict:
+    def evaluar(self, simbolos: List[str], pasos: str = "full") -> Dict:
         """Evalúa una expresión matemática completa y devuelve resultado detallado."""
         try:
             # Normalizar símbolos
@@ -223,18 +334,22 @@ class MathEvaluator:
             expresion_postfijo = self.convertir_a_postfijo(simbolos_normalizados)
             
             # Evaluar
-            resultado, pasos = self.evaluar_postfijo(expresion_postfijo)
+            resultado, lista_pasos = self.evaluar_postfijo(expresion_postfijo, pasos=pasos)
             
-            return {
+            respuesta = {
                 "exito": True,
                 "resultado": resultado,
                 "simbolos_originales": simbolos,
                 "simbolos_normalizados": simbolos_normalizados,
                 "expresion_infija": " ".join(simbolos_normalizados),
                 "expresion_postfijo": expresion_postfijo,
-                "pasos": pasos,
-                "total_operaciones": len([p for p in pasos if p["accion"] == "evaluar_operacion"])
+                "total_operaciones": sum(1 for s in expresion_postfijo if self._es_operador(s)),
+                "modo_pasos": pasos
             }
+            if pasos != "none":
+                respuesta["pasos"] = lista_pasos
+            
+            return respuesta
             
         except Exception as e:
             return {
@@ -244,51 +359,173 @@ class MathEvaluator:
                 "simbolos_normalizados": simbolos_normalizados if 'simbolos_normalizados' in locals() else []
             }
 
+class SesionExpresion:
+    """
+    Expresión construida token a token (por ejemplo, a partir de señas).
+
+    Mantiene el estado de Shunting-Yard ya reducido: como solo hay dos niveles de
+    precedencia, basta con la suma de los términos cerrados y el término
+    multiplicativo en curso. Cada token se valida y aplica en O(1) y el resultado
+    parcial está siempre disponible. Deshacer restaura el estado anterior en O(1).
+    """
+
+    def __init__(self, evaluador: 'MathEvaluator', limites: Dict = LIMITES_EXPRESION):
+        self.evaluador = evaluador
+        self.limites = limites
+        self.simbolos = []
+        self.creada = time.time()
+        self.ultimo_uso = self.creada
+        # Estado: (suma de términos cerrados, signo del término, término en curso, operador pendiente)
+        self._estado = (0.0, 1.0, None, None)
+        self._historial = []
+
+    @property
+    def espera_operando(self) -> bool:
+        """Indica si el siguiente token debe ser un número."""
+        return not self.simbolos or self._es_operador_normalizado(self.simbolos[-1])
+
+    def _es_operador_normalizado(self, simbolo: str) -> bool:
+        """Verifica si un símbolo ya normalizado es un operador."""
+        return simbolo in ('+', '-', '*', '/')
+
+    def agregar_token(self, token: str) -> Dict:
+        """Valida y aplica un token. Lanza ValueError si no es válido en esta posición."""
+        self.ultimo_uso = time.time()
+        simbolo = self.evaluador.normalizar_simbolos([token])[0].strip()
+
+        if len(self.simbolos) >= self.limites['max_tokens']:
+            raise ValueError(f"La expresión excede el máximo de {self.limites['max_tokens']} tokens")
+
+        suma, signo, termino, pendiente = self._estado
+
+        if self.espera_operando:
+            if not self.evaluador._es_numero(simbolo) or not math.isfinite(float(simbolo)):
+                raise ValueError(f"Se esperaba un número, se encontró '{token}'")
+            if len(simbolo.lstrip('-').replace('.', '')) > self.limites['max_digitos_operando']:
+                raise ValueError(
+                    f"El número '{simbolo}' excede el máximo de {self.limites['max_digitos_operando']} dígitos"
+                )
+            numero = float(simbolo)
+            termino = numero if pendiente is None else self.evaluador._operar(pendiente, termino, numero)
+            nuevo_estado = (suma, signo, termino, None)
+        else:
+            if not self._es_operador_normalizado(simbolo):
+                raise ValueError(f"Se esperaba un operador, se encontró '{token}'")
+            if simbolo in ('+', '-'):
+                # Cerrar el término actual: los operadores pendientes de mayor precedencia ya se aplicaron
+                suma = suma + signo * termino
+                if not math.isfinite(suma):
+                    raise ValueError("Resultado fuera de rango")
+                nuevo_estado = (suma, 1.0 if simbolo == '+' else -1.0, None, None)
+            else:
+                nuevo_estado = (suma, signo, termino, simbolo)
+
+        self._historial.append(self._estado)
+        self._estado = nuevo_estado
+        self.simbolos.append(simbolo)
+        return self.obtener_estado()
+
+    def deshacer(self) -> Dict:
+        """Elimina el último token agregado."""
+        self.ultimo_uso = time.time()
+        if not self.simbolos:
+            raise ValueError("No hay tokens para deshacer")
+        self.simbolos.pop()
+        self._estado = self._historial.pop()
+        return self.obtener_estado()
+
+    def resultado_parcial(self) -> Optional[float]:
+        """Resultado de la parte completa de la expresión (ignora un operador final)."""
+        suma, signo, termino, pendiente = self._estado
+        if not self.simbolos:
+            return None
+        if termino is None:
+            # Termina en '+' o '-': el último término ya se sumó
+            return suma
+        return suma + signo * termino
+
+    def obtener_estado(self) -> Dict:
+        """Estado actual de la sesión sin reevaluar la expresión."""
+        return {
+            "simbolos": list(self.simbolos),
+            "expresion_infija": " ".join(self.simbolos),
+            "valida": bool(self.simbolos) and not self.espera_operando,
+            "espera": "numero" if self.espera_operando else "operador",
+            "resultado_parcial": self.resultado_parcial(),
+            "total_tokens": len(self.simbolos)
+        }
+
 # Instancia global del evaluador
 evaluador_matematico = MathEvaluator()
 
-def evaluar_expresion_matematica(simbolos: List[str]) -> Dict:
+def evaluar_expresion_matematica(simbolos: List[str], pasos: str = "full") -> Dict:
     """Función de conveniencia para evaluar una expresión matemática."""
-    return evaluador_matematico.evaluar(simbolos)
+    return evaluador_matematico.evaluar(simbolos, pasos)
+
+# Cliente HTTP compartido (pool de conexiones) para la predicción remota
+_cliente_http = None
 
-def predecir_numero_desde_imagen(datos_imagen: str, base_url: str = "http://localhost:8000") -> Union[str, None]:
+def _obtener_cliente_http():
+    """Crea una sola vez el cliente HTTP asíncrono usado cuando la predicción es remota."""
+    global _cliente_http
+    if _cliente_http is None:
+        import httpx
+        _cliente_http = httpx.AsyncClient(
+            base_url=PREDICCION_CONFIG['url_remota'],
+            timeout=PREDICCION_CONFIG['timeout_segundos'],
+            limits=httpx.Limits(max_connections=PREDICCION_CONFIG['max_conexiones'])
+        )
+    return _cliente_http
+
+async def cerrar_cliente_http():
+    """Cierra el cliente HTTP compartido (si llegó a crearse) y sus conexiones; se llama al apagar."""
+    global _cliente_http
+    if _cliente_http is not None:
+        cliente, _cliente_http = _cliente_http, None
+        await cliente.aclose()
+
+async def predecir_numeros_por_senas(lote_puntos_clave: List[List[List[float]]]) -> List[Dict]:
     """
-    Función de conveniencia para predecir un número desde una imagen usando señas.
+    Predice en un solo lote los números representados por varias señas.
+    
+    Usa los modelos de números del mismo proceso; si PREDICCION_CONFIG['url_remota']
+    está configurada, envía el lote completo en una sola petición al servidor remoto.
     
     Args:
-        datos_imagen: Datos de la imagen en base64
-        base_url: URL base del servidor API
+        lote_puntos_clave: Lista de señas, cada una con 21 puntos clave [x, y, z]
         
     Returns:
-        El número predicho como string o None si hay error
+        Una predicción por seña con 'clase_predicha' y 'confianza'
     """
-    return evaluador_matematico.predecir_numero_por_senas(datos_imagen, base_url)
+    if PREDICCION_CONFIG['url_remota']:
+        respuesta = await _obtener_cliente_http().post(
+            "/api/numeros/prediccion/lote",
+            json={"lote_puntos_clave": lote_puntos_clave}
+        )
+        respuesta.raise_for_status()
+        return respuesta.json()["predicciones"]
+    
+    # Importación diferida: el evaluador no necesita TensorFlow para expresiones de texto
+    from models import predecir_lote_categoria
+    return await predecir_lote_categoria("numeros", lote_puntos_clave)
 
-def evaluar_expresion_con_prediccion_numeros(imagenes_numeros: List[str], simbolos_operadores: List[str], base_url: str = "http://localhost:8000") -> Dict:
+async def evaluar_expresion_con_prediccion_numeros(lote_puntos_clave: List[List[List[float]]], simbolos_operadores: List[str],
+                                                   pasos: str = "full") -> Dict:
     """
-    Evalúa una expresión matemática donde los números se predicen desde imágenes de señas.
+    Evalúa una expresión matemática donde los números se predicen desde señas.
     
     Args:
-        imagenes_numeros: Lista de imágenes en base64 que representan números
+        lote_puntos_clave: Puntos clave de cada seña de número, en orden
         simbolos_operadores: Lista de operadores matemáticos
-        base_url: URL base del servidor API
+        pasos: Modo de pasos intermedios ('none', 'summary' o 'full')
         
     Returns:
         Diccionario con el resultado de la evaluación
     """
     try:
-        # Predecir números desde las imágenes
-        numeros_predichos = []
-        for i, imagen in enumerate(imagenes_numeros):
-            numero_predicho = predecir_numero_desde_imagen(imagen, base_url)
-            if numero_predicho is None:
-                return {
-                    "exito": False,
-                    "error": f"No se pudo predecir el número de la imagen {i + 1}",
-                    "imagenes_procesadas": i,
-                    "numeros_predichos": numeros_predichos
-                }
-            numeros_predichos.append(numero_predicho)
+        # Predecir todos los números en una sola ronda de inferencia
+        predicciones = await predecir_numeros_por_senas(lote_puntos_clave)
+        numeros_predichos = [p["clase_predicha"] for p in predicciones]
         
         # Construir la expresión completa intercalando números y operadores
         expresion_completa = []
@@ -298,11 +535,12 @@ def evaluar_expresion_con_prediccion_numeros(imagenes_numeros: List[str], simbol
                 expresion_completa.append(simbolos_operadores[i])
         
         # Evaluar la expresión matemática
-        resultado_evaluacion = evaluar_expresion_matematica(expresion_completa)
+        resultado_evaluacion = evaluar_expresion_matematica(expresion_completa, pasos)
         
         # Agregar información adicional sobre la predicción
         resultado_evaluacion["numeros_predichos"] = numeros_predichos
-        resultado_evaluacion["total_imagenes_procesadas"] = len(imagenes_numeros)
+        resultado_evaluacion["confianzas"] = [p["confianza"] for p in predicciones]
+        resultado_evaluacion["total_senas_procesadas"] = len(lote_puntos_clave)
         resultado_evaluacion["operadores_utilizados"] = simbolos_operadores
         
         return resultado_evaluacion
@@ -312,5 +550,5 @@ def evaluar_expresion_con_prediccion_numeros(imagenes_numeros: List[str], simbol
             "exito": False,
             "error": f"Error al evaluar expresión con predicción de números: {str(e)}",
             "numeros_predichos": numeros_predichos if 'numeros_predichos' in locals() else [],
-            "total_imagenes_procesadas": len(imagenes_numeros) if imagenes_numeros else 0
-        }
\ No newline at end of file
+            "total_senas_procesadas": len(lote_puntos_clave) if lote_puntos_clave else 0
+        }
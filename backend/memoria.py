@@ -0,0 +1,208 @@
+"""
+Contabilidad de memoria del proceso y diagnóstico con tracemalloc.
+Estima los bytes que retienen las colas, cachés, sesiones y modelos cargados,
+cuenta las tareas asyncio vivas y permite activar tracemalloc, tomar snapshots
+y compararlos para diagnosticar fugas sin reiniciar el servicio.
+"""
+
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+import types
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import MEMORIA_CONFIG
+from salud import monitor_salud
+
+# Tipos que no se recorren al estimar tamaños (son compartidos, no datos retenidos)
+_TIPOS_OMITIDOS = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                   types.MethodType, types.CodeType, types.FrameType)
+
+def tamano_profundo(objeto, vistos: Optional[set] = None) -> int:
+    """Bytes aproximados de un objeto y de todo lo que contiene (sin contar dos veces lo compartido)."""
+    vistos = set() if vistos is None else vistos
+    total = 0
+    pendientes = [objeto]
+    while pendientes:
+        actual = pendientes.pop()
+        if id(actual) in vistos or isinstance(actual, _TIPOS_OMITIDOS):
+            continue
+        vistos.add(id(actual))
+
+        total += sys.getsizeof(actual)  # En arrays de NumPy incluye los datos si son propios
+        if isinstance(actual, np.ndarray):
+            if actual.base is not None:
+                pendientes.append(actual.base)
+            continue
+
+        if isinstance(actual, dict):
+            pendientes.extend(actual.keys())
+            pendientes.extend(actual.values())
+        elif isinstance(actual, (list, tuple, set, frozenset)):
+            pendientes.extend(actual)
+        elif isinstance(actual, (str, bytes, bytearray, int, float, bool)) or actual is None:
+            continue
+        elif hasattr(actual, "__dict__"):
+            pendientes.append(actual.__dict__)
+    return total
+
+def leer_rss() -> Dict:
+    """Memoria residente del proceso (Linux: /proc/self/status)."""
+    rss = {}
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith(("VmRSS:", "VmHWM:")):
+                    nombre, valor = linea.split(":", 1)
+                    rss["rss_bytes" if nombre == "VmRSS" else "rss_pico_bytes"] = int(valor.split()[0]) * 1024
+    except OSError:
+        import resource
+        rss["rss_pico_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return rss
+
+class InspectorMemoria:
+    """Estructuras en memoria registradas por los módulos y snapshots de tracemalloc."""
+
+    def __init__(self):
+        self._estructuras = {}          # {nombre: objeto}
+        self._snapshots = OrderedDict()  # {id: {"snapshot", "creado", "memoria_trazada"}}
+
+    def registrar_estructura(self, nombre: str, objeto):
+        """Registra una estructura de larga vida (cola, caché, sesiones) para contabilizarla."""
+        self._estructuras[nombre] = objeto
+
+    # --- Contabilidad ---
+
+    def contabilizar(self) -> Dict:
+        """Bytes estimados por estructura, por modelo cargado y tareas asyncio vivas."""
+        estructuras = {}
+        for nombre, objeto in self._estructuras.items():
+            detalle = {"bytes": tamano_profundo(objeto)}
+            if isinstance(objeto, dict):
+                detalle["entradas"] = len(objeto)
+                # Las colas se desglosan por clase para ver cuál crece
+                if objeto and all(isinstance(v, list) for v in objeto.values()):
+                    detalle["por_clase"] = {
+                        clave: {"elementos": len(valor), "bytes": tamano_profundo(valor)}
+                        for clave, valor in objeto.items()
+                    }
+            estructuras[nombre] = detalle
+
+        modelos = monitor_salud.modelos_cargados()
+        return {
+            "proceso": leer_rss(),
+            "estructuras": estructuras,
+            "total_estructuras_bytes": sum(e["bytes"] for e in estructuras.values()),
+            "modelos": {
+                "cargados": len(modelos),
+                "memoria_pesos_bytes": sum(m["memoria_bytes"] for m in modelos),
+                "detalle": modelos
+            },
+            "tareas_asyncio": self.contar_tareas(),
+            "objetos_gc": len(gc.get_objects()),
+            "tracemalloc": self.estado_tracemalloc()
+        }
+
+    @staticmethod
+    def contar_tareas() -> Dict:
+        """Tareas asyncio vivas agrupadas por corrutina (detecta bucles que nunca terminan)."""
+        try:
+            tareas = asyncio.all_tasks()
+        except RuntimeError:
+            return {"total": 0, "por_corrutina": {}}
+        por_corrutina = Counter(getattr(t.get_coro(), "__qualname__", repr(t.get_coro())) for t in tareas)
+        return {"total": len(tareas), "por_corrutina": dict(por_corrutina.most_common())}
+
+    # --- tracemalloc ---
+
+    @staticmethod
+    def estado_tracemalloc() -> Dict:
+        if not tracemalloc.is_tracing():
+            return {"activo": False}
+        actual, pico = tracemalloc.get_traced_memory()
+        return {
+            "activo": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "memoria_trazada_bytes": actual,
+            "pico_trazado_bytes": pico,
+            "sobrecosto_bytes": tracemalloc.get_tracemalloc_memory()
+        }
+
+    def cambiar_tracemalloc(self, activo: bool, frames: Optional[int] = None) -> Dict:
+        """Activa o desactiva tracemalloc. Al desactivarlo se descartan los snapshots."""
+        if activo and not tracemalloc.is_tracing():
+            tracemalloc.start(frames or MEMORIA_CONFIG['frames_tracemalloc'])
+        elif not activo and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            self._snapshots.clear()
+        return self.estado_tracemalloc()
+
+    def tomar_snapshot(self) -> str:
+        """Toma un snapshot (tracemalloc debe estar activo) y devuelve su id."""
+        if not tracemalloc.is_tracing():
+            raise ValueError("tracemalloc no está activo")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        id_snapshot = uuid.uuid4().hex[:12]
+        self._snapshots[id_snapshot] = {
+            "snapshot": snapshot,
+            "creado": time.time(),
+            "memoria_trazada_bytes": tracemalloc.get_traced_memory()[0]
+        }
+        while len(self._snapshots) > MEMORIA_CONFIG['max_snapshots']:
+            self._snapshots.popitem(last=False)
+        return id_snapshot
+
+    def listar_snapshots(self) -> List[Dict]:
+        return [
+            {"id": id_snapshot, "creado": datos["creado"], "memoria_trazada_bytes": datos["memoria_trazada_bytes"]}
+            for id_snapshot, datos in self._snapshots.items()
+        ]
+
+    def eliminar_snapshot(self, id_snapshot: str) -> bool:
+        return self._snapshots.pop(id_snapshot, None) is not None
+
+    def _obtener_snapshot(self, id_snapshot: str) -> tracemalloc.Snapshot:
+        datos = self._snapshots.get(id_snapshot)
+        if datos is None:
+            raise KeyError(id_snapshot)
+        return datos["snapshot"]
+
+    @staticmethod
+    def _formatear_traza(traza: tracemalloc.Traceback) -> List[str]:
+        return [f"{frame.filename}:{frame.lineno}" for frame in traza]
+
+    def principales_asignaciones(self, id_snapshot: str, agrupar: str = "lineno", limite: int = 20) -> List[Dict]:
+        """Sitios que más memoria retienen en un snapshot."""
+        estadisticas = self._obtener_snapshot(id_snapshot).statistics(agrupar)
+        return [
+            {"traza": self._formatear_traza(e.traceback), "bytes": e.size, "bloques": e.count}
+            for e in estadisticas[:limite]
+        ]
+
+    def comparar_snapshots(self, id_snapshot: str, id_base: str, agrupar: str = "lineno", limite: int = 20) -> List[Dict]:
+        """Sitios cuya memoria más cambió entre el snapshot base y el posterior."""
+        diferencias = self._obtener_snapshot(id_snapshot).compare_to(self._obtener_snapshot(id_base), agrupar)
+        return [
+            {
+                "traza": self._formatear_traza(d.traceback),
+                "bytes": d.size,
+                "diferencia_bytes": d.size_diff,
+                "bloques": d.count,
+                "diferencia_bloques": d.count_diff
+            }
+            for d in diferencias[:limite]
+        ]
+
+# Instancia global del inspector
+inspector_memoria = InspectorMemoria()
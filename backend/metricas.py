@@ -0,0 +1,256 @@
+"""
+Métricas del proceso en formato de texto de Prometheus.
+Contadores e histogramas en memoria, sin dependencias externas: cada hilo escribe
+en su propio fragmento, así que registrar una observación no toma ningún lock, y
+los fragmentos solo se suman al exportar en /metrics.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Límites (en segundos) de los histogramas de latencia
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Límites de los histogramas de tamaño de lote
+LIMITES_LOTE = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _formatear_etiquetas(nombres: Tuple[str, ...], valores: Tuple, extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+def _formatear_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+class _Metrica:
+    """Base de las métricas: series por combinación de etiquetas, fragmentadas por hilo."""
+
+    tipo = ""
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Iterable[str] = ()):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.etiquetas = tuple(etiquetas)
+        self._local = threading.local()
+        self._fragmentos = []  # Un dict {valores_etiquetas: serie} por hilo
+
+    def _fragmento(self) -> Dict:
+        fragmento = getattr(self._local, "series", None)
+        if fragmento is None:
+            fragmento = self._local.series = {}
+            self._fragmentos.append(fragmento)  # list.append es atómico
+        return fragmento
+
+    def _nueva_serie(self) -> List[float]:
+        raise NotImplementedError
+
+    def _series(self) -> Dict[Tuple, List[float]]:
+        """Suma los fragmentos de todos los hilos."""
+        total = {}
+        for fragmento in list(self._fragmentos):
+            for valores, serie in list(fragmento.items()):
+                acumulada = total.get(valores)
+                if acumulada is None:
+                    total[valores] = list(serie)
+                else:
+                    for i, v in enumerate(serie):
+                        acumulada[i] += v
+        return total
+
+    def exportar(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.descripcion}", f"# TYPE {self.nombre} {self.tipo}"]
+
+class Contador(_Metrica):
+    """Valor que solo aumenta."""
+
+    tipo = "counter"
+
+    def _nueva_serie(self):
+        return [0.0]
+
+    def incrementar(self, *valores_etiquetas, cantidad: float = 1.0):
+        fragmento = self._fragmento()
+        serie = fragmento.get(valores_etiquetas)
+        if serie is None:
+            serie = fragmento[valores_etiquetas] = self._nueva_serie()
+        serie[0] += cantidad
+
+    def exportar(self) -> List[str]:
+        lineas = super().exportar()
+        for valores, serie in sorted(self._series().items()):
+            lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, valores)} {_formatear_numero(serie[0])}")
+        return lineas
+
+class Histograma(_Metrica):
+    """Distribución de observaciones en buckets acumulados, con suma y cuenta."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Iterable[str] = (),
+                 limites: Tuple[float, ...] = LIMITES_LATENCIA):
+        super().__init__(nombre, descripcion, etiquetas)
+        self.limites = tuple(sorted(limites))
+
+    def _nueva_serie(self):
+        # Un contador por bucket (+Inf incluido), seguido de la suma y la cuenta
+        return [0.0] * (len(self.limites) + 3)
+
+    def observar(self, valor: float, *valores_etiquetas):
+        fragmento = self._fragmento()
+        serie = fragmento.get(valores_etiquetas)
+        if serie is None:
+            serie = fragmento[valores_etiquetas] = self._nueva_serie()
+        serie[bisect_left(self.limites, valor)] += 1
+        serie[-2] += valor
+        serie[-1] += 1
+
+    def medir(self, *valores_etiquetas) -> "_Cronometro":
+        """Context manager que observa la duración del bloque en segundos."""
+        return _Cronometro(self, valores_etiquetas)
+
+    def exportar(self) -> List[str]:
+        lineas = super().exportar()
+        for valores, serie in sorted(self._series().items()):
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + (float("inf"),), serie):
+                acumulado += cuenta
+                etiquetas = _formatear_etiquetas(self.etiquetas, valores, f'le="{_formatear_numero(limite)}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {_formatear_numero(acumulado)}")
+            etiquetas = _formatear_etiquetas(self.etiquetas, valores)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_formatear_numero(serie[-2])}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {_formatear_numero(serie[-1])}")
+        return lineas
+
+class Indicador:
+    """Valor instantáneo que se lee al exportar mediante una función."""
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Iterable[str],
+                 leer: Callable[[], Dict[Tuple, float]]):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.etiquetas = tuple(etiquetas)
+        self.leer = leer
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.descripcion}", f"# TYPE {self.nombre} gauge"]
+        for valores, valor in sorted(self.leer().items()):
+            if valor is not None:
+                lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, valores)} {_formatear_numero(valor)}")
+        return lineas
+
+class _Cronometro:
+    def __init__(self, histograma: Histograma, valores_etiquetas: Tuple):
+        self.histograma = histograma
+        self.valores_etiquetas = valores_etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.valores_etiquetas)
+        return False
+
+class RegistroMetricas:
+    """Conjunto de métricas que se exportan juntas."""
+
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre: str, descripcion: str, etiquetas: Iterable[str] = ()) -> Contador:
+        return self.registrar(Contador(nombre, descripcion, etiquetas))
+
+    def histograma(self, nombre: str, descripcion: str, etiquetas: Iterable[str] = (),
+                   limites: Tuple[float, ...] = LIMITES_LATENCIA) -> Histograma:
+        return self.registrar(Histograma(nombre, descripcion, etiquetas, limites))
+
+    def indicador(self, nombre: str, descripcion: str, etiquetas: Iterable[str],
+                  leer: Callable[[], Dict[Tuple, float]]) -> Indicador:
+        return self.registrar(Indicador(nombre, descripcion, etiquetas, leer))
+
+    def exportar(self) -> str:
+        """Texto de exposición de Prometheus (versión 0.0.4)."""
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+# Registro global y métricas de la aplicación
+registro_metricas = RegistroMetricas()
+
+metrica_peticiones = registro_metricas.histograma(
+    "api_peticion_duracion_segundos", "Latencia de las peticiones HTTP por ruta",
+    ("metodo", "ruta", "estado")
+)
+metrica_carga_modelo = registro_metricas.histograma(
+    "modelo_carga_duracion_segundos", "Tiempo de carga de un modelo desde disco", ("clase",)
+)
+metrica_inferencia = registro_metricas.histograma(
+    "inferencia_duracion_segundos", "Latencia de inferencia por clase", ("clase",)
+)
+metrica_tamano_lote = registro_metricas.histograma(
+    "inferencia_tamano_lote", "Muestras por llamada de inferencia", ("clase",), LIMITES_LOTE
+)
+metrica_guardado = registro_metricas.histograma(
+    "guardado_duracion_segundos", "Duración del guardado de una cola de muestras en disco", ("categoria",)
+)
+metrica_bytes_guardados = registro_metricas.contador(
+    "guardado_bytes_total", "Bytes escritos al guardar colas de muestras", ("categoria",)
+)
+metrica_muestras_descartadas = registro_metricas.contador(
+    "muestras_descartadas_total", "Muestras descartadas al guardar por superar samples_maximos", ("categoria",)
+)
+metrica_guardados_agrupados = registro_metricas.contador(
+    "guardado_solicitudes_agrupadas_total", "Solicitudes de guardado unidas a un guardado ya programado", ("categoria",)
+)
+metrica_rechazos = registro_metricas.contador(
+    "admision_rechazos_total", "Peticiones rechazadas por el control de admisión", ("categoria", "motivo")
+)
+metrica_filtro_duplicados = registro_metricas.contador(
+    "recoleccion_frames_total", "Frames recibidos al recolectar por resultado del filtro (aceptada, suprimida)",
+    ("categoria", "resultado")
+)
+metrica_entrenamiento = registro_metricas.histograma(
+    "entrenamiento_duracion_segundos", "Duración del entrenamiento de un modelo", ("clase",)
+)
+metrica_cache = registro_metricas.contador(
+    "cache_consultas_total", "Consultas a cachés por resultado (acierto, fallo, no_modificado)",
+    ("cache", "resultado")
+)
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mide la latencia de cada petición por plantilla de ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # La plantilla ("/api/vocales/prediccion/{vocal}") mantiene acotadas las series
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            metrica_peticiones.observar(time.perf_counter() - inicio, scope["method"], ruta, estado[0])
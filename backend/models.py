@@ -1,6 +1,9 @@
 import numpy as np
 import os
+import asyncio
 import json
+import hashlib
+import tempfile
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 import tensorflow as tf
@@ -10,14 +13,71 @@ from typing import List, Tuple, Dict, Optional
 import time
 
 from config import (
-    obtener_ruta_datos, obtener_ruta_modelo, obtener_ruta_encoder, 
-    DATOS_CONFIG, validar_clase, CLASE_A_CATEGORIA
+    obtener_ruta_modelo, obtener_ruta_encoder, obtener_ruta_version_datos,
+    DATOS_CONFIG, validar_clase, CLASE_A_CATEGORIA, CLASES_DISPONIBLES,
+    ENTRENAMIENTO_CONFIG, AUMENTACION_CONFIG, CARACTERISTICAS_CONFIG
+)
+from utils import ajustar_permisos_temporal, validar_puntos_clave
+from estadisticas import agregador_estadisticas
+from persistencia_muestras import persistencia_muestras
+from aumentacion import generar_lotes_aumentados
+from caracteristicas import (
+    cache_caracteristicas, extraer_caracteristicas, preparar_entrada, huella_puntos, VERSION_EXTRACTOR
+)
+from salud import monitor_salud
+from perfilado import medir_etapa
+from metricas import (
+    metrica_carga_modelo, metrica_inferencia, metrica_tamano_lote,
+    metrica_entrenamiento, metrica_cache
 )
-from utils import validar_puntos_clave
 
 # Cache global para modelos entrenados
 cache_modelos = {}
 cache_codificadores = {}
+monitor_salud.registrar_cache_modelos(cache_modelos)
+
+# --- Versionado de los datos de entrenamiento ---
+
+def huella_configuracion() -> str:
+    """Hash de la configuración que influye en el modelo entrenado."""
+    configuracion = {
+        "entrenamiento": ENTRENAMIENTO_CONFIG,
+        "aumentacion": AUMENTACION_CONFIG,
+        "caracteristicas": {
+            "activo": CARACTERISTICAS_CONFIG['activo'],
+            "capas_ocultas": CARACTERISTICAS_CONFIG['capas_ocultas'],
+            "version_extractor": VERSION_EXTRACTOR
+        }
+    }
+    return hashlib.sha256(json.dumps(configuracion, sort_keys=True).encode()).hexdigest()
+
+def leer_version_datos(clase: str) -> Optional[Dict]:
+    """Registro de la versión de datos del modelo entrenado de la clase (None si no hay)."""
+    try:
+        with open(obtener_ruta_version_datos(clase), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def guardar_version_datos(clase: str, registro: Dict):
+    """Escribe el registro junto al .h5 de forma atómica."""
+    ruta = obtener_ruta_version_datos(clase)
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    try:
+        ajustar_permisos_temporal(descriptor, ruta)
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            json.dump(registro, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+def resumen_version_datos(registro: Optional[Dict]) -> Optional[Dict]:
+    """Campos públicos del registro (sin las métricas guardadas)."""
+    if registro is None:
+        return None
+    return {clave: valor for clave, valor in registro.items() if clave != "resultado"}
 
 class ModeloClase:
     """Clase para manejar el entrenamiento y predicción de modelos por clase individual."""
@@ -28,6 +88,7 @@ class ModeloClase:
         self.modelo = None
         self.codificador = None
         self.ultima_carga = 0
+        self.memoria_bytes = 0  # Tamaño aproximado de los pesos en memoria
         
     def cargar_modelo_entrenado(self) -> bool:
         """Carga un modelo previamente entrenado desde disco."""
@@ -38,14 +99,16 @@ class ModeloClase:
             return False
         
         try:
-            # Cargar modelo
-            self.modelo = keras.models.load_model(ruta_modelo)
-            
-            # Cargar codificador
-            self.codificador = joblib.load(ruta_codificador)
+            with metrica_carga_modelo.medir(self.clase), medir_etapa("carga_modelo"):
+                # Cargar modelo
+                self.modelo = keras.models.load_model(ruta_modelo)
+                
+                # Cargar codificador
+                self.codificador = joblib.load(ruta_codificador)
             
             # Actualizar timestamp de carga
             self.ultima_carga = time.time()
+            self.memoria_bytes = self.calcular_memoria_bytes()
             
             return True
             
@@ -53,47 +116,44 @@ class ModeloClase:
             print(f"Error cargando modelo para clase {self.clase}: {e}")
             return False
     
+    def calcular_memoria_bytes(self) -> int:
+        """Bytes que ocupan los pesos del modelo cargado."""
+        if self.modelo is None:
+            return 0
+        return int(sum(np.asarray(peso).nbytes for peso in self.modelo.weights))
+    
+    def preparar_entrada(self, puntos: np.ndarray) -> np.ndarray:
+        """Características o coordenadas crudas, según con qué se entrenó el modelo cargado."""
+        return preparar_entrada(puntos, self.modelo.input_shape[-1])
+    
     def cargar_datos_entrenamiento(self) -> Tuple[np.ndarray, np.ndarray]:
         """Carga y prepara los datos de entrenamiento para una clase específica."""
-        ruta_datos = obtener_ruta_datos(self.clase)
+        # Landmarks aplanados (21 puntos x 3 coordenadas = 63 características), en float32
+        X = persistencia_muestras.cargar_puntos_clave(self.clase)
         
-        if not os.path.exists(ruta_datos):
+        if len(X) == 0:
             raise FileNotFoundError(f"No se encontraron datos para la clase {self.clase}")
         
-        with open(ruta_datos, 'r') as f:
-            datos = json.load(f)
-        
-        if len(datos) < DATOS_CONFIG['samples_minimos']:
+        if len(X) < DATOS_CONFIG['samples_minimos']:
             raise ValueError(f"Datos insuficientes para clase {self.clase}. "
                            f"Mínimo: {DATOS_CONFIG['samples_minimos']}, "
-                           f"Actual: {len(datos)}")
-        
-        # Extraer características (landmarks) y etiquetas
-        X = []
-        y = []
+                           f"Actual: {len(X)}")
         
-        for muestra in datos:
-            if 'landmarks' in muestra:
-                # Aplanar los landmarks (21 puntos x 3 coordenadas = 63 características)
-                landmarks_flat = np.array(muestra['landmarks']).flatten()
-                X.append(landmarks_flat)
-                y.append(self.clase)  # Todas las muestras tienen la misma etiqueta
-        
-        X = np.array(X)
-        y = np.array(y)
+        # Todas las muestras tienen la misma etiqueta
+        y = np.full(len(X), self.clase)
         
         return X, y
     
-    def crear_modelo(self, num_caracteristicas: int) -> keras.Sequential:
+    def crear_modelo(self, num_caracteristicas: int, capas_ocultas: Optional[List[int]] = None) -> keras.Sequential:
         """Crea un modelo de red neuronal para clasificación binaria."""
-        modelo = keras.Sequential([
-            keras.layers.Dense(128, activation='relu', input_shape=(num_caracteristicas,)),
-            keras.layers.Dropout(0.3),
-            keras.layers.Dense(64, activation='relu'),
-            keras.layers.Dropout(0.3),
-            keras.layers.Dense(32, activation='relu'),
-            keras.layers.Dense(1, activation='sigmoid')  # Clasificación binaria
-        ])
+        capas_ocultas = capas_ocultas or [128, 64, 32]
+        capas = [keras.layers.Input(shape=(num_caracteristicas,))]
+        for i, unidades in enumerate(capas_ocultas):
+            capas.append(keras.layers.Dense(unidades, activation='relu'))
+            if i < len(capas_ocultas) - 1:
+                capas.append(keras.layers.Dropout(0.3))
+        capas.append(keras.layers.Dense(1, activation='sigmoid'))  # Clasificación binaria
+        modelo = keras.Sequential(capas)
         
         modelo.compile(
             optimizer='adam',
@@ -103,40 +163,92 @@ class ModeloClase:
         
         return modelo
     
-    def entrenar(self) -> Dict:
-        """Entrena el modelo para la clase específica."""
+    def entrenar(self, forzar: bool = False) -> Dict:
+        """
+        Entrena el modelo para la clase específica.
+        Si las muestras y la configuración son las mismas con que se entrenó el modelo
+        actual, devuelve sus métricas sin reentrenar (salvo que forzar sea True).
+        """
         try:
             # Cargar datos
+            tiempos = {}
+            
+            inicio = time.perf_counter()
             X, y = self.cargar_datos_entrenamiento()
+            tiempos["carga"] = time.perf_counter() - inicio
+            
+            # Comparar con la versión de datos del modelo actual
+            huella_datos, huella_config = huella_puntos(X), huella_configuracion()
+            anterior = leer_version_datos(self.clase)
+            if (not forzar and anterior is not None and os.path.exists(obtener_ruta_modelo(self.clase))
+                    and anterior["huella_datos"] == huella_datos and anterior["huella_config"] == huella_config):
+                metrica_cache.incrementar("entrenamientos", "no_modificado")
+                return {
+                    **anterior["resultado"],
+                    "reentrenado": False,
+                    "version_datos": resumen_version_datos(anterior)
+                }
+            
+            # Características geométricas (cacheadas mientras no cambien las muestras)
+            usar_caracteristicas = CARACTERISTICAS_CONFIG['activo']
+            inicio = time.perf_counter()
+            F = cache_caracteristicas.obtener(self.clase, X) if usar_caracteristicas else X
+            tiempos["caracteristicas"] = time.perf_counter() - inicio
             
             # Para clasificación binaria, convertir etiquetas a 0/1
             # 1 = es la clase objetivo, 0 = no es la clase objetivo
             y_binario = np.ones(len(y))  # Todas las muestras son de la clase objetivo
             
             # Dividir datos en entrenamiento y validación
-            X_train, X_val, y_train, y_val = train_test_split(
-                X, y_binario, test_size=0.2, random_state=42
+            X_train, X_val, F_train, F_val, y_train, y_val = train_test_split(
+                X, F, y_binario, test_size=ENTRENAMIENTO_CONFIG['proporcion_validacion'], random_state=42
             )
             
             # Crear y entrenar modelo
-            self.modelo = self.crear_modelo(X.shape[1])
-            
-            # Entrenar modelo
-            history = self.modelo.fit(
-                X_train, y_train,
-                epochs=50,
-                batch_size=32,
-                validation_data=(X_val, y_val),
-                verbose=0
+            inicio = time.perf_counter()
+            self.modelo = self.crear_modelo(
+                F.shape[1], CARACTERISTICAS_CONFIG['capas_ocultas'] if usar_caracteristicas else None
             )
+            tiempos["construccion"] = time.perf_counter() - inicio
+            
+            # Entrenar modelo (con aumentación, los lotes se generan al vuelo a partir de X_train)
+            inicio = time.perf_counter()
+            multiplicador = AUMENTACION_CONFIG['multiplicador'] if AUMENTACION_CONFIG['activo'] else 1
+            if multiplicador > 1:
+                lotes, pasos_por_epoca = generar_lotes_aumentados(
+                    X_train, y_train, ENTRENAMIENTO_CONFIG['batch_size'], multiplicador,
+                    transformar=extraer_caracteristicas if usar_caracteristicas else None
+                )
+                history = self.modelo.fit(
+                    lotes,
+                    steps_per_epoch=pasos_por_epoca,
+                    epochs=ENTRENAMIENTO_CONFIG['epocas'],
+                    validation_data=(F_val, y_val),
+                    verbose=0
+                )
+            else:
+                history = self.modelo.fit(
+                    F_train, y_train,
+                    epochs=ENTRENAMIENTO_CONFIG['epocas'],
+                    batch_size=ENTRENAMIENTO_CONFIG['batch_size'],
+                    validation_data=(F_val, y_val),
+                    verbose=0
+                )
+            tiempos["fit"] = time.perf_counter() - inicio
             
             # Evaluar modelo
-            val_loss, val_accuracy = self.modelo.evaluate(X_val, y_val, verbose=0)
+            inicio = time.perf_counter()
+            val_loss, val_accuracy = self.modelo.evaluate(F_val, y_val, verbose=0)
+            tiempos["evaluacion"] = time.perf_counter() - inicio
             
             # Guardar modelo y codificador
+            inicio = time.perf_counter()
             self.guardar_modelo()
+            tiempos["guardado"] = time.perf_counter() - inicio
+            self.ultima_carga = time.time()
+            self.memoria_bytes = self.calcular_memoria_bytes()
             
-            return {
+            resultado = {
                 "exito": True,
                 "clase": self.clase,
                 "categoria": self.categoria,
@@ -144,8 +256,31 @@ class ModeloClase:
                 "muestras_validacion": len(X_val),
                 "precision_validacion": float(val_accuracy),
                 "perdida_validacion": float(val_loss),
-                "epocas": 50
+                "epocas": ENTRENAMIENTO_CONFIG['epocas'],
+                "num_caracteristicas": int(F.shape[1]),
+                "aumentacion": {
+                    "multiplicador": multiplicador,
+                    "muestras_por_epoca": len(X_train) * multiplicador,
+                    "semilla": AUMENTACION_CONFIG['semilla'] if multiplicador > 1 else None
+                },
+                "tiempos_segundos": {fase: round(segundos, 4) for fase, segundos in tiempos.items()}
+            }
+            
+            # Registrar la versión de datos junto al modelo (sube solo si cambiaron las muestras)
+            version = 1
+            if anterior is not None:
+                version = anterior["version"] + int(anterior["huella_datos"] != huella_datos)
+            registro = {
+                "version": version,
+                "huella_datos": huella_datos,
+                "huella_config": huella_config,
+                "muestras": len(X),
+                "fecha_entrenamiento": time.time(),
+                "resultado": resultado
             }
+            guardar_version_datos(self.clase, registro)
+            
+            return {**resultado, "reentrenado": True, "version_datos": resumen_version_datos(registro)}
             
         except Exception as e:
             return {
@@ -166,6 +301,8 @@ class ModeloClase:
         self.codificador = LabelEncoder()
         self.codificador.fit([self.clase])  # Solo una clase
         joblib.dump(self.codificador, obtener_ruta_encoder(self.clase))
+        
+        agregador_estadisticas.registrar_modelo(self.clase, True)
     
     def predecir(self, puntos_clave: List[List[float]]) -> Dict:
         """Realiza predicción para los puntos clave dados."""
@@ -178,6 +315,7 @@ class ModeloClase:
                 }
             
             # Cargar modelo si no está cargado
+            metrica_cache.incrementar("modelos", "fallo" if self.modelo is None else "acierto")
             if self.modelo is None:
                 if not self.cargar_modelo_entrenado():
                     return {
@@ -186,10 +324,12 @@ class ModeloClase:
                     }
             
             # Preparar datos para predicción
-            landmarks_flat = np.array(puntos_clave).flatten().reshape(1, -1)
+            landmarks_flat = self.preparar_entrada(np.asarray(puntos_clave, dtype=np.float32))
             
             # Realizar predicción
-            prediccion = self.modelo.predict(landmarks_flat, verbose=0)[0][0]
+            with metrica_inferencia.medir(self.clase), medir_etapa("inferencia"):
+                prediccion = self.modelo.predict(landmarks_flat, verbose=0)[0][0]
+            metrica_tamano_lote.observar(1, self.clase)
             confianza = float(prediccion)
             
             # Determinar si es la clase objetivo (umbral 0.5)
@@ -209,6 +349,21 @@ class ModeloClase:
                 "error": str(e)
             }
 
+    def predecir_lote(self, lote_puntos_clave: List[List[List[float]]]) -> np.ndarray:
+        """Devuelve la confianza del modelo para cada muestra del lote en una sola inferencia."""
+        metrica_cache.incrementar("modelos", "fallo" if self.modelo is None else "acierto")
+        if self.modelo is None:
+            if not self.cargar_modelo_entrenado():
+                raise FileNotFoundError(f"No hay modelo entrenado para la clase {self.clase}")
+        
+        X = self.preparar_entrada(np.asarray(lote_puntos_clave, dtype=np.float32))
+        
+        # Llamada directa al modelo: evita la sobrecarga de predict() en lotes pequeños
+        with metrica_inferencia.medir(self.clase), medir_etapa("inferencia"):
+            confianzas = np.asarray(self.modelo(X, training=False))[:, 0]
+        metrica_tamano_lote.observar(len(X), self.clase)
+        return confianzas
+
 # --- Funciones de utilidad ---
 
 def obtener_modelo_clase(clase: str) -> ModeloClase:
@@ -217,13 +372,14 @@ def obtener_modelo_clase(clase: str) -> ModeloClase:
         cache_modelos[clase] = ModeloClase(clase)
     return cache_modelos[clase]
 
-async def entrenar_modelo_clase(clase: str) -> Dict:
-    """Entrena un modelo para una clase específica."""
+async def entrenar_modelo_clase(clase: str, forzar: bool = False) -> Dict:
+    """Entrena un modelo para una clase específica (sin reentrenar si sus datos no cambiaron, salvo forzar)."""
     if not validar_clase(clase):
         raise ValueError(f"Clase '{clase}' no válida")
     
     modelo = obtener_modelo_clase(clase)
-    return modelo.entrenar()
+    with metrica_entrenamiento.medir(clase):
+        return modelo.entrenar(forzar)
 
 async def predecir_clase(clase: str, puntos_clave: List[List[float]]) -> Dict:
     """Realiza predicción para una clase específica."""
@@ -233,11 +389,64 @@ async def predecir_clase(clase: str, puntos_clave: List[List[float]]) -> Dict:
     modelo = obtener_modelo_clase(clase)
     return modelo.predecir(puntos_clave)
 
+def obtener_clases_con_modelo(categoria: str) -> List[str]:
+    """Devuelve las clases de una categoría que tienen un modelo entrenado."""
+    return [
+        clase for clase in CLASES_DISPONIBLES.get(categoria, [])
+        if os.path.exists(obtener_ruta_modelo(clase))
+    ]
+
+async def calcular_confianzas_categoria(categoria: str, lote_puntos_clave: List[List[List[float]]]) -> Tuple[List[str], np.ndarray]:
+    """
+    Evalúa un lote de muestras con todos los modelos entrenados de una categoría.
+    
+    Cada modelo realiza una única inferencia sobre el lote completo y los modelos
+    se ejecutan en paralelo, así que el costo no crece con el número de muestras.
+    Devuelve las clases evaluadas y una matriz (muestras, clases) de confianzas.
+    """
+    if categoria not in CLASES_DISPONIBLES:
+        raise ValueError(f"Categoría '{categoria}' no válida")
+    
+    for i, puntos_clave in enumerate(lote_puntos_clave):
+        if not validar_puntos_clave(puntos_clave):
+            raise ValueError(f"Puntos clave inválidos en la muestra {i + 1}")
+    
+    clases = obtener_clases_con_modelo(categoria)
+    if not clases:
+        raise ValueError(f"No hay modelos entrenados para la categoría '{categoria}'")
+    
+    if not lote_puntos_clave:
+        return clases, np.zeros((0, len(clases)), dtype=np.float32)
+    
+    confianzas = await asyncio.gather(*(
+        monitor_salud.ejecutar_en_hilo(obtener_modelo_clase(clase).predecir_lote, lote_puntos_clave)
+        for clase in clases
+    ))
+    
+    return clases, np.stack(confianzas, axis=1)
+
+async def predecir_lote_categoria(categoria: str, lote_puntos_clave: List[List[List[float]]]) -> List[Dict]:
+    """Clasifica un lote de muestras contra todos los modelos entrenados de una categoría."""
+    clases, matriz = await calcular_confianzas_categoria(categoria, lote_puntos_clave)
+    mejores = matriz.argmax(axis=1)
+    
+    return [
+        {
+            "clase_predicha": clases[mejor],
+            "confianza": float(matriz[i, mejor]),
+            "todas_las_probabilidades": {
+                clase: float(matriz[i, j]) for j, clase in enumerate(clases)
+            }
+        }
+        for i, mejor in enumerate(mejores)
+    ]
+
 async def eliminar_modelo_clase(clase: str) -> Dict:
     """Elimina el modelo entrenado de una clase específica."""
     try:
         ruta_modelo = obtener_ruta_modelo(clase)
         ruta_encoder = obtener_ruta_encoder(clase)
+        ruta_version = obtener_ruta_version_datos(clase)
         
         archivos_eliminados = []
         
@@ -249,10 +458,17 @@ async def eliminar_modelo_clase(clase: str) -> Dict:
             os.remove(ruta_encoder)
             archivos_eliminados.append("encoder")
         
+        if os.path.exists(ruta_version):
+            os.remove(ruta_version)
+            archivos_eliminados.append("version_datos")
+        
         # Limpiar cache
         if clase in cache_modelos:
             del cache_modelos[clase]
         
+        if validar_clase(clase):
+            agregador_estadisticas.registrar_modelo(clase, False)
+        
         return {
             "exito": True,
             "archivos_eliminados": archivos_eliminados,
@@ -295,7 +511,8 @@ def obtener_info_modelo_clase(clase: str) -> Dict:
             "tamaño_archivo": stat_modelo.st_size,
             "fecha_creacion": stat_modelo.st_ctime,
             "fecha_modificacion": stat_modelo.st_mtime,
-            "tiene_encoder": os.path.exists(ruta_encoder)
+            "tiene_encoder": os.path.exists(ruta_encoder),
+            "version_datos": resumen_version_datos(leer_version_datos(clase))
         }
         
     except Exception as e:
@@ -0,0 +1,258 @@
+"""
+Instrumentación por petición y perfilado bajo demanda.
+Mide las etapas de cada petición (parseo, validación, carga de modelo, inferencia,
+serialización) y las devuelve en el encabezado Server-Timing, y permite capturar
+un perfil (cProfile o por muestreo) de las próximas N peticiones a una ruta.
+"""
+
+import cProfile
+import contextvars
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from starlette.routing import compile_path
+
+from config import PERFILADO_CONFIG
+
+MODOS_PERFIL = ("cprofile", "muestreo")
+
+# Tiempos por etapa de la petición en curso (None si no se está instrumentando)
+_tiempos_peticion = contextvars.ContextVar("tiempos_peticion", default=None)
+
+# Los hilos del executor de una misma petición (p.ej. predecir_lote en paralelo) comparten sus tiempos
+_bloqueo_tiempos = threading.Lock()
+
+@contextmanager
+def medir_etapa(nombre: str):
+    """
+    Acumula la duración del bloque en la etapa 'nombre' de la petición en curso.
+
+    Si varios hilos miden la misma etapa a la vez, cuenta el tiempo de reloj en que
+    hubo al menos uno activo, no la suma de todos.
+    """
+    tiempos = _tiempos_peticion.get()
+    if tiempos is None:
+        yield
+        return
+    with _bloqueo_tiempos:
+        en_curso = tiempos.setdefault("_en_curso", {})  # {etapa: (bloques activos, inicio del primero)}
+        activos, inicio = en_curso.get(nombre, (0, time.perf_counter()))
+        en_curso[nombre] = (activos + 1, inicio)
+    try:
+        yield
+    finally:
+        with _bloqueo_tiempos:
+            activos, inicio = en_curso.pop(nombre)
+            if activos > 1:
+                en_curso[nombre] = (activos - 1, inicio)
+            else:
+                tiempos[nombre] = tiempos.get(nombre, 0.0) + time.perf_counter() - inicio
+
+def marcar_etapa(nombre: str):
+    """Registra como etapa el tiempo transcurrido desde el inicio de la petición."""
+    tiempos = _tiempos_peticion.get()
+    if tiempos is not None and nombre not in tiempos:
+        tiempos[nombre] = time.perf_counter() - tiempos["_inicio"]
+
+def formatear_server_timing(tiempos: Dict[str, float]) -> str:
+    """Convierte {etapa: segundos} en el valor del encabezado Server-Timing (en ms)."""
+    return ", ".join(
+        f"{nombre};dur={segundos * 1000:.2f}"
+        for nombre, segundos in tiempos.items() if not nombre.startswith("_")
+    )
+
+class CapturaPerfil:
+    """
+    Perfil acumulado de las próximas N peticiones a una ruta.
+
+    Las peticiones de una captura se perfilan de una en una. cProfile registra todo
+    lo que corre en el hilo del event loop mientras dura la petición (incluidas otras
+    peticiones concurrentes); el muestreo además sigue a los hilos del executor.
+    """
+
+    def __init__(self, ruta: str, peticiones: int, modo: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.ruta = ruta
+        self.patron = compile_path(ruta)[0]
+        self.modo = modo
+        self.peticiones = peticiones
+        self.completadas = 0
+        self.en_curso = False
+        self.creada = time.time()
+        self.perfil = cProfile.Profile() if modo == "cprofile" else None
+        self.pilas = Counter()
+        self.muestras = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.completadas < self.peticiones
+
+    def coincide(self, ruta: str) -> bool:
+        return self.activa and not self.en_curso and self.patron.match(ruta) is not None
+
+    def resumen(self) -> Dict:
+        return {
+            "id": self.id,
+            "ruta": self.ruta,
+            "modo": self.modo,
+            "peticiones": self.peticiones,
+            "completadas": self.completadas,
+            "activa": self.activa,
+            "muestras": self.muestras if self.modo == "muestreo" else None,
+            "creada": self.creada
+        }
+
+    def exportar_pstats(self) -> bytes:
+        """Volcado binario compatible con pstats.Stats / snakeviz."""
+        return marshal.dumps(pstats.Stats(self.perfil).stats)
+
+    def exportar_texto(self, limite: int = 40) -> str:
+        """Funciones con mayor tiempo acumulado."""
+        salida = io.StringIO()
+        pstats.Stats(self.perfil, stream=salida).sort_stats("cumulative").print_stats(limite)
+        return salida.getvalue()
+
+    def exportar_colapsado(self) -> str:
+        """Pilas colapsadas ('raiz;...;hoja cuenta'), listas para flamegraph.pl o speedscope."""
+        return "\n".join(f"{pila} {cuenta}" for pila, cuenta in self.pilas.most_common()) + "\n"
+
+class _Muestreador(threading.Thread):
+    """Hilo que toma muestras de las pilas del event loop y de los hilos del executor."""
+
+    def __init__(self, captura: CapturaPerfil, id_hilo_loop: int):
+        super().__init__(daemon=True, name="perfilado-muestreo")
+        self.captura = captura
+        self.id_hilo_loop = id_hilo_loop
+        self.detener = threading.Event()
+
+    @staticmethod
+    def _pila(frame) -> List[str]:
+        pila = []
+        while frame is not None:
+            codigo = frame.f_code
+            pila.append(f"{codigo.co_filename.rsplit('/', 1)[-1]}:{codigo.co_name}")
+            frame = frame.f_back
+        pila.reverse()
+        return pila
+
+    def run(self):
+        intervalo = PERFILADO_CONFIG['intervalo_muestreo_ms'] / 1000
+        hilos_executor = set()
+        while not self.detener.wait(intervalo):
+            hilos_executor.update(h.ident for h in threading.enumerate() if h.name.startswith("asyncio"))
+            for id_hilo, frame in sys._current_frames().items():
+                if id_hilo == self.id_hilo_loop:
+                    nombre = "event_loop"
+                elif id_hilo in hilos_executor:
+                    nombre = "executor"
+                else:
+                    continue
+                pila = self._pila(frame)
+                # Los hilos del executor sin trabajo solo esperan en la cola
+                if nombre == "executor" and not any(p.endswith("thread.py:run") for p in pila):
+                    continue
+                self.captura.pilas[";".join([nombre] + pila)] += 1
+            self.captura.muestras += 1
+
+class GestorPerfilado:
+    """Capturas de perfil activas y estado del encabezado Server-Timing."""
+
+    def __init__(self):
+        self.server_timing = PERFILADO_CONFIG['server_timing']
+        self.capturas = {}  # {id: CapturaPerfil}
+        self._cprofile_activo = False
+
+    def crear_captura(self, ruta: str, peticiones: int, modo: str) -> CapturaPerfil:
+        if modo not in MODOS_PERFIL:
+            raise ValueError(f"Modo '{modo}' no válido. Modos disponibles: {list(MODOS_PERFIL)}")
+        if not 1 <= peticiones <= PERFILADO_CONFIG['max_peticiones']:
+            raise ValueError(f"peticiones debe estar entre 1 y {PERFILADO_CONFIG['max_peticiones']}")
+        if len(self.capturas) >= PERFILADO_CONFIG['max_capturas']:
+            raise ValueError("Demasiadas capturas guardadas; elimina alguna antes de crear otra")
+        captura = CapturaPerfil(ruta, peticiones, modo)
+        self.capturas[captura.id] = captura
+        return captura
+
+    def hay_capturas_activas(self) -> bool:
+        return any(captura.activa for captura in self.capturas.values())
+
+    def buscar_captura(self, ruta: str) -> Optional[CapturaPerfil]:
+        for captura in self.capturas.values():
+            if captura.coincide(ruta):
+                # cProfile solo admite un perfilador activo a la vez
+                if captura.modo == "cprofile" and self._cprofile_activo:
+                    continue
+                return captura
+        return None
+
+    @contextmanager
+    def perfilar(self, captura: CapturaPerfil):
+        """Perfila el bloque (una petición) y lo suma a la captura."""
+        captura.en_curso = True
+        muestreador = None
+        if captura.modo == "cprofile":
+            self._cprofile_activo = True
+            captura.perfil.enable()
+        else:
+            muestreador = _Muestreador(captura, threading.get_ident())
+            muestreador.start()
+        try:
+            yield
+        finally:
+            if muestreador is None:
+                captura.perfil.disable()
+                self._cprofile_activo = False
+            else:
+                muestreador.detener.set()
+                muestreador.join()
+            captura.completadas += 1
+            captura.en_curso = False
+
+# Instancia global del gestor
+gestor_perfilado = GestorPerfilado()
+
+class MiddlewareInstrumentacion:
+    """
+    Middleware ASGI opcional: añade Server-Timing y aplica las capturas de perfil.
+
+    Si Server-Timing está desactivado y no hay capturas activas, la petición pasa
+    directamente sin ningún costo adicional.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (gestor_perfilado.server_timing or gestor_perfilado.hay_capturas_activas()):
+            await self.app(scope, receive, send)
+            return
+
+        tiempos = {"_inicio": time.perf_counter()}
+        token = _tiempos_peticion.set(tiempos)
+        incluir_encabezado = gestor_perfilado.server_timing
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start" and incluir_encabezado:
+                tiempos["total"] = time.perf_counter() - tiempos["_inicio"]
+                encabezados = list(mensaje.get("headers", []))
+                encabezados.append((b"server-timing", formatear_server_timing(tiempos).encode("latin-1")))
+                mensaje = {**mensaje, "headers": encabezados}
+            await send(mensaje)
+
+        captura = gestor_perfilado.buscar_captura(scope["path"])
+        try:
+            if captura is None:
+                await self.app(scope, receive, enviar)
+            else:
+                with gestor_perfilado.perfilar(captura):
+                    await self.app(scope, receive, enviar)
+        finally:
+            _tiempos_peticion.reset(token)
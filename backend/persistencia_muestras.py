@@ -0,0 +1,514 @@
+"""
+Persistencia de las muestras recolectadas.
+Dos backends con la misma interfaz, elegidos con ALMACEN_CONFIG['backend']:
+
+- json: un <clase>_samples.json por clase (formato histórico de backend/data),
+  con un bloqueo de archivo por clase para que varios workers no se pisen. Los
+  borrados de muestras sueltas se anotan aparte y se compactan más tarde.
+- sqlite: una base de datos en modo WAL con los puntos clave como blobs float32
+  e índice (categoria, clase, timestamp); conteos, borrados y cargas para
+  entrenar son consultas indexadas y los lotes se insertan en una transacción.
+
+migrar() copia las muestras de un backend a otro (importar/exportar el formato JSON).
+"""
+
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from config import ALMACEN_CONFIG, CLASE_A_CATEGORIA, CLASES_DISPONIBLES, DATOS_CONFIG, RUTAS, obtener_ruta_datos
+from utils import ajustar_permisos_temporal
+
+@contextmanager
+def bloqueo_archivo(ruta_bloqueo: str):
+    """Bloqueo exclusivo entre procesos sobre un archivo auxiliar (espera hasta espera_bloqueo_segundos)."""
+    limite = time.monotonic() + ALMACEN_CONFIG['espera_bloqueo_segundos']
+    with open(ruta_bloqueo, 'a+b') as f:
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= limite:
+                    raise TimeoutError(f"No se pudo obtener el bloqueo {ruta_bloqueo}")
+                time.sleep(ALMACEN_CONFIG['intervalo_reintento_bloqueo_segundos'])
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class PersistenciaJSON:
+    """
+    Un archivo JSON por clase; cada escritura es lectura + reemplazo atómico bajo bloqueo.
+
+    Cada muestra tiene un id estable: el campo "id" si lo tiene o, en archivos
+    anteriores, el siguiente al mayor visto hasta ella (su posición). Borrar una
+    muestra no reescribe el archivo: añade su id a <archivo>.borradas, y compactar()
+    la quita del archivo más tarde. <archivo>.idx guarda el desplazamiento en bytes
+    de cada registro, así una página lee solo sus muestras.
+    """
+
+    nombre = "json"
+
+    @staticmethod
+    def _leer(ruta_archivo: str) -> List[Dict]:
+        if not os.path.exists(ruta_archivo):
+            return []
+        try:
+            with open(ruta_archivo, 'r') as f:
+                return json.load(f)
+        except:
+            return []
+
+    @staticmethod
+    def _reemplazar_archivo(ruta_archivo: str, contenido: bytes):
+        """Escritura atómica con un temporal propio (no se comparte entre workers)."""
+        descriptor, ruta_temporal = tempfile.mkstemp(
+            dir=os.path.dirname(ruta_archivo), prefix=os.path.basename(ruta_archivo) + ".", suffix=".tmp"
+        )
+        try:
+            ajustar_permisos_temporal(descriptor, ruta_archivo)
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(contenido)
+            os.replace(ruta_temporal, ruta_archivo)
+        except BaseException:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+            raise
+
+    def _escribir(self, ruta_archivo: str, muestras: List[Dict]):
+        """Escribe las muestras (mismo formato que json.dump con indent=2) y su índice de desplazamientos."""
+        registros = [json.dumps(muestra, indent=2).replace("\n", "\n  ").encode() for muestra in muestras]
+        self._reemplazar_archivo(ruta_archivo, (b"[\n  " + b",\n  ".join(registros) + b"\n]") if registros else b"[]")
+        # Cada registro empieza tras "[\n  " o ",\n  " (4 bytes)
+        longitudes = np.array([len(registro) for registro in registros], dtype=np.int64)
+        inicios = 4 + np.cumsum(longitudes + 4) - (longitudes + 4)
+        estado = os.stat(ruta_archivo)
+        self._guardar_indice(
+            ruta_archivo, (estado.st_mtime_ns, estado.st_size),
+            np.array(self._ids(muestras), dtype=np.int64), inicios, inicios + longitudes
+        )
+
+    def _guardar_indice(self, ruta_archivo: str, firma, ids: np.ndarray, inicios: np.ndarray, fines: np.ndarray):
+        buffer = io.BytesIO()
+        np.savez(buffer, firma=np.array(firma, dtype=np.int64), ids=ids, inicios=inicios, fines=fines)
+        try:
+            self._reemplazar_archivo(ruta_archivo + ".idx", buffer.getvalue())
+        except OSError as e:
+            print(f"Error guardando el índice de {ruta_archivo}: {e}")
+
+    @staticmethod
+    def _ids(muestras: Iterable[Dict]) -> List[int]:
+        """Id de cada muestra: el explícito o el siguiente al mayor anterior."""
+        ids, siguiente = [], 0
+        for muestra in muestras:
+            id_muestra = muestra.get('id')
+            if not isinstance(id_muestra, int):
+                id_muestra = siguiente
+            ids.append(id_muestra)
+            siguiente = max(siguiente, id_muestra + 1)
+        return ids
+
+    @staticmethod
+    def _borradas(ruta_archivo: str) -> Set[int]:
+        try:
+            with open(ruta_archivo + ".borradas", 'r') as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def _leer_vigentes(self, ruta_archivo: str) -> List[Dict]:
+        """Muestras del archivo sin las borradas pendientes de compactar."""
+        muestras = self._leer(ruta_archivo)
+        borradas = self._borradas(ruta_archivo)
+        if not borradas:
+            return muestras
+        return [muestra for muestra, id_muestra in zip(muestras, self._ids(muestras)) if id_muestra not in borradas]
+
+    def _indice(self, ruta_archivo: str, f) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (ids, inicios, fines) de los registros del archivo abierto f. Se lee de
+        <archivo>.idx si corresponde a la misma versión del archivo (cada escritura
+        lo actualiza); si no (p.ej. archivos anteriores), se reconstruye recorriendo
+        el archivo una vez y se guarda.
+        """
+        estado = os.fstat(f.fileno())
+        firma = np.array([estado.st_mtime_ns, estado.st_size], dtype=np.int64)
+        ruta_indice = ruta_archivo + ".idx"
+        try:
+            with np.load(ruta_indice) as indice:
+                if np.array_equal(indice['firma'], firma):
+                    return indice['ids'], indice['inicios'], indice['fines']
+        except (OSError, KeyError, ValueError):
+            pass
+
+        # Los caracteres estructurales de JSON son ASCII: con latin-1 cada byte es un carácter
+        f.seek(0)
+        texto = f.read().decode('latin-1')
+        decodificador = json.JSONDecoder()
+        separadores = re.compile(r'[\s,]*')
+        registros, inicios, fines = [], [], []
+        posicion = texto.find('[') + 1
+        while 0 < posicion < len(texto):
+            posicion = separadores.match(texto, posicion).end()
+            if posicion >= len(texto) or texto[posicion] == ']':
+                break
+            try:
+                registro, fin = decodificador.raw_decode(texto, posicion)
+            except ValueError:
+                break
+            registros.append(registro if isinstance(registro, dict) else {})
+            inicios.append(posicion)
+            fines.append(fin)
+            posicion = fin
+
+        ids = np.array(self._ids(registros), dtype=np.int64)
+        inicios, fines = np.array(inicios, dtype=np.int64), np.array(fines, dtype=np.int64)
+        self._guardar_indice(ruta_archivo, firma, ids, inicios, fines)
+        return ids, inicios, fines
+
+    def agregar(self, clase: str, muestras: List[Dict]) -> Dict:
+        """Añade las muestras que caben hasta samples_maximos; devuelve aceptadas, total y bytes escritos."""
+        ruta_archivo = obtener_ruta_datos(clase)
+        os.makedirs(os.path.dirname(ruta_archivo), exist_ok=True)
+
+        with bloqueo_archivo(ruta_archivo + ".lock"):
+            existentes = self._leer(ruta_archivo)
+            ids = self._ids(existentes)
+            borradas = self._borradas(ruta_archivo)
+            vigentes = len(existentes) - sum(1 for id_muestra in ids if id_muestra in borradas)
+            aceptadas = muestras[:max(0, DATOS_CONFIG['samples_maximos'] - vigentes)]
+            escritos = 0
+            if aceptadas:
+                siguiente = max(ids, default=-1) + 1
+                existentes.extend({"id": siguiente + i, **muestra} for i, muestra in enumerate(aceptadas))
+                self._escribir(ruta_archivo, existentes)
+                escritos = os.path.getsize(ruta_archivo)
+        return {"aceptadas": len(aceptadas), "total": vigentes + len(aceptadas), "bytes": escritos}
+
+    def reemplazar(self, clase: str, muestras: List[Dict]) -> int:
+        """Sustituye todas las muestras de la clase (sin tope; se usa al migrar)."""
+        ruta_archivo = obtener_ruta_datos(clase)
+        os.makedirs(os.path.dirname(ruta_archivo), exist_ok=True)
+        with bloqueo_archivo(ruta_archivo + ".lock"):
+            self._escribir(ruta_archivo, muestras)
+            self._quitar_auxiliares(ruta_archivo)
+        return len(muestras)
+
+    @staticmethod
+    def _quitar_auxiliares(ruta_archivo: str):
+        for sufijo in (".borradas", ".idx"):
+            if os.path.exists(ruta_archivo + sufijo):
+                os.remove(ruta_archivo + sufijo)
+
+    def eliminar(self, clase: str) -> bool:
+        ruta_archivo = obtener_ruta_datos(clase)
+        if not os.path.exists(ruta_archivo):
+            return False
+        with bloqueo_archivo(ruta_archivo + ".lock"):
+            existia = os.path.exists(ruta_archivo)
+            if existia:
+                os.remove(ruta_archivo)
+            self._quitar_auxiliares(ruta_archivo)
+        return existia
+
+    def eliminar_muestra(self, clase: str, id_muestra: int) -> Optional[int]:
+        """Marca la muestra como borrada sin reescribir el archivo; devuelve el nuevo total (None si no existe)."""
+        ruta_archivo = obtener_ruta_datos(clase)
+        if not os.path.exists(ruta_archivo):
+            return None
+        with bloqueo_archivo(ruta_archivo + ".lock"):
+            try:
+                with open(ruta_archivo, 'rb') as f:
+                    ids, _, _ = self._indice(ruta_archivo, f)
+            except FileNotFoundError:
+                return None
+            borradas = self._borradas(ruta_archivo)
+            if id_muestra in borradas or not np.any(ids == id_muestra):
+                return None
+            borradas.add(id_muestra)
+            self._reemplazar_archivo(ruta_archivo + ".borradas", json.dumps(sorted(borradas)).encode())
+        return len(ids) - int(np.isin(ids, list(borradas)).sum())
+
+    def pendientes_compactar(self, clase: str) -> int:
+        """Muestras borradas que siguen ocupando espacio en el archivo."""
+        return len(self._borradas(obtener_ruta_datos(clase)))
+
+    def compactar(self, clase: str) -> int:
+        """Reescribe el archivo sin las muestras borradas (conservando los ids); devuelve cuántas quitó."""
+        ruta_archivo = obtener_ruta_datos(clase)
+        with bloqueo_archivo(ruta_archivo + ".lock"):
+            borradas = self._borradas(ruta_archivo)
+            if not borradas:
+                return 0
+            muestras = self._leer(ruta_archivo)
+            conservadas = [
+                muestra if 'id' in muestra else {"id": id_muestra, **muestra}
+                for muestra, id_muestra in zip(muestras, self._ids(muestras)) if id_muestra not in borradas
+            ]
+            self._escribir(ruta_archivo, conservadas)
+            os.remove(ruta_archivo + ".borradas")
+        return len(muestras) - len(conservadas)
+
+    def pagina(self, clase: str, offset: int, limite: int) -> Dict:
+        """Muestras vigentes [offset, offset + limite) y el total, leyendo solo esos registros."""
+        ruta_archivo = obtener_ruta_datos(clase)
+        try:
+            f = open(ruta_archivo, 'rb')
+        except FileNotFoundError:
+            return {"total": 0, "muestras": []}
+        with f:
+            ids, inicios, fines = self._indice(ruta_archivo, f)
+            borradas = self._borradas(ruta_archivo)
+            vigentes = np.flatnonzero(~np.isin(ids, list(borradas))) if borradas else np.arange(len(ids))
+            muestras = []
+            for posicion in vigentes[offset:offset + limite]:
+                f.seek(inicios[posicion])
+                registro = json.loads(f.read(fines[posicion] - inicios[posicion]))
+                muestras.append({
+                    "id": int(ids[posicion]),
+                    "timestamp": registro.get('timestamp'),
+                    "landmarks": registro.get('landmarks')
+                })
+        return {"total": len(vigentes), "muestras": muestras}
+
+    def contar(self, clase: str) -> int:
+        return len(self._leer_vigentes(obtener_ruta_datos(clase)))
+
+    def firma(self, clase: str):
+        """Cambia cuando cambia el archivo o sus borradas (mtime y tamaño); no los lee."""
+        ruta_archivo = obtener_ruta_datos(clase)
+        try:
+            estado = os.stat(ruta_archivo)
+        except FileNotFoundError:
+            return None
+        try:
+            estado_borradas = os.stat(ruta_archivo + ".borradas")
+            borradas = (estado_borradas.st_mtime_ns, estado_borradas.st_size)
+        except FileNotFoundError:
+            borradas = None
+        return (estado.st_mtime_ns, estado.st_size, borradas)
+
+    def iterar(self, clase: str) -> Iterator[Dict]:
+        yield from self._leer_vigentes(obtener_ruta_datos(clase))
+
+    def timestamps(self, clase: str) -> Set[str]:
+        return {muestra.get('timestamp') for muestra in self._leer_vigentes(obtener_ruta_datos(clase))}
+
+    def cargar_puntos_clave(self, clase: str) -> np.ndarray:
+        """Puntos clave de la clase aplanados, shape (N, puntos * 3)."""
+        puntos = [muestra['landmarks'] for muestra in self._leer_vigentes(obtener_ruta_datos(clase)) if 'landmarks' in muestra]
+        if not puntos:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray(puntos, dtype=np.float32).reshape(len(puntos), -1)
+
+class PersistenciaSQLite:
+    """Muestras en una tabla SQLite (WAL); los puntos clave se guardan como blobs float32."""
+
+    nombre = "sqlite"
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS muestras (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            categoria TEXT NOT NULL,
+            clase TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            puntos INTEGER NOT NULL,
+            landmarks BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_muestras_categoria_clase_timestamp
+            ON muestras (categoria, clase, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_muestras_categoria_clase
+            ON muestras (categoria, clase);
+    """
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta or RUTAS['sqlite_muestras']
+        self._local = threading.local()  # Una conexión por hilo
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=ALMACEN_CONFIG['espera_bloqueo_segundos'],
+                                       isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.executescript(self.ESQUEMA)
+            self._local.conexion = conexion
+        return conexion
+
+    @contextmanager
+    def _transaccion(self):
+        """BEGIN IMMEDIATE: toma el bloqueo de escritura al empezar, así el conteo y la inserción son atómicos."""
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexion
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        conexion.execute("COMMIT")
+
+    @staticmethod
+    def _filas(clase: str, muestras: List[Dict]) -> List[tuple]:
+        filas = []
+        for muestra in muestras:
+            puntos = np.asarray(muestra['landmarks'], dtype=np.float32)
+            filas.append((CLASE_A_CATEGORIA[clase], clase, muestra.get('timestamp', ""), len(puntos), puntos.tobytes()))
+        return filas
+
+    def _contar(self, conexion: sqlite3.Connection, clase: str) -> int:
+        return conexion.execute(
+            "SELECT COUNT(*) FROM muestras WHERE categoria = ? AND clase = ?", (CLASE_A_CATEGORIA[clase], clase)
+        ).fetchone()[0]
+
+    def agregar(self, clase: str, muestras: List[Dict]) -> Dict:
+        """Añade las muestras que caben hasta samples_maximos; devuelve aceptadas, total y bytes escritos."""
+        with self._transaccion() as conexion:
+            existentes = self._contar(conexion, clase)
+            filas = self._filas(clase, muestras[:max(0, DATOS_CONFIG['samples_maximos'] - existentes)])
+            conexion.executemany(
+                "INSERT INTO muestras (categoria, clase, timestamp, puntos, landmarks) VALUES (?, ?, ?, ?, ?)", filas
+            )
+        return {"aceptadas": len(filas), "total": existentes + len(filas), "bytes": sum(len(f[4]) for f in filas)}
+
+    def reemplazar(self, clase: str, muestras: List[Dict]) -> int:
+        """Sustituye todas las muestras de la clase (sin tope; se usa al migrar)."""
+        filas = self._filas(clase, [m for m in muestras if 'landmarks' in m])
+        with self._transaccion() as conexion:
+            conexion.execute("DELETE FROM muestras WHERE categoria = ? AND clase = ?", (CLASE_A_CATEGORIA[clase], clase))
+            conexion.executemany(
+                "INSERT INTO muestras (categoria, clase, timestamp, puntos, landmarks) VALUES (?, ?, ?, ?, ?)", filas
+            )
+        return len(filas)
+
+    def eliminar(self, clase: str) -> bool:
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "DELETE FROM muestras WHERE categoria = ? AND clase = ?", (CLASE_A_CATEGORIA[clase], clase)
+            )
+        return cursor.rowcount > 0
+
+    def contar(self, clase: str) -> int:
+        return self._contar(self._conexion(), clase)
+
+    def firma(self, clase: str):
+        """Conteo e id máximo de la clase (consulta sobre el índice)."""
+        return self._conexion().execute(
+            "SELECT COUNT(*), MAX(id) FROM muestras WHERE categoria = ? AND clase = ?", (CLASE_A_CATEGORIA[clase], clase)
+        ).fetchone()
+
+    def iterar(self, clase: str) -> Iterator[Dict]:
+        cursor = self._conexion().execute(
+            "SELECT timestamp, puntos, landmarks FROM muestras WHERE categoria = ? AND clase = ? ORDER BY id",
+            (CLASE_A_CATEGORIA[clase], clase)
+        )
+        for timestamp, puntos, landmarks in cursor:
+            yield {"landmarks": self._decodificar(puntos, landmarks), "timestamp": timestamp, "clase": clase}
+
+    @staticmethod
+    def _decodificar(puntos: int, landmarks: bytes) -> List[List[float]]:
+        valores = np.frombuffer(landmarks, dtype=np.float32).reshape(puntos, -1)
+        # Redondeo para no exportar el ruido de float32 (0.1 -> 0.10000000149011612)
+        return np.round(valores.astype(np.float64), 7).tolist()
+
+    def pagina(self, clase: str, offset: int, limite: int) -> Dict:
+        """Muestras [offset, offset + limite) por id y el total (recorre el índice (categoria, clase))."""
+        conexion = self._conexion()
+        filas = conexion.execute(
+            "SELECT id, timestamp, puntos, landmarks FROM muestras WHERE categoria = ? AND clase = ? "
+            "ORDER BY id LIMIT ? OFFSET ?",
+            (CLASE_A_CATEGORIA[clase], clase, limite, offset)
+        ).fetchall()
+        return {
+            "total": self._contar(conexion, clase),
+            "muestras": [
+                {"id": id_muestra, "timestamp": timestamp, "landmarks": self._decodificar(puntos, landmarks)}
+                for id_muestra, timestamp, puntos, landmarks in filas
+            ]
+        }
+
+    def eliminar_muestra(self, clase: str, id_muestra: int) -> Optional[int]:
+        """Borra una fila; devuelve el nuevo total (None si no existe)."""
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "DELETE FROM muestras WHERE id = ? AND categoria = ? AND clase = ?",
+                (id_muestra, CLASE_A_CATEGORIA[clase], clase)
+            )
+            if cursor.rowcount == 0:
+                return None
+            return self._contar(conexion, clase)
+
+    def pendientes_compactar(self, clase: str) -> int:
+        """SQLite reutiliza las páginas libres: no hay nada que compactar."""
+        return 0
+
+    def compactar(self, clase: str) -> int:
+        return 0
+
+    def timestamps(self, clase: str) -> Set[str]:
+        """Timestamps de la clase (solo lee el índice)."""
+        return {fila[0] for fila in self._conexion().execute(
+            "SELECT timestamp FROM muestras WHERE categoria = ? AND clase = ?", (CLASE_A_CATEGORIA[clase], clase)
+        )}
+
+    def cargar_puntos_clave(self, clase: str) -> np.ndarray:
+        """Puntos clave de la clase aplanados, shape (N, puntos * 3), sin decodificar JSON."""
+        blobs = [fila[0] for fila in self._conexion().execute(
+            "SELECT landmarks FROM muestras WHERE categoria = ? AND clase = ? ORDER BY id",
+            (CLASE_A_CATEGORIA[clase], clase)
+        )]
+        if not blobs:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+
+BACKENDS = {"json": PersistenciaJSON, "sqlite": PersistenciaSQLite}
+
+def crear_persistencia(nombre: str):
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de muestras '{nombre}' no válido. Opciones: {list(BACKENDS)}")
+    return BACKENDS[nombre]()
+
+def obtener_persistencia(nombre: str):
+    """El backend activo si coincide con el nombre; si no, una instancia nueva del pedido."""
+    return persistencia_muestras if persistencia_muestras.nombre == nombre else crear_persistencia(nombre)
+
+def migrar(origen, destino, categoria: Optional[str] = None) -> Dict[str, int]:
+    """
+    Copia las muestras de cada clase de un backend a otro y devuelve {clase: muestras copiadas}.
+    Las clases con muestras en el origen se reemplazan en el destino; las vacías no se tocan.
+    """
+    categorias = [categoria] if categoria else list(CLASES_DISPONIBLES)
+    copiadas = {}
+    for nombre_categoria in categorias:
+        for clase in CLASES_DISPONIBLES[nombre_categoria]:
+            if origen.contar(clase):
+                copiadas[clase] = destino.reemplazar(clase, list(origen.iterar(clase)))
+    return copiadas
+
+# Backend activo
+persistencia_muestras = crear_persistencia(ALMACEN_CONFIG['backend'])
@@ -0,0 +1,139 @@
+"""
+Pipeline de secuencia de frames a resultado para expresiones en lengua de señas.
+Clasifica los frames en lote con los modelos de números y operaciones, detecta
+las señas sostenidas y evalúa la expresión resultante con MathEvaluator.
+"""
+
+import asyncio
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from config import MAPEO_OPS, PIPELINE_CONFIG
+from math_evaluator import evaluar_expresion_matematica
+from models import calcular_confianzas_categoria, obtener_clases_con_modelo
+
+CATEGORIAS_PIPELINE = ("numeros", "operaciones")
+
+def clasificar_frames(matriz: np.ndarray, umbral_confianza: float) -> List[Optional[int]]:
+    """Devuelve, por frame, el índice de la clase más probable o None si no supera el umbral."""
+    if matriz.shape[0] == 0:
+        return []
+
+    mejores = matriz.argmax(axis=1)
+    confianzas = matriz[np.arange(len(mejores)), mejores]
+    return [int(j) if c >= umbral_confianza else None for j, c in zip(mejores, confianzas)]
+
+def segmentar_frames(marcas_tiempo: List[float], etiquetas: List[Optional[int]],
+                     tiempo_sostenido_ms: float) -> List[Dict]:
+    """
+    Agrupa frames consecutivos con la misma etiqueta y conserva los segmentos estables.
+
+    Un segmento es estable si la seña se sostiene al menos tiempo_sostenido_ms.
+    Dos segmentos estables de la misma clase separados solo por un parpadeo más
+    corto que tiempo_sostenido_ms se consideran la misma seña.
+    """
+    segmentos = []
+    inicio = 0
+
+    for i in range(1, len(etiquetas) + 1):
+        if i < len(etiquetas) and etiquetas[i] == etiquetas[inicio]:
+            continue
+
+        etiqueta = etiquetas[inicio]
+        duracion = marcas_tiempo[i - 1] - marcas_tiempo[inicio]
+        if etiqueta is not None and duracion >= tiempo_sostenido_ms:
+            anterior = segmentos[-1] if segmentos else None
+            if (anterior is not None and anterior["etiqueta"] == etiqueta and
+                    marcas_tiempo[inicio] - anterior["fin_ms"] < tiempo_sostenido_ms):
+                anterior["fin"] = i
+                anterior["fin_ms"] = marcas_tiempo[i - 1]
+            else:
+                segmentos.append({
+                    "etiqueta": etiqueta,
+                    "inicio": inicio,
+                    "fin": i,
+                    "inicio_ms": marcas_tiempo[inicio],
+                    "fin_ms": marcas_tiempo[i - 1]
+                })
+        inicio = i
+
+    return segmentos
+
+async def procesar_secuencia_frames(frames: List[Dict], tiempo_sostenido_ms: Optional[float] = None,
+                                    umbral_confianza: Optional[float] = None, pasos: str = "none") -> Dict:
+    """
+    Convierte una secuencia de frames con marca de tiempo en tokens y evalúa la expresión.
+
+    Args:
+        frames: Lista de {"marca_tiempo_ms": float, "puntos_clave": 21 x [x, y, z]}
+        tiempo_sostenido_ms: Duración mínima de una seña (por defecto, PIPELINE_CONFIG)
+        umbral_confianza: Confianza mínima por frame (por defecto, PIPELINE_CONFIG)
+        pasos: Modo de pasos intermedios de la evaluación
+
+    Returns:
+        Diccionario con los tokens detectados, sus confianzas y la evaluación
+    """
+    if tiempo_sostenido_ms is None:
+        tiempo_sostenido_ms = PIPELINE_CONFIG['tiempo_sostenido_ms']
+    if umbral_confianza is None:
+        umbral_confianza = PIPELINE_CONFIG['umbral_confianza']
+
+    if len(frames) > PIPELINE_CONFIG['max_frames']:
+        raise ValueError(f"La secuencia excede el máximo de {PIPELINE_CONFIG['max_frames']} frames")
+
+    frames = sorted(frames, key=lambda frame: frame["marca_tiempo_ms"])
+    marcas_tiempo = [frame["marca_tiempo_ms"] for frame in frames]
+    lote = [frame["puntos_clave"] for frame in frames]
+
+    categorias = [c for c in CATEGORIAS_PIPELINE if obtener_clases_con_modelo(c)]
+    if "numeros" not in categorias:
+        raise ValueError("No hay modelos entrenados para la categoría 'numeros'")
+
+    # Una inferencia por modelo sobre toda la secuencia, con ambas categorías en paralelo
+    resultados = await asyncio.gather(*(calcular_confianzas_categoria(c, lote) for c in categorias))
+
+    clases = []
+    tokens_clase = []
+    for categoria, (clases_categoria, _) in zip(categorias, resultados):
+        for clase in clases_categoria:
+            clases.append((clase, categoria))
+            tokens_clase.append(MAPEO_OPS[clase] if categoria == "operaciones" else clase)
+    matriz = np.concatenate([m for _, m in resultados], axis=1)
+
+    etiquetas = clasificar_frames(matriz, umbral_confianza)
+    segmentos = segmentar_frames(marcas_tiempo, etiquetas, tiempo_sostenido_ms)
+
+    tokens = []
+    for segmento in segmentos:
+        j = segmento["etiqueta"]
+        clase, categoria = clases[j]
+        tokens.append({
+            "token": tokens_clase[j],
+            "clase": clase,
+            "categoria": categoria,
+            "confianza": float(matriz[segmento["inicio"]:segmento["fin"], j].mean()),
+            "inicio_ms": segmento["inicio_ms"],
+            "fin_ms": segmento["fin_ms"],
+            "frames": segmento["fin"] - segmento["inicio"]
+        })
+
+    simbolos = [t["token"] for t in tokens]
+    evaluacion = evaluar_expresion_matematica(simbolos, pasos) if simbolos else {
+        "exito": False,
+        "error": "No se detectó ninguna seña sostenida"
+    }
+
+    return {
+        "exito": evaluacion["exito"],
+        "tokens": tokens,
+        "simbolos": simbolos,
+        "resultado": evaluacion.get("resultado"),
+        "evaluacion": evaluacion,
+        "total_frames": len(frames),
+        "frames_reconocidos": sum(1 for e in etiquetas if e is not None),
+        "configuracion": {
+            "tiempo_sostenido_ms": tiempo_sostenido_ms,
+            "umbral_confianza": umbral_confianza
+        }
+    }
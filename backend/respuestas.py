@@ -0,0 +1,177 @@
+"""
+Capa de respuestas de la API: serialización JSON rápida y compresión.
+Las rutas devuelven diccionarios que se serializan directamente con orjson
+(con soporte nativo de NumPy), sin pasar por jsonable_encoder, y los cuerpos
+grandes se comprimen con brotli o gzip según lo que acepte el cliente.
+"""
+
+import functools
+import gzip
+import inspect
+import json
+from types import GeneratorType
+from typing import Any, Optional
+
+import orjson
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+
+from config import RESPUESTAS_CONFIG
+from perfilado import marcar_etapa, medir_etapa
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se usa gzip
+    brotli = None
+
+OPCIONES_ORJSON = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _por_defecto(obj: Any) -> Any:
+    """Convierte los tipos que orjson no soporta de forma nativa."""
+    if isinstance(obj, GeneratorType):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+def _por_defecto_json(obj: Any) -> Any:
+    """Como _por_defecto, para json estándar (que tampoco conoce los tipos de NumPy)."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return _por_defecto(obj)
+
+def serializar_json(contenido: Any) -> bytes:
+    """
+    Serializa a JSON con orjson (arrays y escalares de NumPy incluidos).
+    orjson no admite enteros de más de 64 bits; con ellos se usa json estándar.
+    """
+    try:
+        return orjson.dumps(contenido, default=_por_defecto, option=OPCIONES_ORJSON)
+    except orjson.JSONEncodeError as e:
+        if "Integer exceeds 64-bit range" not in str(e):
+            raise
+        return json.dumps(
+            contenido, default=_por_defecto_json, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+class RespuestaJSONRapida(JSONResponse):
+    """JSONResponse que serializa con orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return serializar_json(content)
+
+class RutaRapida(APIRoute):
+    """
+    Ruta que convierte el resultado del endpoint en RespuestaJSONRapida.
+
+    FastAPI pasa todo valor que no sea un Response por jsonable_encoder antes de
+    serializarlo; al devolver ya un Response ese paso se omite.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        modelo_respuesta = kwargs.get("response_model")
+        if isinstance(modelo_respuesta, DefaultPlaceholder):
+            modelo_respuesta = modelo_respuesta.value
+        # Con response_model (explícito o inferido de la anotación) FastAPI debe validar la salida
+        sin_anotacion = inspect.signature(endpoint).return_annotation is inspect.Signature.empty
+        if modelo_respuesta is None and sin_anotacion and not getattr(endpoint, "_ruta_rapida", False):
+            endpoint = self._envolver(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _envolver(endpoint):
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def envoltura(*args, **kwargs):
+                marcar_etapa("parseo")
+                with medir_etapa("endpoint"):
+                    resultado = await endpoint(*args, **kwargs)
+                if isinstance(resultado, Response):
+                    return resultado
+                with medir_etapa("serializacion"):
+                    return RespuestaJSONRapida(resultado)
+        else:
+            @functools.wraps(endpoint)
+            def envoltura(*args, **kwargs):
+                marcar_etapa("parseo")
+                with medir_etapa("endpoint"):
+                    resultado = endpoint(*args, **kwargs)
+                if isinstance(resultado, Response):
+                    return resultado
+                with medir_etapa("serializacion"):
+                    return RespuestaJSONRapida(resultado)
+        envoltura._ruta_rapida = True  # include_router vuelve a construir la ruta con el mismo endpoint
+        return envoltura
+
+class MiddlewareCompresion:
+    """
+    Middleware ASGI que comprime con brotli o gzip las respuestas completas grandes.
+
+    Solo comprime cuerpos enviados en un único mensaje (no afecta a streams como
+    SSE) que superen RESPUESTAS_CONFIG['compresion_min_bytes'].
+    """
+
+    TIPOS_COMPRIMIBLES = ("application/json", "text/")
+
+    def __init__(self, app, min_bytes: Optional[int] = None):
+        self.app = app
+        self.min_bytes = RESPUESTAS_CONFIG['compresion_min_bytes'] if min_bytes is None else min_bytes
+
+    def _elegir_codificacion(self, scope) -> Optional[str]:
+        for nombre, valor in scope.get("headers", []):
+            if nombre == b"accept-encoding":
+                aceptadas = {c.split(";")[0].strip() for c in valor.decode("latin-1").lower().split(",")}
+                if brotli is not None and "br" in aceptadas:
+                    return "br"
+                if "gzip" in aceptadas:
+                    return "gzip"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codificacion = self._elegir_codificacion(scope)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+
+        async def enviar(mensaje):
+            nonlocal inicio
+            if mensaje["type"] == "http.response.start":
+                # Se retiene el inicio hasta saber si el cuerpo llega completo
+                inicio = mensaje
+                return
+
+            if mensaje["type"] != "http.response.body" or inicio is None:
+                await send(mensaje)
+                return
+
+            mensaje_inicio, inicio = inicio, None
+            cuerpo = mensaje.get("body", b"")
+            encabezados = [(k, v) for k, v in mensaje_inicio["headers"]]
+            tipo = next((v.decode("latin-1") for k, v in encabezados if k == b"content-type"), "")
+            ya_codificado = any(k == b"content-encoding" for k, v in encabezados)
+
+            if (mensaje.get("more_body", False) or ya_codificado or len(cuerpo) < self.min_bytes
+                    or not tipo.startswith(self.TIPOS_COMPRIMIBLES)):
+                await send(mensaje_inicio)
+                await send(mensaje)
+                return
+
+            if codificacion == "br":
+                cuerpo = brotli.compress(cuerpo, quality=RESPUESTAS_CONFIG['nivel_brotli'])
+            else:
+                cuerpo = gzip.compress(cuerpo, compresslevel=RESPUESTAS_CONFIG['nivel_gzip'])
+
+            encabezados = [(k, v) for k, v in encabezados if k != b"content-length"]
+            encabezados.append((b"content-encoding", codificacion.encode("latin-1")))
+            encabezados.append((b"content-length", str(len(cuerpo)).encode("latin-1")))
+            encabezados.append((b"vary", b"Accept-Encoding"))
+            await send({**mensaje_inicio, "headers": encabezados})
+            await send({**mensaje, "body": cuerpo})
+
+        await self.app(scope, receive, enviar)
@@ -1,20 +1,24 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
-import asyncio
-import json
-import os
 from datetime import datetime
 
 from config import (
     CLASES_DISPONIBLES, TODAS_LAS_CLASES, CLASE_A_CATEGORIA, DATOS_CONFIG,
-    obtener_ruta_datos, obtener_ruta_modelo, obtener_ruta_encoder, validar_clase
+    obtener_ruta_encoder, validar_clase
 )
-from models import entrenar_modelo_clase, predecir_clase, eliminar_modelo_clase
-from utils import validar_puntos_clave
+from models import entrenar_modelo_clase, predecir_clase, eliminar_modelo_clase, predecir_lote_categoria
+from utils import validar_puntos_clave, validar_paginacion
+from estadisticas import agregador_estadisticas
+from cache_http import respuesta_condicional, generar_etag
+from respuestas import RutaRapida
+from salud import monitor_salud
+from almacen_muestras import almacen_muestras
+from filtro_duplicados import filtro_duplicados
+from memoria import inspector_memoria
 
 # Crear el router para números
-router = APIRouter(prefix="/api/numeros", tags=["numeros"])
+router = APIRouter(prefix="/api/numeros", tags=["numeros"], route_class=RutaRapida)
 
 # --- Modelos de datos ---
 class DatosMuestra(BaseModel):
@@ -24,9 +28,14 @@ class DatosMuestra(BaseModel):
 class SolicitudPrediccion(BaseModel):
     puntos_clave: List[List[float]]
 
+class SolicitudPrediccionLote(BaseModel):
+    lote_puntos_clave: List[List[List[float]]]
+
 # --- Variables globales para números ---
 cola_muestras_numeros = {}  # {clase: []}
 esta_guardando_numeros = {}  # {clase: bool}
+monitor_salud.registrar_colas("numeros", cola_muestras_numeros, esta_guardando_numeros)
+inspector_memoria.registrar_estructura("cola_muestras_numeros", cola_muestras_numeros)
 
 # --- Funciones auxiliares ---
 def inicializar_cola_numero(clase: str):
@@ -35,101 +44,32 @@ def inicializar_cola_numero(clase: str):
         cola_muestras_numeros[clase] = []
         esta_guardando_numeros[clase] = False
 
-async def tarea_guardar_cola_numero_en_disco(clase: str):
-    """Tarea de fondo para guardar las muestras de números en lotes."""
-    inicializar_cola_numero(clase)
-    
-    while True:
-        await asyncio.sleep(5)  # Guardar cada 5 segundos
-        
-        if not esta_guardando_numeros[clase] and cola_muestras_numeros[clase]:
-            esta_guardando_numeros[clase] = True
-            try:
-                await guardar_muestras_numero(clase)
-                cola_muestras_numeros[clase].clear()
-            finally:
-                esta_guardando_numeros[clase] = False
-
+@monitor_salud.medir_guardado("numeros")
 async def guardar_muestras_numero(clase: str):
-    """Guarda las muestras de números en disco de forma asíncrona."""
-    if not cola_muestras_numeros[clase]:
+    """Guarda las muestras de números en disco (bajo el bloqueo compartido entre workers)."""
+    cola = cola_muestras_numeros[clase]
+    if not cola:
         return
     
-    ruta_archivo = obtener_ruta_datos(clase)
-    
-    # Crear directorio si no existe
-    os.makedirs(os.path.dirname(ruta_archivo), exist_ok=True)
-    
-    # Leer datos existentes
-    datos_existentes = []
-    if os.path.exists(ruta_archivo):
-        try:
-            with open(ruta_archivo, 'r') as f:
-                datos_existentes = json.load(f)
-        except:
-            datos_existentes = []
-    
-    # Agregar nuevas muestras
-    datos_existentes.extend(cola_muestras_numeros[clase])
-    
-    # Guardar de forma atómica
-    ruta_temporal = ruta_archivo + ".tmp"
-    with open(ruta_temporal, 'w') as f:
-        json.dump(datos_existentes, f, indent=2)
-    
-    os.replace(ruta_temporal, ruta_archivo)
+    # Sacar el lote de la cola: lo que llegue mientras se escribe espera al siguiente guardado
+    lote = cola[:]
+    del cola[:len(lote)]
+    try:
+        await almacen_muestras.guardar("numeros", clase, lote)
+    except Exception:
+        cola[:0] = lote
+        raise
 
 def obtener_estadisticas_numero(clase: str):
     """Obtiene estadísticas de un número específico."""
-    ruta_archivo = obtener_ruta_datos(clase)
-    
-    if not os.path.exists(ruta_archivo):
-        return {
-            'total_muestras': 0,
-            'tiene_modelo': False,
-            'puede_entrenar': False,
-            'recoleccion_completa': False,
-            'progreso_porcentaje': 0.0,
-            'muestras_restantes': DATOS_CONFIG['samples_recomendados'],
-            'cantidad_recomendada': DATOS_CONFIG['samples_recomendados']
-        }
-    
-    try:
-        with open(ruta_archivo, 'r') as f:
-            datos = json.load(f)
-        total_muestras = len(datos)
-    except:
-        total_muestras = 0
-    
-    # Verificar si existe modelo entrenado
-    ruta_modelo = obtener_ruta_modelo(clase)
-    tiene_modelo = os.path.exists(ruta_modelo)
-    
-    # Verificar si puede entrenar
-    puede_entrenar = total_muestras >= DATOS_CONFIG['samples_minimos']
-    
-    # Calcular progreso hacia las 100 muestras
-    recoleccion_completa = total_muestras >= DATOS_CONFIG['samples_recomendados']
-    progreso_porcentaje = round((total_muestras / DATOS_CONFIG['samples_recomendados']) * 100, 1)
-    muestras_restantes = max(0, DATOS_CONFIG['samples_recomendados'] - total_muestras)
-    
-    return {
-        'total_muestras': total_muestras,
-        'tiene_modelo': tiene_modelo,
-        'puede_entrenar': puede_entrenar,
-        'recoleccion_completa': recoleccion_completa,
-        'progreso_porcentaje': progreso_porcentaje,
-        'muestras_restantes': muestras_restantes,
-        'cantidad_recomendada': DATOS_CONFIG['samples_recomendados']
-    }
+    return agregador_estadisticas.obtener_clase(clase)
 
 # --- Endpoints para números ---
 
 @router.post("/recolectar/{numero}")
 async def recolectar_muestra_numero(
     numero: str, 
-    datos: DatosMuestra, 
-    tareas_fondo: BackgroundTasks
+    datos: DatosMuestra
 ):
     """Recolecta una muestra para un número específico."""
     
@@ -141,8 +81,9 @@ async def recolectar_muestra_numero(
         )
     
     # Verificar si ya se alcanzó el límite de 100 muestras
+    almacen_muestras.sincronizar(numero)
     estadisticas_actuales = obtener_estadisticas_numero(numero)
-    muestras_en_cola = len(cola_muestras_numeros.get(numero, []))
+    muestras_en_cola = len(cola_muestras_numeros.get(numero, [])) + almacen_muestras.en_vuelo(numero)
     total_actual = estadisticas_actuales['total_muestras'] + muestras_en_cola
     
     if total_actual >= DATOS_CONFIG['samples_recomendados']:
@@ -163,6 +104,18 @@ async def recolectar_muestra_numero(
             detail="Puntos clave inválidos"
         )
     
+    # Descartar frames casi idénticos a uno reciente (pose sostenida)
+    if filtro_duplicados.es_duplicado("numeros", numero, datos.puntos_clave):
+        return {
+            "mensaje": f"Muestra descartada: casi idéntica a una reciente del número '{numero}'",
+            "numero": numero,
+            "categoria": "numeros",
+            "muestra_duplicada": True,
+            "total_muestras": total_actual,
+            "filtro_duplicados": filtro_duplicados.conteos(numero),
+            "estadisticas": estadisticas_actuales
+        }
+    
     # Inicializar cola si es necesario
     inicializar_cola_numero(numero)
     
@@ -179,11 +132,11 @@ async def recolectar_muestra_numero(
     
     cola_muestras_numeros[numero].append(muestra)
     
-    # Programar guardado en segundo plano
-    tareas_fondo.add_task(tarea_guardar_cola_numero_en_disco, numero)
+    # Programar guardado (se agrupa con los que ya estén programados)
+    almacen_muestras.programar_guardado("numeros", numero, guardar_muestras_numero)
     
     estadisticas = obtener_estadisticas_numero(numero)
-    nuevo_total = estadisticas['total_muestras'] + len(cola_muestras_numeros[numero])
+    nuevo_total = estadisticas['total_muestras'] + len(cola_muestras_numeros[numero]) + almacen_muestras.en_vuelo(numero)
     
     # Verificar si acabamos de completar las 100 muestras
     recoleccion_completa = nuevo_total >= DATOS_CONFIG['samples_recomendados']
@@ -198,11 +151,12 @@ async def recolectar_muestra_numero(
         "total_muestras": nuevo_total,
         "recoleccion_completa": recoleccion_completa,
         "progreso_porcentaje": round((nuevo_total / DATOS_CONFIG['samples_recomendados']) * 100, 1),
+        "filtro_duplicados": filtro_duplicados.conteos(numero),
         "estadisticas": estadisticas
     }
 
 @router.get("/estadisticas/{numero}")
-async def obtener_estadisticas_numero_endpoint(numero: str):
+async def obtener_estadisticas_numero_endpoint(numero: str, request: Request):
     """Obtiene estadísticas detalladas de un número específico."""
     
     if numero not in CLASES_DISPONIBLES['numeros']:
@@ -211,16 +165,21 @@ async def obtener_estadisticas_numero_endpoint(numero: str):
             detail=f"Número '{numero}' no válido"
         )
     
-    estadisticas = obtener_estadisticas_numero(numero)
-    estadisticas['numero'] = numero
-    estadisticas['categoria'] = "numeros"
-    
-    return estadisticas
+    def construir():
+        estadisticas = obtener_estadisticas_numero(numero)
+        estadisticas['numero'] = numero
+        estadisticas['categoria'] = "numeros"
+        return estadisticas
+    
+    return respuesta_condicional(
+        request,
+        generar_etag(f"numeros-{numero}", agregador_estadisticas.version),
+        construir,
+        agregador_estadisticas.ultima_modificacion
+    )
 
-@router.get("/estadisticas")
-async def obtener_estadisticas_numeros():
-    """Obtiene estadísticas de todos los números."""
-    
+def construir_estadisticas_numeros():
+    """Construye las estadísticas de todos los números."""
     estadisticas_numeros = {}
     numeros_completos = 0
     total_muestras = 0
@@ -246,8 +205,18 @@ async def obtener_estadisticas_numeros():
         }
     }
 
+@router.get("/estadisticas")
+async def obtener_estadisticas_numeros(request: Request):
+    """Obtiene estadísticas de todos los números."""
+    return respuesta_condicional(
+        request,
+        generar_etag("numeros", agregador_estadisticas.version),
+        construir_estadisticas_numeros,
+        agregador_estadisticas.ultima_modificacion
+    )
+
 @router.post("/entrenar/{numero}")
-async def entrenar_modelo_numero(numero: str):
+async def entrenar_modelo_numero(numero: str, force: bool = False):
     """Entrena el modelo para un número específico."""
     
     if numero not in CLASES_DISPONIBLES['numeros']:
@@ -265,9 +234,12 @@ async def entrenar_modelo_numero(numero: str):
         )
     
     try:
-        resultado = await entrenar_modelo_clase(numero)
+        resultado = await entrenar_modelo_clase(numero, forzar=force)
         return {
-            "mensaje": f"Modelo de número '{numero}' entrenado exitosamente",
+            "mensaje": (
+                f"Modelo de número '{numero}' entrenado exitosamente" if resultado.get("reentrenado", True)
+                else f"Modelo de número '{numero}' ya entrenado con estos datos (use force=true para reentrenar)"
+            ),
             "numero": numero,
             "categoria": "numeros",
             "resultado": resultado
@@ -275,6 +247,23 @@ async def entrenar_modelo_numero(numero: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error entrenando modelo: {str(e)}")
 
+@router.post("/prediccion/lote")
+async def predecir_numeros_lote(datos: SolicitudPrediccionLote):
+    """Predice qué número corresponde a cada seña del lote, en una sola inferencia por modelo."""
+    
+    try:
+        predicciones = await predecir_lote_categoria("numeros", datos.lote_puntos_clave)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en predicción: {str(e)}")
+    
+    return {
+        "categoria": "numeros",
+        "total": len(predicciones),
+        "predicciones": predicciones
+    }
+
 @router.post("/prediccion/{numero}")
 async def predecir_numero(numero: str, datos: SolicitudPrediccion):
     """Realiza predicción para un número específico."""
@@ -312,10 +301,9 @@ async def eliminar_datos_numero(numero: str):
             detail=f"Número '{numero}' no válido"
         )
     
-    ruta_archivo = obtener_ruta_datos(numero)
-    
-    if os.path.exists(ruta_archivo):
-        os.remove(ruta_archivo)
+    if await monitor_salud.ejecutar_en_hilo(almacen_muestras.eliminar, numero):
+        agregador_estadisticas.registrar_eliminacion_datos(numero)
+        filtro_duplicados.olvidar(numero)
         return {
             "mensaje": f"Datos del número '{numero}' eliminados exitosamente",
             "numero": numero,
@@ -327,6 +315,48 @@ async def eliminar_datos_numero(numero: str):
             detail=f"No se encontraron datos para el número '{numero}'"
         )
 
+@router.get("/muestras/{numero}")
+async def listar_muestras_numero(numero: str, offset: int = 0, limit: Optional[int] = None):
+    """Página de muestras guardadas del número, con sus ids."""
+    
+    if numero not in CLASES_DISPONIBLES['numeros']:
+        raise HTTPException(status_code=400, detail=f"Número '{numero}' no válido")
+    
+    try:
+        limite = validar_paginacion(offset, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    pagina = await monitor_salud.ejecutar_en_hilo(almacen_muestras.pagina, numero, offset, limite)
+    return {
+        "numero": numero,
+        "categoria": "numeros",
+        "offset": offset,
+        "limit": limite,
+        **pagina
+    }
+
+@router.delete("/muestras/{numero}/{id_muestra}")
+async def eliminar_muestra_numero(numero: str, id_muestra: int):
+    """Elimina una muestra del número por id, sin borrar el resto."""
+    
+    if numero not in CLASES_DISPONIBLES['numeros']:
+        raise HTTPException(status_code=400, detail=f"Número '{numero}' no válido")
+    
+    total = await almacen_muestras.eliminar_muestra(numero, id_muestra)
+    if total is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No existe la muestra {id_muestra} del número '{numero}'"
+        )
+    return {
+        "mensaje": f"Muestra {id_muestra} del número '{numero}' eliminada",
+        "numero": numero,
+        "categoria": "numeros",
+        "id": id_muestra,
+        "total_muestras": total
+    }
+
 @router.delete("/modelo/{numero}")
 async def eliminar_modelo_numero(numero: str):
     """Elimina el modelo entrenado para un número específico."""
@@ -1,22 +1,30 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import List, Optional
-import asyncio
-import json
+from typing import List, Optional, Literal
 import os
+import time
+import uuid
 from datetime import datetime
-import re
 
 from config import (
     CLASES_DISPONIBLES, TODAS_LAS_CLASES, CLASE_A_CATEGORIA, DATOS_CONFIG,
-    obtener_ruta_datos, obtener_ruta_modelo, obtener_ruta_encoder, validar_clase,
-    MAPEO_OPS   # 👈 importamos el mapa humano → símbolo
+    obtener_ruta_modelo, obtener_ruta_encoder, validar_clase,
+    LIMITES_EXPRESION
 )
 from models import entrenar_modelo_clase, predecir_clase, eliminar_modelo_clase
-from utils import validar_puntos_clave
+from math_evaluator import evaluador_matematico, evaluar_expresion_con_prediccion_numeros, SesionExpresion
+from pipeline_expresion import procesar_secuencia_frames
+from utils import validar_puntos_clave, validar_paginacion
+from estadisticas import agregador_estadisticas
+from cache_http import respuesta_condicional, generar_etag
+from respuestas import RutaRapida
+from salud import monitor_salud
+from almacen_muestras import almacen_muestras
+from filtro_duplicados import filtro_duplicados
+from memoria import inspector_memoria
 
 # Crear el router para operaciones
-router = APIRouter(prefix="/api/operaciones", tags=["operaciones"])
+router = APIRouter(prefix="/api/operaciones", tags=["operaciones"], route_class=RutaRapida)
 
 # --- Modelos de datos ---
 class DatosMuestra(BaseModel):
@@ -29,9 +37,31 @@ class SolicitudPrediccion(BaseModel):
 class ExpresionMatematica(BaseModel):
     expresion: str
 
+class ExpresionSenas(BaseModel):
+    puntos_clave_numeros: List[List[List[float]]]
+    operadores: List[str]
+    pasos: Literal["none", "summary", "full"] = "none"
+
+class TokenSesion(BaseModel):
+    token: str
+
+class FrameSenas(BaseModel):
+    marca_tiempo_ms: float
+    puntos_clave: List[List[float]]
+
+class SecuenciaFrames(BaseModel):
+    frames: List[FrameSenas]
+    tiempo_sostenido_ms: Optional[float] = None
+    umbral_confianza: Optional[float] = None
+    pasos: Literal["none", "summary", "full"] = "none"
+
 # --- Variables globales para operaciones ---
 cola_muestras_operaciones = {}  # {clase: []}
 esta_guardando_operaciones = {}  # {clase: bool}
+monitor_salud.registrar_colas("operaciones", cola_muestras_operaciones, esta_guardando_operaciones)
+inspector_memoria.registrar_estructura("cola_muestras_operaciones", cola_muestras_operaciones)
+sesiones_expresion = {}  # {id_sesion: SesionExpresion}
+inspector_memoria.registrar_estructura("sesiones_expresion", sesiones_expresion)
 
 # --- Funciones auxiliares ---
 def inicializar_cola_operacion(clase: str):
@@ -40,129 +70,76 @@ def inicializar_cola_operacion(clase: str):
         cola_muestras_operaciones[clase] = []
         esta_guardando_operaciones[clase] = False
 
-async def tarea_guardar_cola_operacion_en_disco(clase: str):
-    """Tarea de fondo para guardar las muestras de operaciones en lotes."""
-    inicializar_cola_operacion(clase)
-    
-    while True:
-        await asyncio.sleep(5)  # Guardar cada 5 segundos
-        
-        if not esta_guardando_operaciones[clase] and cola_muestras_operaciones[clase]:
-            esta_guardando_operaciones[clase] = True
-            try:
-                await guardar_muestras_operacion(clase)
-                cola_muestras_operaciones[clase].clear()
-            finally:
-                esta_guardando_operaciones[clase] = False
-
+@monitor_salud.medir_guardado("operaciones")
 async def guardar_muestras_operacion(clase: str):
-    """Guarda las muestras de operaciones en disco de forma asíncrona."""
-    if not cola_muestras_operaciones[clase]:
+    """Guarda las muestras de operaciones en disco (bajo el bloqueo compartido entre workers)."""
+    cola = cola_muestras_operaciones[clase]
+    if not cola:
         return
     
-    ruta_archivo = obtener_ruta_datos(clase)
-    
-    # Crear directorio si no existe
-    os.makedirs(os.path.dirname(ruta_archivo), exist_ok=True)
-    
-    # Leer datos existentes
-    datos_existentes = []
-    if os.path.exists(ruta_archivo):
-        try:
-            with open(ruta_archivo, 'r') as f:
-                datos_existentes = json.load(f)
-        except:
-            datos_existentes = []
-    
-    # Agregar nuevas muestras
-    datos_existentes.extend(cola_muestras_operaciones[clase])
-    
-    # Guardar de forma atómica
-    ruta_temporal = ruta_archivo + ".tmp"
-    with open(ruta_temporal, 'w') as f:
-        json.dump(datos_existentes, f, indent=2)
-    
-    os.replace(ruta_temporal, ruta_archivo)
+    # Sacar el lote de la cola: lo que llegue mientras se escribe espera al siguiente guardado
+    lote = cola[:]
+    del cola[:len(lote)]
+    try:
+        await almacen_muestras.guardar("operaciones", clase, lote)
+    except Exception:
+        cola[:0] = lote
+        raise
 
 def obtener_estadisticas_operacion(clase: str):
     """Obtiene estadísticas de una operación específica."""
-    ruta_archivo = obtener_ruta_datos(clase)
-    
-    if not os.path.exists(ruta_archivo):
-        return {
-            'total_muestras': 0,
-            'tiene_modelo': False,
-            'puede_entrenar': False,
-            'recoleccion_completa': False,
-            'progreso_porcentaje': 0.0,
-            'muestras_restantes': DATOS_CONFIG['samples_recomendados'],
-            'cantidad_recomendada': DATOS_CONFIG['samples_recomendados']
-        }
-    
-    try:
-        with open(ruta_archivo, 'r') as f:
-            datos = json.load(f)
-        total_muestras = len(datos)
-    except:
-        total_muestras = 0
-    
-    # Verificar si existe modelo entrenado
-    ruta_modelo = obtener_ruta_modelo(clase)
-    tiene_modelo = os.path.exists(ruta_modelo)
-    
-    # Verificar si puede entrenar
-    puede_entrenar = total_muestras >= DATOS_CONFIG['samples_minimos']
-    
-    # Calcular progreso hacia las 100 muestras
-    recoleccion_completa = total_muestras >= DATOS_CONFIG['samples_recomendados']
-    progreso_porcentaje = round((total_muestras / DATOS_CONFIG['samples_recomendados']) * 100, 1)
-    muestras_restantes = max(0, DATOS_CONFIG['samples_recomendados'] - total_muestras)
-    
-    return {
-        'total_muestras': total_muestras,
-        'tiene_modelo': tiene_modelo,
-        'puede_entrenar': puede_entrenar,
-        'recoleccion_completa': recoleccion_completa,
-        'progreso_porcentaje': progreso_porcentaje,
-        'muestras_restantes': muestras_restantes,
-        'cantidad_recomendada': DATOS_CONFIG['samples_recomendados']
-    }
+    return agregador_estadisticas.obtener_clase(clase)
 
-def evaluar_expresion_matematica(expresion: str):
-    """Evalúa una expresión matemática de forma segura."""
+# Mayor entero que un float representa sin perder unidades
+MAX_ENTERO_EXACTO = 2 ** 53
 
-    # Reemplazar nombres humanos por símbolos (+, -, *, /)
-    for humano, simbolo in MAPEO_OPS.items():
-        expresion = expresion.replace(humano, simbolo)
+def evaluar_expresion_matematica(expresion: str):
+    """Evalúa una expresión matemática de forma segura, sin usar eval()."""
 
-    expresion = expresion.strip()
+    # Tokenizar (los nombres humanos de MAPEO_OPS se convierten a símbolos);
+    # lanza ValueError si la expresión es inválida o excede los límites
+    tokens = evaluador_matematico.tokenizar(expresion, LIMITES_EXPRESION)
+    expresion_normalizada = " ".join(tokens)
 
-    # Validar que solo contenga números, operadores y espacios
-    patron_valido = r'^[0-9+\-*/().\s]+$'
-    if not re.match(patron_valido, expresion):
-        raise ValueError("Expresión contiene caracteres no válidos")
-    
     try:
-        resultado = eval(expresion)
+        postfijo = evaluador_matematico.convertir_a_postfijo(tokens)
+        resultado, _ = evaluador_matematico.evaluar_postfijo(
+            postfijo, max_pasos=LIMITES_EXPRESION['max_pasos'], pasos="none"
+        )
+        # Se calcula en float: por encima de 2^53 un entero ya no es exacto y se devuelve como float
+        if resultado.is_integer() and abs(resultado) <= MAX_ENTERO_EXACTO:
+            resultado = int(resultado)
         return {
-            "expresion": expresion,
+            "expresion": expresion_normalizada,
             "resultado": resultado,
             "valida": True
         }
     except Exception as e:
         return {
-            "expresion": expresion,
+            "expresion": expresion_normalizada,
             "error": str(e),
             "valida": False
         }
 
+def limpiar_sesiones_inactivas():
+    """Elimina las sesiones de expresión que llevan demasiado tiempo sin usarse."""
+    limite = time.time() - LIMITES_EXPRESION['sesion_inactiva_segundos']
+    for id_sesion in [i for i, sesion in sesiones_expresion.items() if sesion.ultimo_uso < limite]:
+        del sesiones_expresion[id_sesion]
+
+def obtener_sesion(id_sesion: str) -> SesionExpresion:
+    """Obtiene una sesión de expresión o lanza 404 si no existe."""
+    sesion = sesiones_expresion.get(id_sesion)
+    if sesion is None:
+        raise HTTPException(status_code=404, detail=f"Sesión '{id_sesion}' no encontrada")
+    return sesion
+
 # --- Endpoints para operaciones ---
 
 @router.post("/recolectar/{operacion}")
 async def recolectar_muestra_operacion(
     operacion: str, 
-    datos: DatosMuestra, 
-    tareas_fondo: BackgroundTasks
+    datos: DatosMuestra
 ):
     """Recolecta una muestra para una operación específica."""
     
@@ -172,8 +149,9 @@ async def recolectar_muestra_operacion(
             detail=f"Operación '{operacion}' no válida. Operaciones disponibles: {CLASES_DISPONIBLES['operaciones']}"
         )
     
+    almacen_muestras.sincronizar(operacion)
     estadisticas_actuales = obtener_estadisticas_operacion(operacion)
-    muestras_en_cola = len(cola_muestras_operaciones.get(operacion, []))
+    muestras_en_cola = len(cola_muestras_operaciones.get(operacion, [])) + almacen_muestras.en_vuelo(operacion)
     total_actual = estadisticas_actuales['total_muestras'] + muestras_en_cola
     
     if total_actual >= DATOS_CONFIG['samples_recomendados']:
@@ -193,6 +171,17 @@ async def recolectar_muestra_operacion(
             detail="Puntos clave inválidos"
         )
     
+    if filtro_duplicados.es_duplicado("operaciones", operacion, datos.puntos_clave):
+        return {
+            "mensaje": f"Muestra descartada: casi idéntica a una reciente de la operación '{operacion}'",
+            "operacion": operacion,
+            "categoria": "operaciones",
+            "muestra_duplicada": True,
+            "total_muestras": total_actual,
+            "filtro_duplicados": filtro_duplicados.conteos(operacion),
+            "estadisticas": estadisticas_actuales
+        }
+    
     inicializar_cola_operacion(operacion)
     
     if not datos.fecha_hora:
@@ -205,10 +194,10 @@ async def recolectar_muestra_operacion(
     }
     
     cola_muestras_operaciones[operacion].append(muestra)
-    tareas_fondo.add_task(tarea_guardar_cola_operacion_en_disco, operacion)
+    almacen_muestras.programar_guardado("operaciones", operacion, guardar_muestras_operacion)
     
     estadisticas = obtener_estadisticas_operacion(operacion)
-    nuevo_total = estadisticas['total_muestras'] + len(cola_muestras_operaciones[operacion])
+    nuevo_total = estadisticas['total_muestras'] + len(cola_muestras_operaciones[operacion]) + almacen_muestras.en_vuelo(operacion)
     
     recoleccion_completa = nuevo_total >= DATOS_CONFIG['samples_recomendados']
     
@@ -222,21 +211,30 @@ async def recolectar_muestra_operacion(
         "total_muestras": nuevo_total,
         "recoleccion_completa": recoleccion_completa,
         "progreso_porcentaje": round((nuevo_total / DATOS_CONFIG['samples_recomendados']) * 100, 1),
+        "filtro_duplicados": filtro_duplicados.conteos(operacion),
         "estadisticas": estadisticas
     }
 
 @router.get("/estadisticas/{operacion}")
-async def obtener_estadisticas_operacion_endpoint(operacion: str):
+async def obtener_estadisticas_operacion_endpoint(operacion: str, request: Request):
     if operacion not in CLASES_DISPONIBLES['operaciones']:
         raise HTTPException(status_code=400, detail=f"Operación '{operacion}' no válida")
     
-    estadisticas = obtener_estadisticas_operacion(operacion)
-    estadisticas['operacion'] = operacion
-    estadisticas['categoria'] = "operaciones"
-    return estadisticas
+    def construir():
+        estadisticas = obtener_estadisticas_operacion(operacion)
+        estadisticas['operacion'] = operacion
+        estadisticas['categoria'] = "operaciones"
+        return estadisticas
+    
+    return respuesta_condicional(
+        request,
+        generar_etag(f"operaciones-{operacion}", agregador_estadisticas.version),
+        construir,
+        agregador_estadisticas.ultima_modificacion
+    )
 
-@router.get("/estadisticas")
-async def obtener_estadisticas_operaciones():
+def construir_estadisticas_operaciones():
+    """Construye las estadísticas de todas las operaciones."""
     estadisticas_operaciones = {}
     operaciones_completas = 0
     total_muestras = 0
@@ -262,8 +260,17 @@ async def obtener_estadisticas_operaciones():
         }
     }
 
+@router.get("/estadisticas")
+async def obtener_estadisticas_operaciones(request: Request):
+    return respuesta_condicional(
+        request,
+        generar_etag("operaciones", agregador_estadisticas.version),
+        construir_estadisticas_operaciones,
+        agregador_estadisticas.ultima_modificacion
+    )
+
 @router.post("/entrenar/{operacion}")
-async def entrenar_modelo_operacion(operacion: str):
+async def entrenar_modelo_operacion(operacion: str, force: bool = False):
     if operacion not in CLASES_DISPONIBLES['operaciones']:
         raise HTTPException(status_code=400, detail=f"Operación '{operacion}' no válida")
     
@@ -275,9 +282,12 @@ async def entrenar_modelo_operacion(operacion: str):
         )
     
     try:
-        resultado = await entrenar_modelo_clase(operacion)
+        resultado = await entrenar_modelo_clase(operacion, forzar=force)
         return {
-            "mensaje": f"Modelo de operación '{operacion}' entrenado exitosamente",
+            "mensaje": (
+                f"Modelo de operación '{operacion}' entrenado exitosamente" if resultado.get("reentrenado", True)
+                else f"Modelo de operación '{operacion}' ya entrenado con estos datos (use force=true para reentrenar)"
+            ),
             "operacion": operacion,
             "categoria": "operaciones",
             "resultado": resultado
@@ -312,16 +322,92 @@ async def evaluar_expresion(datos: ExpresionMatematica):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error evaluando expresión: {str(e)}")
 
+@router.post("/expresion_senas")
+async def evaluar_expresion_senas(datos: ExpresionSenas):
+    """Evalúa una expresión cuyos números llegan como señas; todos se predicen en un solo lote."""
+    if len(datos.puntos_clave_numeros) + len(datos.operadores) > LIMITES_EXPRESION['max_tokens']:
+        raise HTTPException(
+            status_code=400,
+            detail=f"La expresión excede el máximo de {LIMITES_EXPRESION['max_tokens']} tokens"
+        )
+    
+    return await evaluar_expresion_con_prediccion_numeros(
+        datos.puntos_clave_numeros, datos.operadores, datos.pasos
+    )
+
+@router.post("/pipeline")
+async def procesar_pipeline_senas(datos: SecuenciaFrames):
+    """Convierte una secuencia de frames en tokens y devuelve el resultado en una sola llamada."""
+    try:
+        return await procesar_secuencia_frames(
+            [frame.model_dump() for frame in datos.frames],
+            tiempo_sostenido_ms=datos.tiempo_sostenido_ms,
+            umbral_confianza=datos.umbral_confianza,
+            pasos=datos.pasos
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error procesando la secuencia: {str(e)}")
+
+@router.post("/sesiones")
+async def crear_sesion_expresion():
+    """Crea una sesión para construir una expresión token a token."""
+    limpiar_sesiones_inactivas()
+    if len(sesiones_expresion) >= LIMITES_EXPRESION['max_sesiones']:
+        raise HTTPException(status_code=503, detail="Demasiadas sesiones abiertas, intente más tarde")
+    
+    id_sesion = uuid.uuid4().hex
+    sesion = SesionExpresion(evaluador_matematico, LIMITES_EXPRESION)
+    sesiones_expresion[id_sesion] = sesion
+    return {"id_sesion": id_sesion, **sesion.obtener_estado()}
+
+@router.post("/sesiones/{id_sesion}/tokens")
+async def agregar_token_sesion(id_sesion: str, datos: TokenSesion):
+    """Agrega un token a la sesión; se rechaza de inmediato si no es válido en esa posición."""
+    sesion = obtener_sesion(id_sesion)
+    try:
+        estado = sesion.agregar_token(datos.token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"id_sesion": id_sesion, **estado}
+
+@router.delete("/sesiones/{id_sesion}/tokens")
+async def deshacer_token_sesion(id_sesion: str):
+    """Deshace el último token de la sesión."""
+    sesion = obtener_sesion(id_sesion)
+    try:
+        estado = sesion.deshacer()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"id_sesion": id_sesion, **estado}
+
+@router.get("/sesiones/{id_sesion}")
+async def obtener_resultado_sesion(id_sesion: str, pasos: Optional[Literal["none", "summary", "full"]] = None):
+    """Devuelve el estado de la sesión; con 'pasos' también evalúa la expresión completa."""
+    sesion = obtener_sesion(id_sesion)
+    sesion.ultimo_uso = time.time()
+    respuesta = {"id_sesion": id_sesion, **sesion.obtener_estado()}
+    if pasos is not None and respuesta["valida"]:
+        respuesta["evaluacion"] = evaluador_matematico.evaluar(sesion.simbolos, pasos)
+    return respuesta
+
+@router.delete("/sesiones/{id_sesion}")
+async def eliminar_sesion_expresion(id_sesion: str):
+    """Cierra una sesión de expresión."""
+    obtener_sesion(id_sesion)
+    del sesiones_expresion[id_sesion]
+    return {"mensaje": f"Sesión '{id_sesion}' eliminada", "id_sesion": id_sesion}
+
 @router.delete("/datos/{operacion}")
 async def eliminar_datos_operacion(operacion: str):
     if operacion not in CLASES_DISPONIBLES['operaciones']:
         raise HTTPException(status_code=400, detail=f"Operación '{operacion}' no válida")
     
-    ruta_archivo = obtener_ruta_datos(operacion)
-    
     try:
-        if os.path.exists(ruta_archivo):
-            os.remove(ruta_archivo)
+        if await monitor_salud.ejecutar_en_hilo(almacen_muestras.eliminar, operacion):
+            agregador_estadisticas.registrar_eliminacion_datos(operacion)
+            filtro_duplicados.olvidar(operacion)
             mensaje = f"Datos de la operación '{operacion}' eliminados exitosamente"
         else:
             mensaje = f"No había datos para la operación '{operacion}'"
@@ -330,6 +416,48 @@ async def eliminar_datos_operacion(operacion: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error eliminando datos: {str(e)}")
 
+@router.get("/muestras/{operacion}")
+async def listar_muestras_operacion(operacion: str, offset: int = 0, limit: Optional[int] = None):
+    """Página de muestras guardadas de la operación, con sus ids."""
+    
+    if operacion not in CLASES_DISPONIBLES['operaciones']:
+        raise HTTPException(status_code=400, detail=f"Operación '{operacion}' no válida")
+    
+    try:
+        limite = validar_paginacion(offset, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    pagina = await monitor_salud.ejecutar_en_hilo(almacen_muestras.pagina, operacion, offset, limite)
+    return {
+        "operacion": operacion,
+        "categoria": "operaciones",
+        "offset": offset,
+        "limit": limite,
+        **pagina
+    }
+
+@router.delete("/muestras/{operacion}/{id_muestra}")
+async def eliminar_muestra_operacion(operacion: str, id_muestra: int):
+    """Elimina una muestra de la operación por id, sin borrar el resto."""
+    
+    if operacion not in CLASES_DISPONIBLES['operaciones']:
+        raise HTTPException(status_code=400, detail=f"Operación '{operacion}' no válida")
+    
+    total = await almacen_muestras.eliminar_muestra(operacion, id_muestra)
+    if total is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No existe la muestra {id_muestra} de la operación '{operacion}'"
+        )
+    return {
+        "mensaje": f"Muestra {id_muestra} de la operación '{operacion}' eliminada",
+        "operacion": operacion,
+        "categoria": "operaciones",
+        "id": id_muestra,
+        "total_muestras": total
+    }
+
 @router.delete("/modelo/{operacion}")
 async def eliminar_modelo_operacion(operacion: str):
     if operacion not in CLASES_DISPONIBLES['operaciones']:
@@ -0,0 +1,197 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel
+from typing import Literal, Optional
+
+from config import CLASES_DISPONIBLES
+from perfilado import gestor_perfilado
+from memoria import inspector_memoria
+from persistencia_muestras import persistencia_muestras, obtener_persistencia, migrar
+from estadisticas import agregador_estadisticas
+from filtro_duplicados import filtro_duplicados
+from salud import monitor_salud
+from respuestas import RutaRapida
+
+# Crear el router para herramientas de diagnóstico
+router = APIRouter(prefix="/api/admin", tags=["admin"], route_class=RutaRapida)
+
+# --- Modelos de datos ---
+class SolicitudCaptura(BaseModel):
+    ruta: str                                           # Plantilla o ruta exacta, p.ej. "/api/vocales/prediccion/{vocal}"
+    peticiones: int = 10
+    modo: Literal["cprofile", "muestreo"] = "cprofile"
+
+# Agrupación de las estadísticas de tracemalloc
+AgrupacionMemoria = Literal["lineno", "filename", "traceback"]
+
+# --- Funciones auxiliares ---
+def obtener_captura(id_captura: str):
+    """Obtiene una captura de perfil o responde 404."""
+    captura = gestor_perfilado.capturas.get(id_captura)
+    if captura is None:
+        raise HTTPException(status_code=404, detail=f"Captura '{id_captura}' no encontrada")
+    return captura
+
+def obtener_snapshot(funcion, *args):
+    """Ejecuta una consulta sobre snapshots traduciendo los ids desconocidos a 404."""
+    try:
+        return funcion(*args)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Snapshot {e} no encontrado")
+
+async def copiar_muestras(origen: str, destino: str, categoria: Optional[str]):
+    """Copia las muestras entre backends en un hilo y recarga las estadísticas."""
+    if categoria is not None and categoria not in CLASES_DISPONIBLES:
+        raise HTTPException(status_code=400, detail=f"Categoría '{categoria}' no válida")
+    copiadas = await monitor_salud.ejecutar_en_hilo(
+        migrar, obtener_persistencia(origen), obtener_persistencia(destino), categoria
+    )
+    agregador_estadisticas.recargar()
+    return {
+        "origen": origen,
+        "destino": destino,
+        "backend_activo": persistencia_muestras.nombre,
+        "clases": copiadas,
+        "total_muestras": sum(copiadas.values())
+    }
+
+# --- Endpoints ---
+@router.get("/server-timing")
+async def obtener_server_timing():
+    """Indica si se envía el encabezado Server-Timing."""
+    return {"activo": gestor_perfilado.server_timing}
+
+@router.put("/server-timing")
+async def cambiar_server_timing(activo: bool):
+    """Activa o desactiva el encabezado Server-Timing con los tiempos por etapa."""
+    gestor_perfilado.server_timing = activo
+    return {"activo": gestor_perfilado.server_timing}
+
+@router.post("/perfilado")
+async def crear_captura_perfil(datos: SolicitudCaptura):
+    """Perfila las próximas N peticiones que coincidan con la ruta."""
+    if not datos.ruta.startswith("/"):
+        raise HTTPException(status_code=400, detail="La ruta debe empezar por '/'")
+    try:
+        captura = gestor_perfilado.crear_captura(datos.ruta, datos.peticiones, datos.modo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return captura.resumen()
+
+@router.get("/perfilado")
+async def listar_capturas_perfil():
+    """Lista las capturas de perfil y su avance."""
+    return {"capturas": [captura.resumen() for captura in gestor_perfilado.capturas.values()]}
+
+@router.get("/perfilado/{id_captura}")
+async def obtener_captura_perfil(id_captura: str, formato: Optional[Literal["pstats", "texto", "colapsado"]] = None):
+    """
+    Devuelve el resultado de una captura.
+
+    - pstats: volcado binario para pstats.Stats, snakeviz, etc. (modo cprofile)
+    - texto: funciones con mayor tiempo acumulado (modo cprofile)
+    - colapsado: pilas colapsadas para flamegraph.pl o speedscope (modo muestreo)
+    """
+    captura = obtener_captura(id_captura)
+    if formato is None:
+        formato = "texto" if captura.modo == "cprofile" else "colapsado"
+
+    if captura.en_curso:
+        raise HTTPException(status_code=409, detail="La captura tiene una petición en curso; inténtalo de nuevo")
+    if captura.completadas == 0:
+        raise HTTPException(status_code=409, detail="Todavía no se ha perfilado ninguna petición")
+
+    if captura.modo == "cprofile" and formato == "pstats":
+        return Response(
+            content=captura.exportar_pstats(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="perfil_{captura.id}.pstats"'}
+        )
+    if captura.modo == "cprofile" and formato == "texto":
+        return PlainTextResponse(captura.exportar_texto())
+    if captura.modo == "muestreo" and formato == "colapsado":
+        return PlainTextResponse(captura.exportar_colapsado())
+
+    raise HTTPException(status_code=400, detail=f"El formato '{formato}' no está disponible en modo '{captura.modo}'")
+
+@router.delete("/perfilado/{id_captura}")
+async def eliminar_captura_perfil(id_captura: str):
+    """Elimina una captura (si está activa, deja de perfilar)."""
+    captura = obtener_captura(id_captura)
+    if captura.en_curso:
+        raise HTTPException(status_code=409, detail="La captura tiene una petición en curso; inténtalo de nuevo")
+    del gestor_perfilado.capturas[id_captura]
+    return {"mensaje": f"Captura '{id_captura}' eliminada", "id": id_captura}
+
+@router.get("/memoria")
+async def obtener_memoria():
+    """Memoria estimada de colas, cachés, sesiones y modelos, RSS del proceso y tareas asyncio vivas."""
+    return inspector_memoria.contabilizar()
+
+@router.put("/memoria/tracemalloc")
+async def cambiar_tracemalloc(activo: bool, frames: Optional[int] = None):
+    """Activa o desactiva tracemalloc (frames = profundidad de las trazas)."""
+    if frames is not None and not 1 <= frames <= 100:
+        raise HTTPException(status_code=400, detail="frames debe estar entre 1 y 100")
+    return inspector_memoria.cambiar_tracemalloc(activo, frames)
+
+@router.post("/memoria/snapshots")
+async def tomar_snapshot_memoria(limite: int = 20, agrupar: AgrupacionMemoria = "lineno"):
+    """Toma un snapshot de tracemalloc y devuelve los sitios que más memoria retienen."""
+    try:
+        id_snapshot = inspector_memoria.tomar_snapshot()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "id": id_snapshot,
+        "principales": inspector_memoria.principales_asignaciones(id_snapshot, agrupar, limite)
+    }
+
+@router.get("/memoria/snapshots")
+async def listar_snapshots_memoria():
+    """Lista los snapshots retenidos."""
+    return {"snapshots": inspector_memoria.listar_snapshots(), "tracemalloc": inspector_memoria.estado_tracemalloc()}
+
+@router.get("/memoria/snapshots/{id_snapshot}")
+async def obtener_snapshot_memoria(id_snapshot: str, limite: int = 20, agrupar: AgrupacionMemoria = "lineno"):
+    """Sitios de asignación que más memoria retienen en un snapshot."""
+    principales = obtener_snapshot(inspector_memoria.principales_asignaciones, id_snapshot, agrupar, limite)
+    return {"id": id_snapshot, "principales": principales}
+
+@router.get("/memoria/snapshots/{id_snapshot}/diferencia/{id_base}")
+async def comparar_snapshots_memoria(id_snapshot: str, id_base: str, limite: int = 20,
+                                     agrupar: AgrupacionMemoria = "lineno"):
+    """Sitios cuya memoria más creció (o decreció) desde el snapshot base."""
+    diferencias = obtener_snapshot(inspector_memoria.comparar_snapshots, id_snapshot, id_base, agrupar, limite)
+    return {"id": id_snapshot, "base": id_base, "diferencias": diferencias}
+
+@router.delete("/memoria/snapshots/{id_snapshot}")
+async def eliminar_snapshot_memoria(id_snapshot: str):
+    """Elimina un snapshot."""
+    if not inspector_memoria.eliminar_snapshot(id_snapshot):
+        raise HTTPException(status_code=404, detail=f"Snapshot '{id_snapshot}' no encontrado")
+    return {"mensaje": f"Snapshot '{id_snapshot}' eliminado", "id": id_snapshot}
+
+@router.get("/almacen")
+async def obtener_almacen():
+    """Backend de persistencia de muestras activo y muestras guardadas por clase."""
+    muestras = await monitor_salud.ejecutar_en_hilo(
+        lambda: {clase: persistencia_muestras.contar(clase)
+                 for clases in CLASES_DISPONIBLES.values() for clase in clases}
+    )
+    return {"backend": persistencia_muestras.nombre, "muestras": muestras, "total_muestras": sum(muestras.values())}
+
+@router.post("/almacen/importar-json")
+async def importar_muestras_json(categoria: Optional[str] = None):
+    """Copia las muestras de los archivos JSON a SQLite (las clases importadas se reemplazan)."""
+    return await copiar_muestras("json", "sqlite", categoria)
+
+@router.post("/almacen/exportar-json")
+async def exportar_muestras_json(categoria: Optional[str] = None):
+    """Escribe las muestras de SQLite en el formato de archivos JSON (las clases exportadas se reemplazan)."""
+    return await copiar_muestras("sqlite", "json", categoria)
+
+@router.get("/filtro-duplicados")
+async def obtener_filtro_duplicados():
+    """Frames aceptados y suprimidos por el filtro de casi duplicados (en este worker)."""
+    return filtro_duplicados.resumen()
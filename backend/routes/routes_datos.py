@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+import tempfile
+
+from config import CLASES_DISPONIBLES, INTERCAMBIO_CONFIG
+from intercambio_datos import ImportadorMuestras, exportar_ndjson, exportar_zip
+from salud import monitor_salud
+from respuestas import RutaRapida
+
+# Crear el router para exportar e importar conjuntos de datos
+router = APIRouter(prefix="/api/datos", tags=["datos"], route_class=RutaRapida)
+
+FormatoDatos = Literal["ndjson", "zip"]
+TIPOS_ZIP = ("application/zip", "application/x-zip-compressed")
+
+# --- Funciones auxiliares ---
+def validar_categoria(categoria: Optional[str]):
+    if categoria is not None and categoria not in CLASES_DISPONIBLES:
+        raise HTTPException(status_code=400, detail=f"Categoría '{categoria}' no válida")
+
+async def importar_ndjson(request: Request, importador: ImportadorMuestras):
+    """Procesa el cuerpo línea a línea a medida que llega."""
+    resto = b""
+    async for trozo in request.stream():
+        resto += trozo
+        lineas = resto.split(b"\n")
+        resto = lineas.pop()
+        if len(resto) > INTERCAMBIO_CONFIG['max_bytes_linea']:
+            raise HTTPException(status_code=413, detail="Línea NDJSON demasiado larga")
+        if lineas:
+            await monitor_salud.ejecutar_en_hilo(importador.agregar_lineas, lineas)
+    if resto.strip():
+        await monitor_salud.ejecutar_en_hilo(importador.agregar_lineas, [resto])
+
+async def importar_zip(request: Request, importador: ImportadorMuestras):
+    """Vuelca el cuerpo a un temporal (en memoria si es pequeño) y lo procesa shard a shard."""
+    with tempfile.SpooledTemporaryFile(max_size=INTERCAMBIO_CONFIG['zip_en_memoria_bytes']) as archivo:
+        recibidos = 0
+        async for trozo in request.stream():
+            recibidos += len(trozo)
+            if recibidos > INTERCAMBIO_CONFIG['max_bytes_zip']:
+                raise HTTPException(status_code=413, detail="Archivo zip demasiado grande")
+            archivo.write(trozo)
+        archivo.seek(0)
+        try:
+            await monitor_salud.ejecutar_en_hilo(importador.agregar_zip, archivo)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+# --- Endpoints ---
+@router.get("/export")
+async def exportar_datos(categoria: Optional[str] = None, formato: FormatoDatos = "ndjson"):
+    """Descarga las muestras de una categoría (o de todas) como NDJSON o zip de shards, por trozos."""
+    validar_categoria(categoria)
+    nombre = f"muestras_{categoria or 'todas'}.{formato}"
+    if formato == "zip":
+        contenido, tipo = exportar_zip(categoria), "application/zip"
+    else:
+        contenido, tipo = exportar_ndjson(categoria), "application/x-ndjson"
+    return StreamingResponse(
+        contenido, media_type=tipo, headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+@router.post("/import")
+async def importar_datos(request: Request, categoria: Optional[str] = None, formato: Optional[FormatoDatos] = None):
+    """
+    Importa muestras en NDJSON o zip (formato de /export; por defecto según Content-Type).
+    Respeta el tope de muestras por clase y omite los timestamps que ya existen.
+    """
+    validar_categoria(categoria)
+    if formato is None:
+        tipo = request.headers.get("content-type", "").split(";")[0].strip()
+        formato = "zip" if tipo in TIPOS_ZIP else "ndjson"
+
+    importador = ImportadorMuestras(categoria)
+    if formato == "zip":
+        await importar_zip(request, importador)
+    else:
+        await importar_ndjson(request, importador)
+    resultado = await monitor_salud.ejecutar_en_hilo(importador.terminar)
+
+    return {
+        "mensaje": f"Importación completada: {resultado['importadas']} muestras nuevas",
+        "formato": formato,
+        "categoria": categoria,
+        **resultado
+    }
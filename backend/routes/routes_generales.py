@@ -1,60 +1,46 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any
-import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from typing import Dict, Any, Optional
+import asyncio
+import json
 
 from config import (
     CLASES_DISPONIBLES, TODAS_LAS_CLASES, CLASE_A_CATEGORIA, DATOS_CONFIG,
-    obtener_ruta_datos, obtener_ruta_modelo, MAPEO_OPS  # 👈 importamos el mapa
+    MAPEO_OPS,  # 👈 importamos el mapa
+    PROGRESO_STREAM_CONFIG
 )
+from estadisticas import agregador_estadisticas
+from cache_http import respuesta_condicional, generar_etag, RespuestaEstatica
+from respuestas import RutaRapida, RespuestaJSONRapida
+from salud import monitor_salud
+from metricas import registro_metricas
 
 # Crear el router para rutas generales
-router = APIRouter(prefix="/api", tags=["general"])
+router = APIRouter(prefix="/api", tags=["general"], route_class=RutaRapida)
+
+# Router sin prefijo para /metrics (ruta estándar de Prometheus)
+router_metricas = APIRouter(tags=["metricas"])
 
 # --- Funciones auxiliares ---
 def obtener_estadisticas_clase_general(clase: str):
-    """Obtiene estadísticas de cualquier clase (vocal u operación)."""
-    ruta_archivo = obtener_ruta_datos(clase)
-    
-    if not os.path.exists(ruta_archivo):
-        return {
-            'total_muestras': 0,
-            'tiene_modelo': False,
-            'puede_entrenar': False,
-            'recoleccion_completa': False,
-            'progreso_porcentaje': 0.0,
-            'muestras_restantes': DATOS_CONFIG['samples_recomendados'],
-            'cantidad_recomendada': DATOS_CONFIG['samples_recomendados']
-        }
-    
-    try:
-        import json
-        with open(ruta_archivo, 'r') as f:
-            datos = json.load(f)
-        total_muestras = len(datos)
-    except:
-        total_muestras = 0
-    
-    # Verificar si existe modelo entrenado
-    ruta_modelo = obtener_ruta_modelo(clase)
-    tiene_modelo = os.path.exists(ruta_modelo)
-    
-    # Verificar si puede entrenar
-    puede_entrenar = total_muestras >= DATOS_CONFIG['samples_minimos']
-    
-    # Calcular progreso hacia las 100 muestras
-    recoleccion_completa = total_muestras >= DATOS_CONFIG['samples_recomendados']
-    progreso_porcentaje = round((total_muestras / DATOS_CONFIG['samples_recomendados']) * 100, 1)
-    muestras_restantes = max(0, DATOS_CONFIG['samples_recomendados'] - total_muestras)
-    
-    return {
-        'total_muestras': total_muestras,
-        'tiene_modelo': tiene_modelo,
-        'puede_entrenar': puede_entrenar,
-        'recoleccion_completa': recoleccion_completa,
-        'progreso_porcentaje': progreso_porcentaje,
-        'muestras_restantes': muestras_restantes,
-        'cantidad_recomendada': DATOS_CONFIG['samples_recomendados']
-    }
+    """Obtiene estadísticas de cualquier clase (vocal, número u operación)."""
+    return agregador_estadisticas.obtener_clase(clase)
+
+# Campos de progreso que se envían por el stream
+CAMPOS_PROGRESO = ('total_muestras', 'progreso_porcentaje', 'recoleccion_completa')
+
+def extraer_progreso(estadisticas: Dict) -> Dict:
+    """Extrae de las estadísticas de una clase solo los campos de progreso."""
+    return {campo: estadisticas[campo] for campo in CAMPOS_PROGRESO}
+
+def formatear_evento_sse(evento: str, datos: Dict, id_evento: Optional[int] = None) -> str:
+    """Formatea un mensaje Server-Sent Events."""
+    lineas = []
+    if id_evento is not None:
+        lineas.append(f"id: {id_evento}")
+    lineas.append(f"event: {evento}")
+    lineas.append(f"data: {json.dumps(datos)}")
+    return "\n".join(lineas) + "\n\n"
 
 # --- Endpoints generales ---
 
@@ -67,104 +53,124 @@ async def info_api():
         "descripcion": "API para recolección de datos y entrenamiento de modelos con MediaPipe",
         "endpoints": {
             "vocales": "/api/vocales/",
+            "numeros": "/api/numeros/",
             "operaciones": "/api/operaciones/",
             "estadisticas": "/api/estadisticas",
-            "configuracion": "/api/configuracion"
+            "configuracion": "/api/configuracion",
+            "datos": "/api/datos/export"
         }
     }
 
 @router.get("/estadisticas")
-async def obtener_estadisticas_globales():
-    """Obtiene estadísticas globales de todo el sistema."""
-    
-    # Estadísticas de vocales
-    estadisticas_vocales = {}
-    vocales_completas = 0
-    total_muestras_vocales = 0
-    
-    for vocal in CLASES_DISPONIBLES['vocales']:
-        stats = obtener_estadisticas_clase_general(vocal)
-        estadisticas_vocales[vocal] = stats
-        if stats['recoleccion_completa']:
-            vocales_completas += 1
-        total_muestras_vocales += stats['total_muestras']
-    
-    # Estadísticas de operaciones
-    estadisticas_operaciones = {}
-    operaciones_completas = 0
-    total_muestras_operaciones = 0
-    
-    for operacion in CLASES_DISPONIBLES['operaciones']:
-        stats = obtener_estadisticas_clase_general(operacion)
-        estadisticas_operaciones[operacion] = stats
-        if stats['recoleccion_completa']:
-            operaciones_completas += 1
-        total_muestras_operaciones += stats['total_muestras']
-    
-    # Calcular progresos generales
-    progreso_vocales = round((vocales_completas / len(CLASES_DISPONIBLES['vocales'])) * 100, 1)
-    progreso_operaciones = round((operaciones_completas / len(CLASES_DISPONIBLES['operaciones'])) * 100, 1)
-    
-    # Progreso total del sistema
-    total_clases = len(CLASES_DISPONIBLES['vocales']) + len(CLASES_DISPONIBLES['operaciones'])
-    clases_completas = vocales_completas + operaciones_completas
-    progreso_total = round((clases_completas / total_clases) * 100, 1)
+async def obtener_estadisticas_globales(request: Request, recargar: bool = False):
+    """
+    Obtiene estadísticas globales de todo el sistema.
+    
+    Sirve el snapshot precalculado por el agregador; con recargar=true se
+    vuelve a leer todo desde disco (por ejemplo, si se copiaron datos a mano).
+    """
+    if recargar:
+        agregador_estadisticas.recargar()
+    return respuesta_condicional(
+        request,
+        generar_etag("global", agregador_estadisticas.version),
+        agregador_estadisticas.obtener_global,
+        agregador_estadisticas.ultima_modificacion
+    )
+
+@router.get("/progreso/stream")
+async def stream_progreso(request: Request, categoria: Optional[str] = None):
+    """
+    Stream Server-Sent Events con el progreso de recolección por clase.
+    
+    Al conectar se envía el estado actual ('snapshot') y después solo los cambios
+    ('progreso') de las clases cuyo progreso varió. Cada evento lleva como id la
+    versión de las estadísticas: si el cliente reconecta con Last-Event-ID igual a
+    la versión actual no se reenvía el snapshot. Se envía un comentario de
+    heartbeat periódico para mantener viva la conexión.
+    """
+    if categoria is not None and categoria not in CLASES_DISPONIBLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Categoría '{categoria}' no válida. Categorías disponibles: {list(CLASES_DISPONIBLES)}"
+        )
     
-    return {
-        "resumen_global": {
-            "total_clases": total_clases,
-            "clases_completas": clases_completas,
-            "progreso_total": f"{progreso_total}%",
-            "total_muestras": total_muestras_vocales + total_muestras_operaciones,
-            "objetivo_total_muestras": total_clases * DATOS_CONFIG['samples_recomendados']
-        },
-        "vocales": {
-            "estadisticas": estadisticas_vocales,
-            "resumen": {
-                "total_vocales": len(CLASES_DISPONIBLES['vocales']),
-                "vocales_completas": vocales_completas,
-                "progreso": f"{progreso_vocales}%",
-                "total_muestras": total_muestras_vocales,
-                "objetivo_muestras": len(CLASES_DISPONIBLES['vocales']) * DATOS_CONFIG['samples_recomendados']
-            }
-        },
-        "operaciones": {
-            "estadisticas": estadisticas_operaciones,
-            "resumen": {
-                "total_operaciones": len(CLASES_DISPONIBLES['operaciones']),
-                "operaciones_completas": operaciones_completas,
-                "progreso": f"{progreso_operaciones}%",
-                "total_muestras": total_muestras_operaciones,
-                "objetivo_muestras": len(CLASES_DISPONIBLES['operaciones']) * DATOS_CONFIG['samples_recomendados']
-            }
-        },
-        "configuracion": DATOS_CONFIG
-    }
+    clases = CLASES_DISPONIBLES[categoria] if categoria else TODAS_LAS_CLASES
+    ultimo_id = request.headers.get("last-event-id")
+    cola = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    
+    def al_cambiar(version: int, clase: str, estadisticas: Dict):
+        if clase in clases:
+            loop.call_soon_threadsafe(cola.put_nowait, (version, clase, extraer_progreso(estadisticas)))
+    
+    async def generar_eventos():
+        agregador_estadisticas.suscribir(al_cambiar)
+        try:
+            yield f"retry: {PROGRESO_STREAM_CONFIG['reintento_ms']}\n\n"
+            
+            enviados = {clase: extraer_progreso(agregador_estadisticas.obtener_clase(clase)) for clase in clases}
+            version = agregador_estadisticas.version
+            if ultimo_id != str(version):
+                yield formatear_evento_sse("snapshot", {"categoria": categoria, "clases": enviados}, version)
+            
+            while True:
+                try:
+                    version, clase, progreso = await asyncio.wait_for(
+                        cola.get(), timeout=PROGRESO_STREAM_CONFIG['heartbeat_segundos']
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                
+                if enviados.get(clase) == progreso:
+                    continue
+                enviados[clase] = progreso
+                yield formatear_evento_sse(
+                    "progreso",
+                    {"clase": clase, "categoria": CLASE_A_CATEGORIA[clase], **progreso},
+                    version
+                )
+        finally:
+            agregador_estadisticas.desuscribir(al_cambiar)
+    
+    return StreamingResponse(
+        generar_eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Respuestas derivadas de la configuración: no cambian mientras vive el proceso
+respuesta_configuracion = RespuestaEstatica({
+    "configuracion": DATOS_CONFIG,
+    "clases_disponibles": CLASES_DISPONIBLES,
+    "todas_las_clases": TODAS_LAS_CLASES,
+    "mapeo_categorias": CLASE_A_CATEGORIA,
+    "mapeo_operaciones": MAPEO_OPS  # 👈 añadimos el mapa aquí
+})
+
+respuesta_clases = RespuestaEstatica({
+    "clases_por_categoria": CLASES_DISPONIBLES,
+    "todas_las_clases": TODAS_LAS_CLASES,
+    "total_clases": len(TODAS_LAS_CLASES),
+    "mapeo_categorias": CLASE_A_CATEGORIA
+})
 
 @router.get("/configuracion")
-async def obtener_configuracion():
+async def obtener_configuracion(request: Request):
     """Obtiene la configuración actual del sistema."""
-    return {
-        "configuracion": DATOS_CONFIG,
-        "clases_disponibles": CLASES_DISPONIBLES,
-        "todas_las_clases": TODAS_LAS_CLASES,
-        "mapeo_categorias": CLASE_A_CATEGORIA,
-        "mapeo_operaciones": MAPEO_OPS  # 👈 añadimos el mapa aquí
-    }
+    return respuesta_configuracion.responder(request)
 
 @router.get("/clases")
-async def listar_todas_las_clases():
+async def listar_todas_las_clases(request: Request):
     """Lista todas las clases disponibles organizadas por categoría."""
-    return {
-        "clases_por_categoria": CLASES_DISPONIBLES,
-        "todas_las_clases": TODAS_LAS_CLASES,
-        "total_clases": len(TODAS_LAS_CLASES),
-        "mapeo_categorias": CLASE_A_CATEGORIA
-    }
+    return respuesta_clases.responder(request)
 
 @router.get("/estadisticas/{clase}")
-async def obtener_estadisticas_clase(clase: str):
-    """Obtiene estadísticas de una clase específica (vocal u operación)."""
+async def obtener_estadisticas_clase(clase: str, request: Request):
+    """Obtiene estadísticas de una clase específica (vocal, número u operación)."""
     
     if clase not in TODAS_LAS_CLASES:
         raise HTTPException(
@@ -172,51 +178,43 @@ async def obtener_estadisticas_clase(clase: str):
             detail=f"Clase '{clase}' no válida. Clases disponibles: {TODAS_LAS_CLASES}"
         )
     
-    estadisticas = obtener_estadisticas_clase_general(clase)
-    categoria = CLASE_A_CATEGORIA.get(clase, "desconocida")
-    
-    estadisticas['clase'] = clase
-    estadisticas['categoria'] = categoria
-    
-    return estadisticas
+    def construir():
+        estadisticas = obtener_estadisticas_clase_general(clase)
+        estadisticas['clase'] = clase
+        estadisticas['categoria'] = CLASE_A_CATEGORIA.get(clase, "desconocida")
+        return estadisticas
+    
+    return respuesta_condicional(
+        request,
+        generar_etag(f"clase-{clase}", agregador_estadisticas.version),
+        construir,
+        agregador_estadisticas.ultima_modificacion
+    )
 
 @router.get("/salud")
 async def verificar_salud():
-    """Endpoint de verificación de salud del sistema."""
-    
-    # Verificar que los directorios necesarios existan
-    directorios_necesarios = [
-        "datos",
-        "modelos",
-        "encoders"
-    ]
-    
-    estado_directorios = {}
-    for directorio in directorios_necesarios:
-        existe = os.path.exists(directorio)
-        estado_directorios[directorio] = {
-            "existe": existe,
-            "ruta": os.path.abspath(directorio)
-        }
-    
-    # Contar archivos de datos y modelos
-    total_archivos_datos = 0
-    total_modelos = 0
-    
-    for clase in TODAS_LAS_CLASES:
-        if os.path.exists(obtener_ruta_datos(clase)):
-            total_archivos_datos += 1
-        if os.path.exists(obtener_ruta_modelo(clase)):
-            total_modelos += 1
-    
-    return {
-        "estado": "saludable",
-        "timestamp": "2024-01-01T00:00:00",  # Se actualizaría con datetime real
-        "directorios": estado_directorios,
-        "archivos": {
-            "total_archivos_datos": total_archivos_datos,
-            "total_modelos": total_modelos,
-            "total_clases": len(TODAS_LAS_CLASES)
-        },
-        "configuracion_activa": DATOS_CONFIG
-    }
+    """Liveness: el proceso responde y su event loop avanza."""
+    monitor_salud.iniciar()
+    return monitor_salud.vivo()
+
+@router.get("/salud/lista")
+async def verificar_disponibilidad():
+    """
+    Readiness: estado de colas, guardados, modelos cargados, executor y event loop.
+
+    Solo lee contadores en memoria, así que se puede consultar cada segundo.
+    Responde 503 si algún subsistema no está en condiciones de atender.
+    """
+    monitor_salud.iniciar()
+    estado = monitor_salud.listo()
+    estado["clases_con_modelo"] = sum(1 for clase in TODAS_LAS_CLASES if agregador_estadisticas.tiene_modelo(clase))
+    estado["total_clases"] = len(TODAS_LAS_CLASES)
+    return RespuestaJSONRapida(estado, status_code=200 if estado["listo"] else 503)
+
+@router_metricas.get("/metrics", response_class=PlainTextResponse)
+async def exportar_metricas():
+    """Métricas del proceso en formato de texto de Prometheus."""
+    return PlainTextResponse(
+        registro_metricas.exportar(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
-import json
 import os
 from datetime import datetime
 
 from config import (
     CLASES_DISPONIBLES, DATOS_CONFIG,
-    obtener_ruta_datos, obtener_ruta_modelo, validar_clase
+    obtener_ruta_modelo, validar_clase
 )
 from models import entrenar_modelo_clase, predecir_clase, eliminar_modelo_clase
-from utils import validar_puntos_clave
+from utils import validar_puntos_clave, validar_paginacion
+from estadisticas import agregador_estadisticas, calcular_estadisticas_clase
+from cache_http import respuesta_condicional, generar_etag
+from respuestas import RutaRapida
+from salud import monitor_salud
+from almacen_muestras import almacen_muestras
+from filtro_duplicados import filtro_duplicados
+from memoria import inspector_memoria
 
 # Crear el router para vocales
-router = APIRouter(prefix="/api/vocales", tags=["vocales"])
+router = APIRouter(prefix="/api/vocales", tags=["vocales"], route_class=RutaRapida)
 
 # --- Modelos de datos ---
 class DatosMuestra(BaseModel):
@@ -26,6 +32,8 @@ class SolicitudPrediccion(BaseModel):
 # --- Variables globales ---
 cola_muestras_vocales = {}  # {clase: []}
 esta_guardando_vocales = {}  # {clase: bool}
+monitor_salud.registrar_colas("vocales", cola_muestras_vocales, esta_guardando_vocales)
+inspector_memoria.registrar_estructura("cola_muestras_vocales", cola_muestras_vocales)
 
 # --- Funciones auxiliares ---
 def inicializar_cola_vocal(clase: str):
@@ -34,75 +42,43 @@ def inicializar_cola_vocal(clase: str):
         cola_muestras_vocales[clase] = []
         esta_guardando_vocales[clase] = False
 
+@monitor_salud.medir_guardado("vocales")
 async def guardar_muestras_vocal(clase: str):
-    """Guarda las muestras en disco."""
-    if not cola_muestras_vocales[clase]:
+    """Guarda las muestras en disco (bajo el bloqueo compartido entre workers)."""
+    cola = cola_muestras_vocales[clase]
+    if not cola:
         return
-    
-    ruta_archivo = obtener_ruta_datos(clase)
-    os.makedirs(os.path.dirname(ruta_archivo), exist_ok=True)
-    
-    datos_existentes = []
-    if os.path.exists(ruta_archivo):
-        try:
-            with open(ruta_archivo, 'r') as f:
-                datos_existentes = json.load(f)
-        except:
-            datos_existentes = []
-    
-    datos_existentes.extend(cola_muestras_vocales[clase])
-    
-    ruta_temporal = ruta_archivo + ".tmp"
-    with open(ruta_temporal, 'w') as f:
-        json.dump(datos_existentes, f, indent=2)
-    
-    os.replace(ruta_temporal, ruta_archivo)
 
-    cola_muestras_vocales[clase].clear()
+    # Se sacan de la cola antes de escribir: lo que llegue mientras tanto espera al siguiente guardado
+    lote = cola[:]
+    del cola[:len(lote)]
+    try:
+        await almacen_muestras.guardar("vocales", clase, lote)
+    except Exception:
+        cola[:0] = lote
+        raise
 
 def obtener_estadisticas_vocal(clase: str):
     """Obtiene estadísticas de una vocal (incluyendo muestras en cola)."""
-    ruta_archivo = obtener_ruta_datos(clase)
-
-    if not os.path.exists(ruta_archivo):
-        total_muestras = 0
-    else:
-        try:
-            with open(ruta_archivo, 'r') as f:
-                datos = json.load(f)
-            total_muestras = len(datos)
-        except:
-            total_muestras = 0
-
-    # 👇 Sumar también las que están en la cola
-    en_cola = len(cola_muestras_vocales.get(clase, []))
-    total_muestras += en_cola
+    # 👇 Sumar también las que están en la cola (o escribiéndose)
+    en_cola = len(cola_muestras_vocales.get(clase, [])) + almacen_muestras.en_vuelo(clase)
+    total_muestras = agregador_estadisticas.total_muestras(clase) + en_cola
 
-    ruta_modelo = obtener_ruta_modelo(clase)
-    tiene_modelo = os.path.exists(ruta_modelo)
+    return calcular_estadisticas_clase(total_muestras, agregador_estadisticas.tiene_modelo(clase))
 
-    puede_entrenar = total_muestras >= DATOS_CONFIG['samples_minimos']
-    recoleccion_completa = total_muestras >= DATOS_CONFIG['samples_recomendados']
-    progreso_porcentaje = round((total_muestras / DATOS_CONFIG['samples_recomendados']) * 100, 1)
-    muestras_restantes = max(0, DATOS_CONFIG['samples_recomendados'] - total_muestras)
-
-    return {
-        'total_muestras': total_muestras,
-        'tiene_modelo': tiene_modelo,
-        'puede_entrenar': puede_entrenar,
-        'recoleccion_completa': recoleccion_completa,
-        'progreso_porcentaje': progreso_porcentaje,
-        'muestras_restantes': muestras_restantes,
-        'cantidad_recomendada': DATOS_CONFIG['samples_recomendados']
-    }
+def version_estadisticas_vocales() -> str:
+    """Versión de las estadísticas de vocales; incluye las muestras en cola, que también se cuentan."""
+    en_cola = sum(len(cola) + almacen_muestras.en_vuelo(clase) for clase, cola in cola_muestras_vocales.items())
+    return f"{agregador_estadisticas.version}.{en_cola}"
 
 # --- Endpoints ---
 @router.post("/recolectar/{vocal}")
-async def recolectar_muestra_vocal(vocal: str, datos: DatosMuestra, tareas_fondo: BackgroundTasks):
+async def recolectar_muestra_vocal(vocal: str, datos: DatosMuestra):
     """Recolecta una muestra para una vocal."""
     if vocal not in CLASES_DISPONIBLES['vocales']:
         raise HTTPException(status_code=400, detail=f"Vocal '{vocal}' no válida.")
 
+    almacen_muestras.sincronizar(vocal)
     estadisticas_actuales = obtener_estadisticas_vocal(vocal)
     if estadisticas_actuales['total_muestras'] >= DATOS_CONFIG['samples_recomendados']:
         return {
@@ -118,6 +94,17 @@ async def recolectar_muestra_vocal(vocal: str, datos: DatosMuestra, tareas_fondo
     if not validar_puntos_clave(datos.puntos_clave):
         raise HTTPException(status_code=400, detail="Puntos clave inválidos")
 
+    if filtro_duplicados.es_duplicado("vocales", vocal, datos.puntos_clave):
+        return {
+            "mensaje": f"Muestra descartada: casi idéntica a una reciente de la vocal '{vocal}'",
+            "vocal": vocal,
+            "categoria": "vocales",
+            "muestra_duplicada": True,
+            "total_muestras": estadisticas_actuales['total_muestras'],
+            "filtro_duplicados": filtro_duplicados.conteos(vocal),
+            "estadisticas": estadisticas_actuales
+        }
+
     inicializar_cola_vocal(vocal)
 
     if not datos.fecha_hora:
@@ -130,7 +117,7 @@ async def recolectar_muestra_vocal(vocal: str, datos: DatosMuestra, tareas_fondo
     }
 
     cola_muestras_vocales[vocal].append(muestra)
-    tareas_fondo.add_task(guardar_muestras_vocal, vocal)
+    almacen_muestras.programar_guardado("vocales", vocal, guardar_muestras_vocal)
 
     estadisticas = obtener_estadisticas_vocal(vocal)
 
@@ -142,17 +129,23 @@ async def recolectar_muestra_vocal(vocal: str, datos: DatosMuestra, tareas_fondo
         "total_muestras": estadisticas['total_muestras'],
         "recoleccion_completa": estadisticas['recoleccion_completa'],
         "progreso_porcentaje": estadisticas['progreso_porcentaje'],
+        "filtro_duplicados": filtro_duplicados.conteos(vocal),
         "estadisticas": estadisticas
     }
 
 @router.get("/estadisticas/{vocal}")
-async def obtener_estadisticas_vocal_endpoint(vocal: str):
+async def obtener_estadisticas_vocal_endpoint(vocal: str, request: Request):
     if vocal not in CLASES_DISPONIBLES['vocales']:
         raise HTTPException(status_code=400, detail=f"Vocal '{vocal}' no válida")
-    return obtener_estadisticas_vocal(vocal)
-
-@router.get("/estadisticas")
-async def obtener_estadisticas_vocales():
+    return respuesta_condicional(
+        request,
+        generar_etag(f"vocales-{vocal}", version_estadisticas_vocales()),
+        lambda: obtener_estadisticas_vocal(vocal),
+        agregador_estadisticas.ultima_modificacion
+    )
+
+def construir_estadisticas_vocales():
+    """Construye las estadísticas de todas las vocales."""
     estadisticas_vocales = {}
     vocales_completas = 0
     total_muestras = 0
@@ -178,14 +171,23 @@ async def obtener_estadisticas_vocales():
         }
     }
 
+@router.get("/estadisticas")
+async def obtener_estadisticas_vocales(request: Request):
+    return respuesta_condicional(
+        request,
+        generar_etag("vocales", version_estadisticas_vocales()),
+        construir_estadisticas_vocales,
+        agregador_estadisticas.ultima_modificacion
+    )
+
 @router.post("/entrenar/{vocal}")
-async def entrenar_modelo_vocal(vocal: str):
+async def entrenar_modelo_vocal(vocal: str, force: bool = False):
     if vocal not in CLASES_DISPONIBLES['vocales']:
         raise HTTPException(status_code=400, detail=f"Vocal '{vocal}' no válida")
     estadisticas = obtener_estadisticas_vocal(vocal)
     if not estadisticas['puede_entrenar']:
         raise HTTPException(status_code=400, detail=f"No hay suficientes datos para entrenar.")
-    return await entrenar_modelo_clase(vocal)
+    return await entrenar_modelo_clase(vocal, forzar=force)
 
 @router.post("/prediccion/{vocal}")
 async def predecir_vocal(vocal: str, datos: SolicitudPrediccion):
@@ -198,11 +200,31 @@ async def predecir_vocal(vocal: str, datos: SolicitudPrediccion):
 
 @router.delete("/datos/{vocal}")
 async def eliminar_datos_vocal(vocal: str):
-    ruta_archivo = obtener_ruta_datos(vocal)
-    if os.path.exists(ruta_archivo):
-        os.remove(ruta_archivo)
+    if await monitor_salud.ejecutar_en_hilo(almacen_muestras.eliminar, vocal):
+        agregador_estadisticas.registrar_eliminacion_datos(vocal)
+    filtro_duplicados.olvidar(vocal)
     return {"mensaje": f"Datos de la vocal '{vocal}' eliminados exitosamente"}
 
+@router.get("/muestras/{vocal}")
+async def listar_muestras_vocal(vocal: str, offset: int = 0, limit: Optional[int] = None):
+    if vocal not in CLASES_DISPONIBLES['vocales']:
+        raise HTTPException(status_code=400, detail=f"Vocal '{vocal}' no válida")
+    try:
+        limite = validar_paginacion(offset, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pagina = await monitor_salud.ejecutar_en_hilo(almacen_muestras.pagina, vocal, offset, limite)
+    return {"vocal": vocal, "categoria": "vocales", "offset": offset, "limit": limite, **pagina}
+
+@router.delete("/muestras/{vocal}/{id_muestra}")
+async def eliminar_muestra_vocal(vocal: str, id_muestra: int):
+    if vocal not in CLASES_DISPONIBLES['vocales']:
+        raise HTTPException(status_code=400, detail=f"Vocal '{vocal}' no válida")
+    total = await almacen_muestras.eliminar_muestra(vocal, id_muestra)
+    if total is None:
+        raise HTTPException(status_code=404, detail=f"No existe la muestra {id_muestra} de la vocal '{vocal}'")
+    return {"mensaje": f"Muestra {id_muestra} de la vocal '{vocal}' eliminada", "id": id_muestra, "total_muestras": total}
+
 @router.delete("/modelo/{vocal}")
 async def eliminar_modelo_vocal(vocal: str):
     return await eliminar_modelo_clase(vocal)
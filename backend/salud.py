@@ -0,0 +1,279 @@
+"""
+Monitor de salud del servicio.
+Lleva en memoria el estado de las colas de muestras, los guardados a disco, los
+modelos cargados, el trabajo enviado a hilos y el retraso del event loop, de modo
+que las sondas de liveness/readiness solo leen contadores y se pueden consultar
+cada segundo sin tocar el disco ni los modelos.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import RUTAS, SALUD_CONFIG
+from metricas import registro_metricas, metrica_guardado
+
+class MonitorSalud:
+    """Estado en vivo de los subsistemas que usan las sondas de salud."""
+
+    def __init__(self):
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+        self._colas = {}        # {categoria: (cola_muestras, esta_guardando)}
+        self._guardados = {}    # {categoria: dict}
+        self._cache_modelos = {}
+        self._hilos_pendientes = 0
+        self._hilos_en_curso = 0
+        self._lags_ms = deque(maxlen=SALUD_CONFIG['ventana_lag_mediciones'])
+        self._tarea_lag = None
+
+    # --- Registro de subsistemas ---
+
+    def registrar_colas(self, categoria: str, cola_muestras: Dict, esta_guardando: Dict):
+        """Registra los diccionarios de cola de una categoría para leer su profundidad."""
+        self._colas[categoria] = (cola_muestras, esta_guardando)
+        self._guardados.setdefault(categoria, {
+            "ultimo_exito": None,
+            "ultimo_error": None,
+            "ultimo_fallido": False,
+            "total": 0,
+            "fallidos": 0,
+            "duraciones_ms": deque(maxlen=SALUD_CONFIG['ventana_guardados'])
+        })
+
+    def registrar_cache_modelos(self, cache_modelos: Dict):
+        """Registra la caché de modelos (objetos con modelo, categoria, memoria_bytes y ultima_carga)."""
+        self._cache_modelos = cache_modelos
+
+    def medir_guardado(self, categoria: str):
+        """Decorador para la corrutina que guarda en disco la cola de una clase: mide su latencia y resultado."""
+        def decorador(funcion: Callable):
+            @functools.wraps(funcion)
+            async def envoltura(clase: str, *args, **kwargs):
+                cola_muestras, esta_guardando = self._colas[categoria]
+                if not cola_muestras.get(clase):
+                    return await funcion(clase, *args, **kwargs)
+
+                inicio = time.perf_counter()
+                esta_guardando[clase] = True
+                try:
+                    resultado = await funcion(clase, *args, **kwargs)
+                except Exception as e:
+                    self._registrar_guardado(categoria, time.perf_counter() - inicio, str(e))
+                    raise
+                finally:
+                    esta_guardando[clase] = False
+                duracion = time.perf_counter() - inicio
+                self._registrar_guardado(categoria, duracion)
+                metrica_guardado.observar(duracion, categoria)
+                return resultado
+            return envoltura
+        return decorador
+
+    def _registrar_guardado(self, categoria: str, duracion: float, error: Optional[str] = None):
+        with self._lock:
+            guardado = self._guardados[categoria]
+            guardado["total"] += 1
+            guardado["duraciones_ms"].append(duracion * 1000)
+            guardado["ultimo_fallido"] = error is not None
+            if error is None:
+                guardado["ultimo_exito"] = time.time()
+            else:
+                guardado["fallidos"] += 1
+                guardado["ultimo_error"] = error
+
+    async def ejecutar_en_hilo(self, funcion: Callable, *args):
+        """asyncio.to_thread que lleva la cuenta del trabajo pendiente y en curso del executor."""
+        fuera_de_espera = [False]
+        with self._lock:
+            self._hilos_pendientes += 1
+
+        def salir_de_espera():
+            if not fuera_de_espera[0]:
+                fuera_de_espera[0] = True
+                self._hilos_pendientes -= 1
+
+        def ejecutar():
+            with self._lock:
+                salir_de_espera()
+                self._hilos_en_curso += 1
+            try:
+                return funcion(*args)
+            finally:
+                with self._lock:
+                    self._hilos_en_curso -= 1
+
+        try:
+            return await asyncio.to_thread(ejecutar)
+        finally:
+            # Si se canceló antes de empezar, el trabajo nunca saldrá de la espera
+            with self._lock:
+                salir_de_espera()
+
+    # --- Retraso del event loop ---
+
+    def iniciar(self):
+        """Arranca la medición del retraso del event loop (debe llamarse dentro del loop)."""
+        if self._tarea_lag is None or self._tarea_lag.done():
+            self._tarea_lag = asyncio.get_running_loop().create_task(self._medir_lag())
+
+    async def detener(self):
+        """Detiene la medición del retraso del event loop."""
+        if self._tarea_lag is not None:
+            self._tarea_lag.cancel()
+            try:
+                await self._tarea_lag
+            except asyncio.CancelledError:
+                pass
+            self._tarea_lag = None
+
+    async def _medir_lag(self):
+        loop = asyncio.get_running_loop()
+        intervalo = SALUD_CONFIG['intervalo_lag_segundos']
+        while True:
+            esperado = loop.time() + intervalo
+            await asyncio.sleep(intervalo)
+            self._lags_ms.append(max(0.0, (loop.time() - esperado) * 1000))
+
+    # --- Consultas ---
+
+    def lag_event_loop(self) -> Dict:
+        """Retraso del event loop: última medición y máximo de la ventana reciente."""
+        lags = list(self._lags_ms)
+        return {
+            "midiendo": self._tarea_lag is not None and not self._tarea_lag.done(),
+            "ultimo_ms": round(lags[-1], 2) if lags else None,
+            "maximo_ms": round(max(lags), 2) if lags else None
+        }
+
+    def muestras_en_cola(self, categoria: str) -> int:
+        """Muestras pendientes de guardar de una categoría (lectura barata para cada petición)."""
+        if categoria not in self._colas:
+            return 0
+        return sum(len(cola) for cola in list(self._colas[categoria][0].values()))
+
+    def clases_con_muestras_en_cola(self) -> List[Tuple[str, str]]:
+        """Pares (categoria, clase) cuya cola registrada aún tiene muestras sin guardar."""
+        with self._lock:
+            return [
+                (categoria, clase)
+                for categoria, (cola_muestras, _) in self._colas.items()
+                for clase, cola in list(cola_muestras.items()) if cola
+            ]
+
+    def estado_colas(self) -> Dict:
+        """Profundidad de las colas y estado de los guardados por categoría."""
+        ahora = time.time()
+        estado = {}
+        with self._lock:
+            for categoria, (cola_muestras, esta_guardando) in self._colas.items():
+                guardado = self._guardados[categoria]
+                duraciones = list(guardado["duraciones_ms"])
+                estado[categoria] = {
+                    "muestras_en_cola": sum(len(cola) for cola in list(cola_muestras.values())),
+                    "por_clase": {clase: len(cola) for clase, cola in list(cola_muestras.items()) if cola},
+                    "guardando": sum(1 for activo in list(esta_guardando.values()) if activo),
+                    "segundos_desde_ultimo_guardado": (
+                        round(ahora - guardado["ultimo_exito"], 1) if guardado["ultimo_exito"] else None
+                    ),
+                    "latencia_guardado_ms": {
+                        "ultima": round(duraciones[-1], 2) if duraciones else None,
+                        "media": round(sum(duraciones) / len(duraciones), 2) if duraciones else None,
+                        "maxima": round(max(duraciones), 2) if duraciones else None
+                    },
+                    "guardados_totales": guardado["total"],
+                    "guardados_fallidos": guardado["fallidos"],
+                    "ultimo_guardado_fallido": guardado["ultimo_fallido"],
+                    "ultimo_error": guardado["ultimo_error"]
+                }
+        return estado
+
+    def modelos_cargados(self) -> List[Dict]:
+        """Modelos actualmente en memoria y su tamaño aproximado."""
+        return [
+            {
+                "clase": clase,
+                "categoria": modelo.categoria,
+                "memoria_bytes": modelo.memoria_bytes,
+                "cargado_hace_segundos": round(time.time() - modelo.ultima_carga, 1) if modelo.ultima_carga else None
+            }
+            for clase, modelo in list(self._cache_modelos.items())
+            if modelo.modelo is not None
+        ]
+
+    def executor(self) -> Dict:
+        """Trabajo enviado a hilos que espera turno o se está ejecutando."""
+        return {"pendientes": self._hilos_pendientes, "en_curso": self._hilos_en_curso}
+
+    def vivo(self) -> Dict:
+        """Respuesta de liveness: el proceso responde y su event loop avanza."""
+        return {
+            "estado": "vivo",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+            "uptime_segundos": round(time.time() - self.inicio, 1),
+            "event_loop": self.lag_event_loop()
+        }
+
+    def listo(self) -> Dict:
+        """Respuesta de readiness con el estado de todos los subsistemas y los problemas encontrados."""
+        colas = self.estado_colas()
+        lag = self.lag_event_loop()
+        modelos = self.modelos_cargados()
+        problemas = []
+
+        for clave in ("data_base", "models_base"):
+            if not os.path.isdir(RUTAS[clave]):
+                problemas.append(f"No existe el directorio {RUTAS[clave]}")
+
+        if lag["maximo_ms"] is not None and lag["maximo_ms"] > SALUD_CONFIG['max_lag_ms']:
+            problemas.append(f"Retraso del event loop de {lag['maximo_ms']} ms")
+
+        total_en_cola = sum(estado["muestras_en_cola"] for estado in colas.values())
+        if total_en_cola > SALUD_CONFIG['max_muestras_en_cola']:
+            problemas.append(f"{total_en_cola} muestras pendientes de guardar")
+
+        for categoria, estado in colas.items():
+            if estado["ultimo_guardado_fallido"] and estado["muestras_en_cola"]:
+                problemas.append(f"El último guardado de '{categoria}' falló: {estado['ultimo_error']}")
+
+        return {
+            "listo": not problemas,
+            "problemas": problemas,
+            **self.vivo(),
+            "colas": colas,
+            "total_muestras_en_cola": total_en_cola,
+            "modelos": {
+                "cargados": len(modelos),
+                "memoria_total_bytes": sum(m["memoria_bytes"] for m in modelos),
+                "detalle": modelos
+            },
+            "executor": self.executor()
+        }
+
+# Instancia global del monitor
+monitor_salud = MonitorSalud()
+
+# Indicadores que se leen del monitor al exportar /metrics
+registro_metricas.indicador(
+    "cola_muestras_pendientes", "Muestras en cola pendientes de guardar", ("categoria",),
+    lambda: {(categoria,): estado["muestras_en_cola"] for categoria, estado in monitor_salud.estado_colas().items()}
+)
+def _retraso_event_loop_segundos():
+    ultimo_ms = monitor_salud.lag_event_loop()["ultimo_ms"]
+    return {(): None if ultimo_ms is None else ultimo_ms / 1000}
+
+registro_metricas.indicador(
+    "event_loop_retraso_segundos", "Último retraso medido del event loop", (), _retraso_event_loop_segundos
+)
+registro_metricas.indicador(
+    "executor_tareas", "Trabajo enviado a hilos por estado", ("estado",),
+    lambda: {(estado,): valor for estado, valor in monitor_salud.executor().items()}
+)
+registro_metricas.indicador(
+    "modelos_memoria_bytes", "Memoria de los pesos de cada modelo cargado", ("clase",),
+    lambda: {(modelo["clase"],): modelo["memoria_bytes"] for modelo in monitor_salud.modelos_cargados()}
+)
@@ -0,0 +1,24 @@
+"""
+Configuración común de las pruebas: importa los módulos del backend como lo hace
+main.py (desde backend/) y, sin TensorFlow, sustituye el módulo de modelos.
+"""
+
+import os
+import sys
+import types
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_BACKEND)
+
+try:
+    import models  # noqa: F401
+except ImportError:
+    # Las pruebas no entrenan ni predicen: basta con los nombres que importan las rutas
+    def _sin_modelo(*args, **kwargs):
+        raise RuntimeError("Modelos no disponibles en las pruebas")
+
+    models = types.ModuleType("models")
+    for nombre in ("entrenar_modelo_clase", "predecir_clase", "eliminar_modelo_clase", "predecir_lote_categoria",
+                   "calcular_confianzas_categoria", "obtener_clases_con_modelo"):
+        setattr(models, nombre, _sin_modelo)
+    sys.modules["models"] = models
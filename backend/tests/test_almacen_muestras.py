@@ -0,0 +1,134 @@
+"""
+Guardados agrupados del almacén de muestras, a través de la API en el mismo proceso.
+
+Cada prueba trabaja en un directorio temporal (RUTAS son relativas al directorio de
+trabajo) con un retraso de guardado corto, lanza recolecciones concurrentes con
+httpx.ASGITransport y comprueba lo que quedó en disco.
+
+Uso (desde backend/):
+    python -m pytest -q tests
+"""
+
+import asyncio
+import json
+import os
+import random
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from almacen_muestras import almacen_muestras
+from config import ALMACEN_CONFIG, FILTRO_DUPLICADOS_CONFIG, obtener_ruta_datos
+from routes.numeros.routes_numeros import router as router_numeros, cola_muestras_numeros
+
+CATEGORIA = "numeros"
+
+def generar_puntos_clave(rng: random.Random):
+    """Frame sintético de una mano: 21 puntos (x, y, z) alrededor de una muñeca aleatoria."""
+    x0, y0 = rng.uniform(0.3, 0.7), rng.uniform(0.4, 0.8)
+    return [[x0 + rng.gauss(0, 0.08), y0 - abs(rng.gauss(0, 0.12)), rng.gauss(0, 0.03)] for _ in range(21)]
+
+def muestras_en_disco(clase: str):
+    ruta = obtener_ruta_datos(clase)
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta) as f:
+        return json.load(f)
+
+async def recolectar(clase: str, n: int):
+    """Lanza n POST /api/numeros/recolectar/{clase} a la vez y devuelve sus respuestas."""
+    app = FastAPI()
+    app.include_router(router_numeros)
+    rng = random.Random(clase)
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://prueba") as cliente:
+        return await asyncio.gather(*[
+            cliente.post(f"/api/{CATEGORIA}/recolectar/{clase}", json={"puntos_clave": generar_puntos_clave(rng)})
+            for _ in range(n)
+        ])
+
+@pytest.fixture
+def escrituras(tmp_path, monkeypatch):
+    """Directorio de datos temporal, retraso corto y registro de cada escritura en el backend."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(ALMACEN_CONFIG['retraso_guardado_segundos'], CATEGORIA, 0.05)
+    monkeypatch.setitem(ALMACEN_CONFIG, "reintento_guardado_segundos", 0.01)
+    monkeypatch.setitem(FILTRO_DUPLICADOS_CONFIG, "activo", False)
+
+    llamadas = []
+    agregar = almacen_muestras.persistencia.agregar
+
+    def agregar_contando(clase, muestras):
+        llamadas.append(len(muestras))
+        return agregar(clase, muestras)
+
+    monkeypatch.setattr(almacen_muestras.persistencia, "agregar", agregar_contando)
+    return llamadas
+
+def test_recolecciones_concurrentes_se_agrupan(escrituras):
+    clase, n = "3", 40
+
+    async def escenario():
+        respuestas = await recolectar(clase, n)
+        await almacen_muestras.vaciar_pendientes()
+        return respuestas
+
+    respuestas = asyncio.run(escenario())
+
+    assert all(respuesta.status_code == 200 for respuesta in respuestas)
+    assert len(muestras_en_disco(clase)) == n
+    assert sum(escrituras) == n
+    assert len(escrituras) <= n // 10
+    assert not cola_muestras_numeros[clase]
+
+def test_guardado_fallido_se_reintenta(escrituras, monkeypatch):
+    clase, n = "4", 10
+    agregar = almacen_muestras.persistencia.agregar
+    fallos = [2]
+
+    def agregar_con_fallos(clase, muestras):
+        if fallos[0]:
+            fallos[0] -= 1
+            raise OSError("disco no disponible")
+        return agregar(clase, muestras)
+
+    monkeypatch.setattr(almacen_muestras.persistencia, "agregar", agregar_con_fallos)
+
+    async def escenario():
+        await recolectar(clase, n)
+        # Sin vaciar: el reintento tiene que llegar por sí solo
+        for _ in range(100):
+            if len(muestras_en_disco(clase)) == n:
+                break
+            await asyncio.sleep(0.02)
+        await almacen_muestras.vaciar_pendientes()
+
+    asyncio.run(escenario())
+
+    assert fallos[0] == 0
+    assert len(muestras_en_disco(clase)) == n
+    assert not cola_muestras_numeros[clase]
+
+def test_vaciar_pendientes_guarda_las_colas_que_quedaron(escrituras, monkeypatch):
+    clase, n = "5", 5
+    monkeypatch.setitem(ALMACEN_CONFIG, "max_reintentos_guardado", 1)
+    agregar = almacen_muestras.persistencia.agregar
+
+    def agregar_fallando(clase, muestras):
+        raise OSError("disco no disponible")
+
+    async def escenario():
+        monkeypatch.setattr(almacen_muestras.persistencia, "agregar", agregar_fallando)
+        await recolectar(clase, n)
+        await almacen_muestras.vaciar_pendientes()
+        # Sin reintentos pendientes, las muestras siguen en la cola hasta el apagado
+        assert len(cola_muestras_numeros[clase]) == n
+
+        monkeypatch.setattr(almacen_muestras.persistencia, "agregar", agregar)
+        await almacen_muestras.vaciar_pendientes()
+
+    asyncio.run(escenario())
+
+    assert len(muestras_en_disco(clase)) == n
+    assert not cola_muestras_numeros[clase]
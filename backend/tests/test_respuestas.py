@@ -0,0 +1,43 @@
+"""
+Serialización de las respuestas con orjson y su respaldo con json estándar.
+
+Uso (desde backend/):
+    python -m pytest -q tests
+"""
+
+import asyncio
+import json
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI
+
+from respuestas import serializar_json
+from routes.operaciones.routes_operaciones import router as router_operaciones
+
+def test_enteros_de_mas_de_64_bits_usan_json_estandar():
+    contenido = {"entero": 2 ** 70, "negativo": -(2 ** 64), "array": np.arange(3), "texto": "división"}
+    assert json.loads(serializar_json(contenido)) == {
+        "entero": 2 ** 70, "negativo": -(2 ** 64), "array": [0, 1, 2], "texto": "división"
+    }
+
+@pytest.mark.parametrize("expresion, resultado", [
+    ("99999999999*99999999999", 9999999999800000000001),
+    ("2+3*4", 14),
+])
+def test_expresion_con_resultado_grande(expresion, resultado):
+    app = FastAPI()
+    app.include_router(router_operaciones)
+
+    async def evaluar():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://prueba") as cliente:
+            return await cliente.post("/api/operaciones/expresion_matematica", json={"expresion": expresion})
+
+    respuesta = asyncio.run(evaluar())
+
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert datos["valida"] is True
+    assert datos["resultado"] == pytest.approx(resultado)
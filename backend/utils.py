@@ -3,12 +3,19 @@ import json
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from config import ALMACEN_CONFIG
+from perfilado import medir_etapa
+
 # Configuración
 MAX_MUESTRAS = 100
 MIN_MUESTRAS_ENTRENAMIENTO = 10
 DIR_DATOS = "data"
 DIR_MODELOS = "backend/models_trained"
 
+# Máscara de permisos del proceso (os.umask solo se puede leer cambiándola)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 def crear_directorios():
     """Crea los directorios necesarios para el almacenamiento de datos y modelos."""
     os.makedirs(DIR_DATOS, exist_ok=True)
@@ -62,6 +69,19 @@ def guardar_cola_en_disco(categoria: str, clase: str, datos_cola: List[dict]):
     os.replace(ruta_temporal, ruta_final)
     print(f"[{datetime.now()}] Muestras de '{categoria}/{clase}' guardadas en disco. Total: {len(todas_las_muestras)}")
 
+def ajustar_permisos_temporal(descriptor: int, ruta_final: str):
+    """
+    Da al temporal de mkstemp (0600) los permisos del archivo que va a reemplazar,
+    o los de un archivo nuevo (0666 menos la umask) si aún no existe.
+    """
+    if not hasattr(os, "fchmod"):  # Windows: no hay bits de permisos que conservar
+        return
+    try:
+        modo = os.stat(ruta_final).st_mode & 0o7777
+    except FileNotFoundError:
+        modo = 0o666 & ~_UMASK
+    os.fchmod(descriptor, modo)
+
 def obtener_clases_categoria(categoria: str) -> List[str]:
     """Obtiene todas las clases disponibles en una categoría."""
     ruta_categoria = os.path.join(DIR_DATOS, categoria)
@@ -113,14 +133,24 @@ def obtener_progreso_categoria(categoria: str) -> Dict[str, Dict]:
 
 def validar_puntos_clave(puntos_clave: List[List[float]]) -> bool:
     """Valida que los puntos clave tengan el formato correcto."""
-    if len(puntos_clave) != 21:
-        return False
-    
-    for punto in puntos_clave:
-        if len(punto) != 3:
+    with medir_etapa("validacion"):
+        if len(puntos_clave) != 21:
             return False
-    
-    return True
+        
+        for punto in puntos_clave:
+            if len(punto) != 3:
+                return False
+        
+        return True
+
+def validar_paginacion(offset: int, limite: Optional[int]) -> int:
+    """Devuelve el límite de página efectivo; ValueError si offset o límite no son válidos."""
+    limite = ALMACEN_CONFIG['muestras_por_pagina'] if limite is None else limite
+    if offset < 0:
+        raise ValueError("offset debe ser mayor o igual que 0")
+    if not 1 <= limite <= ALMACEN_CONFIG['max_muestras_por_pagina']:
+        raise ValueError(f"limit debe estar entre 1 y {ALMACEN_CONFIG['max_muestras_por_pagina']}")
+    return limite
 
 def calcular_estadisticas_categoria(progreso: Dict[str, Dict]) -> Dict:
     """Calcula estadísticas generales del progreso de recolección de una categoría."""
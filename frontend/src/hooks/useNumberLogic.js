@@ -83,6 +83,47 @@ export const useNumberLogic = ({ setModalData }) => {
     }
   }, []);
 
+  // --- Aplicar cambios de progreso recibidos del servidor (sin volver a pedir las estadísticas) ---
+  const applyProgressUpdate = useCallback((updates) => {
+    setAppState((prev) => {
+      const numberProgress = { ...prev.numberProgress };
+      Object.entries(updates).forEach(([num, progreso]) => {
+        if (!NUMBERS.includes(num)) return;
+        numberProgress[num] = {
+          ...numberProgress[num],
+          count: progreso.total_muestras || 0,
+          max: numberProgress[num]?.max || SAMPLES_PER_NUMBER,
+          percentage: Math.min(100, progreso.progreso_porcentaje || 0),
+          complete: Boolean(progreso.recoleccion_completa),
+        };
+      });
+
+      const totalSamples = NUMBERS.reduce(
+        (sum, num) => sum + (numberProgress[num]?.count || 0),
+        0
+      );
+      const totalRequired =
+        prev.numberProgress.total?.max || NUMBERS.length * SAMPLES_PER_NUMBER;
+      const totalProgress = (totalSamples / totalRequired) * 100;
+
+      return {
+        ...prev,
+        numberProgress: {
+          ...numberProgress,
+          total: {
+            samples: totalSamples,
+            max: totalRequired,
+            percentage: totalProgress,
+          },
+        },
+        statusMessage:
+          totalProgress >= 100
+            ? STATUS_MESSAGES_NUMBERS.READY_TO_TRAIN
+            : prev.statusMessage,
+      };
+    });
+  }, []);
+
   // --- Guardar landmarks ---
   const handleLandmarks = useCallback(
     async (landmarks, number) => {
@@ -276,15 +317,21 @@ export const useNumberLogic = ({ setModalData }) => {
     }));
   }, [appState.isModelTrained]);
 
-  // --- Ciclo de refresco ---
+  // --- Ciclo de refresco (eventos del servidor, con sondeo como respaldo) ---
   useEffect(() => {
     fetchProgress();
+    const unsubscribe = apiService.subscribeProgress(
+      "numeros",
+      applyProgressUpdate
+    );
+    if (unsubscribe) return unsubscribe;
+
     const interval = setInterval(
       fetchProgress,
       appState.isCollecting ? 1000 : 3000
     );
     return () => clearInterval(interval);
-  }, [fetchProgress, appState.isCollecting]);
+  }, [fetchProgress, applyProgressUpdate, appState.isCollecting]);
 
   // --- Validación para permitir entrenamiento ---
   const canTrain = Object.values(appState.numberProgress || {}).some(
@@ -85,6 +85,47 @@ export const useOpbasicLogic = ({ setModalData }) => {
     }
   }, []);
 
+  // --- Aplicar cambios de progreso recibidos del servidor (sin volver a pedir las estadísticas) ---
+  const applyProgressUpdate = useCallback((updates) => {
+    setAppState((prev) => {
+      const opbasicProgress = { ...prev.opbasicProgress };
+      Object.entries(updates).forEach(([op, progreso]) => {
+        if (!OPBASICS.includes(op)) return;
+        opbasicProgress[op] = {
+          ...opbasicProgress[op],
+          count: progreso.total_muestras || 0,
+          max: opbasicProgress[op]?.max || SAMPLES_PER_OPBASIC,
+          percentage: Math.min(100, progreso.progreso_porcentaje || 0),
+          complete: Boolean(progreso.recoleccion_completa),
+        };
+      });
+
+      const totalSamples = OPBASICS.reduce(
+        (sum, op) => sum + (opbasicProgress[op]?.count || 0),
+        0
+      );
+      const totalRequired =
+        prev.opbasicProgress.total?.max || OPBASICS.length * SAMPLES_PER_OPBASIC;
+      const totalProgress = (totalSamples / totalRequired) * 100;
+
+      return {
+        ...prev,
+        opbasicProgress: {
+          ...opbasicProgress,
+          total: {
+            samples: totalSamples,
+            max: totalRequired,
+            percentage: totalProgress,
+          },
+        },
+        statusMessage:
+          totalProgress >= 100
+            ? STATUS_MESSAGES_OPBASICS.READY_TO_TRAIN
+            : prev.statusMessage,
+      };
+    });
+  }, []);
+
   // --- Guardar landmarks ---
   const handleLandmarks = useCallback(
     async (landmarks, opbasic) => {
@@ -285,15 +326,21 @@ export const useOpbasicLogic = ({ setModalData }) => {
     }));
   }, [appState.isModelTrained]);
 
-  // --- Ciclo de refresco ---
+  // --- Ciclo de refresco (eventos del servidor, con sondeo como respaldo) ---
   useEffect(() => {
     fetchProgress();
+    const unsubscribe = apiService.subscribeProgress(
+      "operaciones",
+      applyProgressUpdate
+    );
+    if (unsubscribe) return unsubscribe;
+
     const interval = setInterval(
       fetchProgress,
       appState.isCollecting ? 1000 : 3000
     );
     return () => clearInterval(interval);
-  }, [fetchProgress, appState.isCollecting]);
+  }, [fetchProgress, applyProgressUpdate, appState.isCollecting]);
 
   return {
     appState,
@@ -92,6 +92,47 @@ export const useVocalLogic = ({ setModalData }) => {
     }
   }, []);
 
+  // --- Aplicar cambios de progreso recibidos del servidor (sin volver a pedir las estadísticas) ---
+  const applyProgressUpdate = useCallback((updates) => {
+    setAppState((prev) => {
+      const vowelProgress = { ...prev.vowelProgress };
+      Object.entries(updates).forEach(([v, progreso]) => {
+        if (!VOWELS.includes(v)) return;
+        vowelProgress[v] = {
+          ...vowelProgress[v],
+          count: progreso.total_muestras || 0,
+          max: vowelProgress[v]?.max || SAMPLES_PER_VOWEL,
+          percentage: Math.min(100, progreso.progreso_porcentaje || 0),
+          complete: Boolean(progreso.recoleccion_completa),
+        };
+      });
+
+      const totalSamples = VOWELS.reduce(
+        (sum, v) => sum + (vowelProgress[v]?.count || 0),
+        0
+      );
+      const totalRequired =
+        prev.vowelProgress.total?.max || VOWELS.length * SAMPLES_PER_VOWEL;
+      const totalProgress = (totalSamples / totalRequired) * 100;
+
+      return {
+        ...prev,
+        vowelProgress: {
+          ...vowelProgress,
+          total: {
+            samples: totalSamples,
+            max: totalRequired,
+            percentage: totalProgress,
+          },
+        },
+        statusMessage:
+          totalProgress >= 100
+            ? STATUS_MESSAGES.READY_TO_TRAIN
+            : prev.statusMessage,
+      };
+    });
+  }, []);
+
   // --- Guardar landmarks ---
   const handleLandmarks = useCallback(
     async (landmarks, vowel) => {
@@ -283,15 +324,21 @@ export const useVocalLogic = ({ setModalData }) => {
     }));
   }, []);
 
-  // --- Ciclo de refresco ---
+  // --- Ciclo de refresco (eventos del servidor, con sondeo como respaldo) ---
   useEffect(() => {
     fetchProgress();
+    const unsubscribe = apiService.subscribeProgress(
+      "vocales",
+      applyProgressUpdate
+    );
+    if (unsubscribe) return unsubscribe;
+
     const interval = setInterval(
       fetchProgress,
       appState.isCollecting ? 1000 : 3000
     );
     return () => clearInterval(interval);
-  }, [fetchProgress, appState.isCollecting]);
+  }, [fetchProgress, applyProgressUpdate, appState.isCollecting]);
 
   return {
     appState,
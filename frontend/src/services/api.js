@@ -4,6 +4,28 @@ import axios from "axios";
 const API_BASE_URL = "http://localhost:8001/api";
 
 export const apiService = {
+  // ================= PROGRESO (SSE) =================
+  // Se suscribe a los cambios de progreso de una categoría. onChange recibe
+  // { clase: { total_muestras, progreso_porcentaje, recoleccion_completa } }:
+  // todas las clases con el "snapshot" inicial y solo la que cambió con cada
+  // "progreso". Devuelve una función para cerrar la conexión, o null si el
+  // navegador no soporta EventSource.
+  subscribeProgress(categoria, onChange) {
+    if (typeof EventSource === "undefined") return null;
+
+    const source = new EventSource(
+      `${API_BASE_URL}/progreso/stream?categoria=${categoria}`
+    );
+    source.addEventListener("snapshot", (event) =>
+      onChange(JSON.parse(event.data).clases || {})
+    );
+    source.addEventListener("progreso", (event) => {
+      const { clase, ...progreso } = JSON.parse(event.data);
+      onChange({ [clase]: progreso });
+    });
+    return () => source.close();
+  },
+
   // ================= VOCAL =================
   async getVowelProgress() {
     const response = await axios.get(`${API_BASE_URL}/vocales/estadisticas`);